@@ -0,0 +1,108 @@
+"""
+パラメータを動かしたアニメーション（GIF / APNG）の作成
+撮影したフレームを受け取るたびに別スレッドで変換し、撮影と変換を重ねて行う
+（Pillow は起動時間短縮のため、実際にアニメーションを作るときに読み込む）
+"""
+
+import io
+import queue
+import threading
+
+# 対応する出力形式
+ANIMATION_FORMATS = ('gif', 'apng')
+
+# 既定のフレーム表示時間（ミリ秒）と出力の最大幅（ピクセル）
+DEFAULT_FRAME_DURATION = 100
+DEFAULT_MAX_WIDTH = 800
+
+_FINISH = object()
+
+
+def sweep_values(start, end, frames):
+    """start から end までを frames 等分した値のリスト（両端を含む）"""
+    if frames < 2:
+        return [start]
+    step = (end - start) / (frames - 1)
+    return [start + step * index for index in range(frames)]
+
+
+def format_parameter_value(value):
+    """Desmosに渡す数値の表記（指数表記を使わない）"""
+    text = f"{value:.6f}".rstrip('0').rstrip('.')
+    return "0" if text in ("-0", "") else text
+
+
+class AnimationEncoder:
+    """フレーム（PNGデータ）を順に受け取り、GIF または APNG にまとめる
+
+    add() はすぐに戻り、縮小・減色などの変換はエンコード用スレッドで行う。
+    finish() で残りのフレームの変換を待ち、アニメーションのデータを返す。
+    """
+
+    def __init__(self, format='gif', frame_duration=DEFAULT_FRAME_DURATION, max_width=DEFAULT_MAX_WIDTH):
+        if format not in ANIMATION_FORMATS:
+            raise ValueError(f"未対応の形式です: {format}")
+        self.format = format
+        self.frame_duration = frame_duration
+        self.max_width = max_width
+        self.frames = []
+        self.error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='animation-encoder', daemon=True)
+        self._thread.start()
+
+    def add(self, image):
+        """フレームを追加（変換はエンコード用スレッドで行う）"""
+        self._queue.put(image)
+
+    def _run(self):
+        while True:
+            image = self._queue.get()
+            if image is _FINISH:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.frames.append(self._prepare(image))
+            except Exception as e:
+                self.error = e
+
+    def _prepare(self, image):
+        """1フレームを縮小し、GIFの場合は256色に減色する"""
+        from PIL import Image
+
+        with Image.open(io.BytesIO(image)) as source:
+            frame = source.convert('RGB')
+        if frame.width > self.max_width:
+            frame = frame.resize(
+                (self.max_width, round(frame.height * self.max_width / frame.width)), Image.LANCZOS)
+        if self.format == 'gif':
+            frame = frame.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+        return frame
+
+    def finish(self):
+        """全フレームの変換を待ってアニメーションのデータを返す（ブロックするため別スレッドで呼ぶこと）"""
+        self._queue.put(_FINISH)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        if not self.frames:
+            raise ValueError("フレームがありません")
+
+        output = io.BytesIO()
+        first, rest = self.frames[0], self.frames[1:]
+        if self.format == 'gif':
+            first.save(output, format='GIF', save_all=True, append_images=rest,
+                       duration=self.frame_duration, loop=0, optimize=False)
+        else:
+            first.save(output, format='PNG', save_all=True, append_images=rest,
+                       duration=self.frame_duration, loop=0)
+        return output.getvalue()
+
+    def close(self):
+        """フレームの撮影を途中でやめた場合に、エンコード用スレッドを終了させる"""
+        self._queue.put(_FINISH)
+
+    @property
+    def extension(self):
+        return 'gif' if self.format == 'gif' else 'png'
@@ -0,0 +1,123 @@
+"""
+アップロード済み画像のURL索引
+描画パラメータのハッシュ -> Discordにアップロード済みの添付ファイルURL
+同じグラフは画像を再アップロードせず、既存のURLを埋め込みで参照する
+"""
+
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+# 索引に保持するURLの上限
+DEFAULT_MAX_ENTRIES = 4096
+
+# 期限切れ直前のURLは使わない（表示までの余裕、秒）
+DEFAULT_EXPIRY_MARGIN = 600
+
+# 期限（ex=）のないURLを使い続ける時間（秒）
+DEFAULT_UNSIGNED_TTL = 3600
+
+# DiscordのCDNのホスト
+DISCORD_CDN_HOSTS = ('cdn.discordapp.com', 'media.discordapp.net')
+
+
+def parse_cdn_expiry(url):
+    """CDNのURLから有効期限（UNIX時刻）を取得（ex= は16進数、ない場合は None）"""
+    values = parse_qs(urlsplit(url).query).get('ex')
+    if not values:
+        return None
+    try:
+        return int(values[0], 16)
+    except ValueError:
+        return None
+
+
+def attachment_path(url):
+    """URLの署名（ex=/is=/hm=）を除いた部分（同じ添付ファイルかの比較に使う）"""
+    parts = urlsplit(url)
+    return f"{parts.hostname}{parts.path}"
+
+
+def is_discord_cdn_url(url):
+    """DiscordのCDNのHTTPS URLか"""
+    parts = urlsplit(url)
+    return parts.scheme == 'https' and parts.hostname in DISCORD_CDN_HOSTS
+
+
+class AttachmentRecord:
+    """アップロード済みの画像1件"""
+
+    __slots__ = ('url', 'expires_at', 'message_id')
+
+    def __init__(self, url, expires_at, message_id):
+        self.url = url
+        self.expires_at = expires_at
+        self.message_id = message_id
+
+
+class AttachmentIndex:
+    """キャッシュキー -> 添付ファイルURL（期限切れ・元メッセージの削除で無効化）"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, expiry_margin=DEFAULT_EXPIRY_MARGIN,
+                 unsigned_ttl=DEFAULT_UNSIGNED_TTL, clock=time.time):
+        self.max_entries = max_entries
+        self.expiry_margin = expiry_margin
+        self.unsigned_ttl = unsigned_ttl
+        self.clock = clock
+        self.reused = 0
+        self._records = OrderedDict()  # キャッシュキー -> AttachmentRecord
+        self._by_message = {}  # メッセージID -> キャッシュキーの集合
+
+    def record(self, key, url, message_id):
+        """アップロードした画像のURLを登録（CDN以外のURLは登録しない）"""
+        if not is_discord_cdn_url(url):
+            return False
+
+        expires_at = parse_cdn_expiry(url)
+        if expires_at is None:
+            expires_at = self.clock() + self.unsigned_ttl
+
+        self.discard(key)
+        self._records[key] = AttachmentRecord(url, expires_at, message_id)
+        self._by_message.setdefault(message_id, set()).add(key)
+
+        while len(self._records) > self.max_entries:
+            self.discard(next(iter(self._records)))
+        return True
+
+    def lookup(self, key):
+        """再利用できるURLを返す（ない・期限が近い場合は None）"""
+        record = self._records.get(key)
+        if record is None:
+            return None
+        if record.expires_at - self.expiry_margin <= self.clock():
+            self.discard(key)
+            return None
+        self._records.move_to_end(key)
+        self.reused += 1
+        return record.url
+
+    def discard(self, key):
+        record = self._records.pop(key, None)
+        if record is None:
+            return
+        keys = self._by_message.get(record.message_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_message[record.message_id]
+
+    def invalidate_message(self, message_id):
+        """メッセージの削除・画像の差し替えで使えなくなったURLを削除"""
+        for key in self._by_message.pop(message_id, ()):
+            self._records.pop(key, None)
+
+    def invalidate_missing(self, message_id, urls):
+        """メッセージの編集後に残っている添付ファイル urls に含まれないURLを削除"""
+        remaining = {attachment_path(url) for url in urls}
+        for key in list(self._by_message.get(message_id, ())):
+            if attachment_path(self._records[key].url) not in remaining:
+                self.discard(key)
+
+    def __len__(self):
+        return len(self._records)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+LaTeX一括変換CLI
+1行1式の入力（ファイルまたは標準入力）を順に変換し、結果をJSONLで出力する
+
+使い方:
+    python batch_convert.py expressions.txt > results.jsonl
+    cat expressions.txt | python batch_convert.py --workers 4
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import sys
+from multiprocessing import Pool
+
+from latex_converter import convert_many, ExpressionTooLongError
+
+# 1ワーカーに一度に渡す行数の既定値
+DEFAULT_CHUNK_SIZE = 256
+
+
+def make_record(line_number, expression, result):
+    """変換結果（convert_many の1件分）からJSONLの1レコード分の辞書を作る"""
+    if isinstance(result, ExpressionTooLongError):
+        # 上限を超える式は変換せずにエラーだけを記録する
+        return {
+            "line": line_number,
+            "input": expression,
+            "latex": None,
+            "error": {"message": str(result), "length": result.length, "limit": result.limit},
+        }
+    latex, syntax_error = result
+    record = {
+        "line": line_number,
+        "input": expression,
+        "latex": latex,
+    }
+    if syntax_error is not None:
+        # 構文解析できない式もルール変換の結果は出力する
+        record["syntax_error"] = {"message": syntax_error.message, "position": syntax_error.position}
+    return record
+
+
+def convert_records(items):
+    """(行番号, 式) のリストを convert_many でまとめて変換し、レコードのリストを返す"""
+    return [
+        make_record(line_number, expression, result)
+        for (line_number, expression), result in zip(items, convert_many(expression for _, expression in items))
+    ]
+
+
+def chunked(items, size):
+    """イテレーターを size 件ずつのリストに分ける"""
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_expressions(stream):
+    """入力ストリームから (行番号, 式) を1行ずつ読み出す（空行は読み飛ばす）"""
+    for line_number, line in enumerate(stream, 1):
+        expression = line.rstrip('\r\n')
+        if expression.strip():
+            yield line_number, expression
+
+
+def _quiet_worker():
+    """ワーカープロセスでは変換ごとのログを抑制"""
+    logging.getLogger('latex_converter').setLevel(logging.WARNING)
+
+
+def convert_stream(input_stream, output_stream, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """入力を逐次変換して出力に書き込み、処理した式の数を返す"""
+    items = read_expressions(input_stream)
+    count = 0
+
+    chunks = chunked(items, chunk_size)
+    if workers > 1:
+        # 大量の式はワーカープロセスで並列変換（出力順は入力順のまま）
+        with Pool(workers, initializer=_quiet_worker) as pool:
+            for records in pool.imap(convert_records, chunks):
+                for record in records:
+                    output_stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+    else:
+        for chunk in chunks:
+            for record in convert_records(chunk):
+                output_stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+
+    output_stream.flush()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='数式を一括でLaTeXに変換してJSONLで出力')
+    parser.add_argument('input', nargs='?', default='-', help='入力ファイル（省略時または - で標準入力）')
+    parser.add_argument('-o', '--output', default='-', help='出力ファイル（省略時は標準出力）')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='ワーカープロセス数（既定: 1）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='ワーカーに渡す行数の単位')
+    args = parser.parse_args(argv)
+
+    _quiet_worker()
+
+    input_stream = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    output_stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        count = convert_stream(input_stream, output_stream, args.workers, args.chunk_size)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    print(f"{count} 件の式を変換しました", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+LaTeX変換のマイクロベンチマーク
+LaTeXConverter.convert_to_latex の処理時間を計測し、ベースラインと比較して性能劣化を検出する
+
+使い方:
+    python benchmark_converter.py                    # ベースラインと比較
+    python benchmark_converter.py --update-baseline  # ベースラインを更新
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from latex_converter import LaTeXConverter
+from test_latex_conversion import TEST_CASES
+from test_inequality import INEQUALITY_TEST_CASES
+
+# ベースラインファイルの既定パス
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# ベースラインより何割遅くなったら劣化とみなすか（環境差を吸収するため緩めに設定）
+DEFAULT_TOLERANCE = 0.5
+
+
+def build_benchmark_groups():
+    """計測対象の入力グループを作成（短い式・長い式・病的な式）"""
+    short_cases = list(TEST_CASES) + [expr for expr, _ in INEQUALITY_TEST_CASES]
+
+    # 長い式: 実際の入力に近い項を入力長の上限近くまで連結
+    terms = ['sin(x)', 'cos(2x)', 'sqrt(x^2 + 1)', 'ln(x+1)', '(x+1)/(x-1)', 'abs(x)', 'x^3']
+    long_cases = [
+        'y = ' + ' + '.join(terms * 12),
+        'z = ' + ' * '.join(terms * 12),
+        ' + '.join(terms * 12) + ' <= 1',
+    ]
+
+    # 病的な式: 正規表現のバックトラッキングを誘発しやすい入力
+    # （いずれも入力長の上限 1000 文字以内）
+    pathological_cases = [
+        'sin(' * 250,
+        'a+' * 499 + ' /',
+        'y=' + 'a' * 998,
+        'x<' + 'a+' * 498 + ' /',
+        '(' * 250 + 'x' + ')' * 250,
+        "x'" * 500,
+        'x = ' * 250,
+    ]
+
+    return {
+        'short': short_cases,
+        'long': long_cases,
+        'pathological': pathological_cases,
+    }
+
+
+def time_group(converter, cases, repeat=5, number=20):
+    """グループ内の全入力を1回ずつ変換したときの1式あたり平均時間（マイクロ秒）の中央値"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            for expr in cases:
+                converter.convert_to_latex(expr)
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed / (number * len(cases)) * 1e6)
+    return statistics.median(samples)
+
+
+def collect_outputs(converter):
+    """正しさ確認用に既存テストケースの変換結果を収集"""
+    outputs = {}
+    for expr in TEST_CASES:
+        outputs[expr] = converter.convert_to_latex(expr)
+    for expr, _ in INEQUALITY_TEST_CASES:
+        outputs[expr] = converter.convert_to_latex(expr)
+    return outputs
+
+
+def check_correctness(converter, baseline):
+    """変換結果を期待値およびベースラインと比較し、不一致の一覧を返す"""
+    mismatches = []
+
+    for expr, expected in INEQUALITY_TEST_CASES:
+        result = converter.convert_to_latex(expr)
+        if result != expected:
+            mismatches.append((expr, expected, result))
+
+    if baseline:
+        for expr, expected in baseline.get('outputs', {}).items():
+            result = converter.convert_to_latex(expr)
+            if result != expected:
+                mismatches.append((expr, expected, result))
+
+    return mismatches
+
+
+def load_baseline(path=BASELINE_PATH):
+    """ベースラインを読み込む（存在しない場合はNone）"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(timings, outputs, path=BASELINE_PATH):
+    """ベースラインを保存"""
+    data = {
+        'python': sys.version.split()[0],
+        'timings_us': timings,
+        'outputs': outputs,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def find_regressions(timings, baseline, tolerance=DEFAULT_TOLERANCE):
+    """ベースラインより tolerance 以上遅くなったグループを返す"""
+    regressions = []
+    if not baseline:
+        return regressions
+    for group, value in timings.items():
+        base = baseline.get('timings_us', {}).get(group)
+        if base and value > base * (1 + tolerance):
+            regressions.append((group, base, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LaTeX変換のマイクロベンチマーク')
+    parser.add_argument('--update-baseline', action='store_true', help='計測結果でベースラインを更新する')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='ベースラインファイルのパス')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='許容する劣化率（0.5 = 50%%）')
+    args = parser.parse_args(argv)
+
+    # 変換ごとのログ出力は計測のノイズになるため抑制
+    logging.getLogger('latex_converter').setLevel(logging.WARNING)
+
+    converter = LaTeXConverter()
+    baseline = None if args.update_baseline else load_baseline(args.baseline)
+
+    print("=" * 80)
+    print("LaTeX変換ベンチマーク")
+    print("=" * 80)
+
+    timings = {}
+    for group, cases in build_benchmark_groups().items():
+        timings[group] = round(time_group(converter, cases), 2)
+        base = (baseline or {}).get('timings_us', {}).get(group)
+        base_info = f" (ベースライン: {base:.2f} µs)" if base else ""
+        print(f"{group:>14}: {timings[group]:10.2f} µs/式{base_info}")
+
+    if args.update_baseline:
+        save_baseline(timings, collect_outputs(converter), args.baseline)
+        print(f"\nベースラインを更新しました: {args.baseline}")
+        return 0
+
+    failed = False
+
+    mismatches = check_correctness(converter, baseline)
+    if mismatches:
+        failed = True
+        print("\n✗ 変換結果の不一致:")
+        for expr, expected, result in mismatches:
+            print(f"  入力: {expr}\n  期待: {expected}\n  結果: {result}")
+    else:
+        print("\n✓ 変換結果はすべて一致")
+
+    regressions = find_regressions(timings, baseline, args.tolerance)
+    if regressions:
+        failed = True
+        print("\n✗ 性能劣化を検出:")
+        for group, base, value in regressions:
+            print(f"  {group}: {base:.2f} µs -> {value:.2f} µs ({value / base:.2f}倍)")
+    elif baseline:
+        print("✓ 性能劣化なし")
+    else:
+        print("ℹ️ ベースラインがありません（--update-baseline で作成してください）")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
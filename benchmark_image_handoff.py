@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+画像受け渡しのメモリベンチマーク
+ブラウザから受け取ったbase64をDiscordへ送るBytesIOにするまでの、1回の描画あたりのピークメモリを計測する
+（ブラウザは使わず、同じサイズのダミー画像で計測）
+
+使い方:
+    python benchmark_image_handoff.py                # 既定: 3MB（横長の3Dスクリーンショット相当）
+    python benchmark_image_handoff.py --size-mb 8
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import os
+import sys
+import tracemalloc
+
+from image_payload import decode_capture_payload, image_buffer, image_digest
+
+# ピークメモリが画像サイズの何倍までなら許容するか
+DEFAULT_PEAK_RATIO_BUDGET = 1.5
+
+
+def make_payload(size):
+    """ブラウザから受け取るのと同じ形式のダミーデータ（data URLの接頭辞なしのbase64）"""
+    return base64.b64encode(os.urandom(size)).decode('ascii')
+
+
+def legacy_handoff(payload):
+    """従来の受け渡し（data URL全体を受け取り split -> b64decode -> BytesIO -> getbuffer でハッシュ）"""
+    image_data = 'data:image/png;base64,' + payload
+    image_bytes = base64.b64decode(image_data.split(',')[1])
+    buffer = io.BytesIO(image_bytes)
+    with buffer.getbuffer() as data:
+        hashlib.sha256(data).hexdigest()
+    return buffer
+
+
+def current_handoff(payload):
+    """現在の受け渡し（base64部分のみ受け取り1回デコード、以降は同じ bytes を共有）"""
+    buffer = image_buffer(decode_capture_payload(payload))
+    image_digest(buffer)
+    buffer.getvalue()  # 描画キャッシュへの保存
+    return buffer
+
+
+def measure_peak(handoff, payload):
+    """受け渡し1回分のピークメモリ（バイト、受け取ったbase64文字列自体は含まない）"""
+    tracemalloc.start()
+    try:
+        buffer = handoff(payload)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    buffer.close()
+    return peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='画像受け渡しのピークメモリを計測')
+    parser.add_argument('--size-mb', type=float, default=3.0, help='ダミー画像のサイズ（MB、既定: 3）')
+    parser.add_argument('--budget', type=float, default=DEFAULT_PEAK_RATIO_BUDGET,
+                        help=f'画像サイズに対するピークメモリの上限倍率（既定: {DEFAULT_PEAK_RATIO_BUDGET}）')
+    args = parser.parse_args(argv)
+
+    size = int(args.size_mb * 1024 * 1024)
+    payload = make_payload(size)
+
+    print("画像受け渡しのピークメモリ")
+    print("=" * 60)
+    results = {}
+    for name, handoff in [('legacy', legacy_handoff), ('current', current_handoff)]:
+        peak = measure_peak(handoff, payload)
+        results[name] = peak
+        print(f"  {name:>8}: {peak / 1024 / 1024:8.2f} MB（画像サイズの {peak / size:.2f} 倍）")
+
+    ratio = results['current'] / size
+    if ratio > args.budget:
+        print(f"\n❌ ピークメモリが上限（{args.budget:.2f} 倍）を超えています")
+        return 1
+
+    print(f"\n✓ 上限（{args.budget:.2f} 倍）以内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
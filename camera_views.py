@@ -0,0 +1,65 @@
+"""
+3Dグラフの視点（カメラの向き）
+視点のプリセットと、複数の視点で撮影した画像を1枚にまとめる処理
+"""
+
+import math
+
+from contact_sheet import ContactSheetBuilder
+
+# 視点のプリセット: 名前 -> (方位角, 仰角)（度、方位角0・仰角0で -y 側から水平に見る）
+VIEW_PRESETS = {
+    'front': (0, 0),
+    'side': (90, 0),
+    'top': (0, 90),
+    'isometric': (45, math.degrees(math.atan(1 / math.sqrt(2)))),
+}
+
+# 1つのグラフで撮影する視点の上限と、まとめた画像での1視点の幅（ピクセル）
+MAX_VIEWS = 4
+VIEW_TILE_WIDTH = 960
+
+
+def parse_views(text):
+    """カンマ区切りの視点名をタプルにする（空なら標準の1方向のみ）"""
+    if not text:
+        return ()
+    views = tuple(name.strip().lower() for name in text.split(',') if name.strip())
+    unknown = [name for name in views if name not in VIEW_PRESETS]
+    if unknown:
+        raise ValueError(f"不明な視点です: {', '.join(unknown)}")
+    if len(views) > MAX_VIEWS:
+        raise ValueError(f"視点は{MAX_VIEWS}個までです")
+    return views
+
+
+def view_rotation(name):
+    """視点の回転行列（Desmos 3D の worldRotation3D と同じ、行優先の9要素）
+
+    z軸回りに方位角だけ回したあと、x軸回りに (90° - 仰角) だけ倒す。
+    仰角90°では真上から見下ろし、仰角0°では z軸が画面の上向きになる。
+    """
+    azimuth, elevation = VIEW_PRESETS[name]
+    a = math.radians(-azimuth)
+    t = math.radians(elevation - 90)
+    rotate_z = [
+        [math.cos(a), -math.sin(a), 0],
+        [math.sin(a), math.cos(a), 0],
+        [0, 0, 1],
+    ]
+    tilt_x = [
+        [1, 0, 0],
+        [0, math.cos(t), -math.sin(t)],
+        [0, math.sin(t), math.cos(t)],
+    ]
+    matrix = [[sum(tilt_x[i][k] * rotate_z[k][j] for k in range(3)) for j in range(3)] for i in range(3)]
+    return [round(value, 12) + 0.0 for row in matrix for value in row]
+
+
+def compose_views(captures):
+    """(視点名, PNGデータ) のリストを1枚の画像（PNGデータ）にまとめる（4視点は 2x2 に並べる）"""
+    columns = 2 if len(captures) == 4 else len(captures)
+    builder = ContactSheetBuilder(columns=columns, per_sheet=len(captures), tile_width=VIEW_TILE_WIDTH)
+    for index, (name, image) in enumerate(captures):
+        builder.add(index, image, name)
+    return builder.render()[0]
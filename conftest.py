@@ -0,0 +1,11 @@
+"""
+pytest の共通フィクスチャ
+"""
+
+import pytest
+
+
+@pytest.fixture
+def no_render_cache(monkeypatch):
+    """描画結果のディスクキャッシュを無効にする（テストの間だけ RENDER_CACHE_DIR を空にする）"""
+    monkeypatch.setenv('RENDER_CACHE_DIR', '')
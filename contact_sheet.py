@@ -0,0 +1,121 @@
+"""
+一覧画像（コンタクトシート）の作成
+複数のグラフ画像を縮小してグリッド状に並べ、各画像の下に式を表示する
+（Pillow は起動時間短縮のため、実際に一覧画像を作るときに読み込む）
+"""
+
+import asyncio
+import io
+import threading
+
+# 1枚の一覧画像に並べる列数と最大枚数
+DEFAULT_COLUMNS = 4
+DEFAULT_PER_SHEET = 12
+
+# 1つのグラフの表示幅と、式を表示する欄の高さ（ピクセル）
+DEFAULT_TILE_WIDTH = 480
+LABEL_HEIGHT = 36
+PADDING = 8
+
+BACKGROUND_COLOR = (255, 255, 255)
+LABEL_COLOR = (32, 32, 32)
+ERROR_COLOR = (200, 0, 0)
+
+
+def _shorten(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+class ContactSheetBuilder:
+    """グラフ画像を1枚ずつ受け取って縮小し、最後にグリッド状の一覧画像にまとめる
+
+    add() は別スレッドから並行して呼び出せる（描画中の次のグラフと縮小処理を重ねるため）。
+    """
+
+    def __init__(self, columns=DEFAULT_COLUMNS, per_sheet=DEFAULT_PER_SHEET, tile_width=DEFAULT_TILE_WIDTH):
+        self.columns = columns
+        self.per_sheet = per_sheet
+        self.tile_width = tile_width
+        self._tiles = {}  # 順番 -> 式の欄を含む縮小画像
+        self._lock = threading.Lock()
+
+    def add(self, index, image, label):
+        """index 番目のグラフを追加（image が None の場合は生成失敗として表示）"""
+        from PIL import Image, ImageDraw, ImageFont
+
+        if image is not None:
+            with Image.open(io.BytesIO(image)) as source:
+                graph = source.convert('RGB')
+            graph.thumbnail((self.tile_width, self.tile_width), Image.LANCZOS)
+        else:
+            graph = Image.new('RGB', (self.tile_width, self.tile_width // 2), BACKGROUND_COLOR)
+
+        tile = Image.new('RGB', (self.tile_width, graph.height + LABEL_HEIGHT), BACKGROUND_COLOR)
+        tile.paste(graph, ((self.tile_width - graph.width) // 2, 0))
+
+        draw = ImageDraw.Draw(tile)
+        font = ImageFont.load_default()
+        text = f"{index + 1}. {_shorten(label, 60)}"
+        color = LABEL_COLOR
+        if image is None:
+            text += " (failed)"
+            color = ERROR_COLOR
+        try:
+            draw.text((PADDING, graph.height + PADDING), text, fill=color, font=font)
+        except UnicodeEncodeError:
+            # FreeType がない環境の既定フォントはASCII以外を描けないため置き換える
+            text = text.encode('ascii', 'replace').decode('ascii')
+            draw.text((PADDING, graph.height + PADDING), text, fill=color, font=font)
+
+        with self._lock:
+            self._tiles[index] = tile
+
+    async def add_all(self, images, labels):
+        """(順番, 画像) を順に返す非同期イテレーターから、届いた画像をすぐ別スレッドで縮小する
+
+        縮小は次の画像を待つ間に進む。全ての縮小が終わると、生成に失敗した（画像が None の）数を返す。
+        イテレーターが例外を出した場合は、始めた縮小を取り消して終わるのを待ってから例外を伝える。
+        """
+        tasks = []
+        failed = 0
+        try:
+            async for index, image in images:
+                if image is None:
+                    failed += 1
+                tasks.append(asyncio.create_task(asyncio.to_thread(self.add, index, image, labels[index])))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return failed
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def render(self):
+        """追加した順番通りに並べた一覧画像（PNGデータ）のリストを返す"""
+        from PIL import Image
+
+        indexes = sorted(self._tiles)
+        sheets = []
+        for start in range(0, len(indexes), self.per_sheet):
+            tiles = [self._tiles[index] for index in indexes[start:start + self.per_sheet]]
+            columns = min(self.columns, len(tiles))
+            rows = (len(tiles) + columns - 1) // columns
+            row_height = max(tile.height for tile in tiles)
+
+            sheet = Image.new(
+                'RGB',
+                (columns * self.tile_width + (columns + 1) * PADDING, rows * row_height + (rows + 1) * PADDING),
+                BACKGROUND_COLOR,
+            )
+            for position, tile in enumerate(tiles):
+                row, column = divmod(position, columns)
+                sheet.paste(tile, (PADDING + column * (self.tile_width + PADDING), PADDING + row * (row_height + PADDING)))
+
+            output = io.BytesIO()
+            sheet.save(output, format='PNG', optimize=False)
+            sheets.append(output.getvalue())
+        return sheets
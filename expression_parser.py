@@ -0,0 +1,789 @@
+"""
+数式パーサー
+プレーンな数学記法をトークン化し、再帰下降構文解析で構文木（AST）を作成する
+構文木からDesmos用のLaTeXを線形時間で出力する
+"""
+
+import re
+
+# 関数名 -> (LaTeX開始, LaTeX終了)
+FUNCTION_LATEX = {
+    'sin': (r'\sin\left(', r'\right)'),
+    'cos': (r'\cos\left(', r'\right)'),
+    'tan': (r'\tan\left(', r'\right)'),
+    'sec': (r'\sec\left(', r'\right)'),
+    'csc': (r'\csc\left(', r'\right)'),
+    'cot': (r'\cot\left(', r'\right)'),
+    'asin': (r'\arcsin\left(', r'\right)'),
+    'acos': (r'\arccos\left(', r'\right)'),
+    'atan': (r'\arctan\left(', r'\right)'),
+    'arcsin': (r'\arcsin\left(', r'\right)'),
+    'arccos': (r'\arccos\left(', r'\right)'),
+    'arctan': (r'\arctan\left(', r'\right)'),
+    'sinh': (r'\sinh\left(', r'\right)'),
+    'cosh': (r'\cosh\left(', r'\right)'),
+    'tanh': (r'\tanh\left(', r'\right)'),
+    'ln': (r'\ln\left(', r'\right)'),
+    'log': (r'\log\left(', r'\right)'),
+    'sqrt': (r'\sqrt{', '}'),
+    'exp': ('e^{', '}'),
+    'abs': (r'\left|', r'\right|'),
+    'floor': (r'\operatorname{floor}\left(', r'\right)'),
+    'ceil': (r'\operatorname{ceil}\left(', r'\right)'),
+}
+
+# 「sin^2(x)」のように関数名の直後に指数を書ける関数
+POWERABLE_FUNCTIONS = {
+    'sin', 'cos', 'tan', 'sec', 'csc', 'cot',
+    'sinh', 'cosh', 'tanh', 'ln', 'log',
+}
+
+# ギリシャ文字（英字表記）
+GREEK_NAMES = {
+    'alpha': r'\alpha',
+    'beta': r'\beta',
+    'gamma': r'\gamma',
+    'delta': r'\delta',
+    'epsilon': r'\epsilon',
+    'theta': r'\theta',
+    'lambda': r'\lambda',
+    'mu': r'\mu',
+    'pi': r'\pi',
+    'sigma': r'\sigma',
+    'phi': r'\phi',
+    'omega': r'\omega',
+}
+
+# ギリシャ文字（記号）
+GREEK_SYMBOLS = {
+    'α': r'\alpha',
+    'β': r'\beta',
+    'γ': r'\gamma',
+    'δ': r'\delta',
+    'ε': r'\epsilon',
+    'θ': r'\theta',
+    'λ': r'\lambda',
+    'μ': r'\mu',
+    'π': r'\pi',
+    'σ': r'\sigma',
+    'φ': r'\phi',
+    'ω': r'\omega',
+}
+
+# 関係演算子 -> LaTeX
+RELATION_LATEX = {
+    '=': '=',
+    '<': r'\lt',
+    '>': r'\gt',
+    '<=': r'\le',
+    '>=': r'\ge',
+    '≤': r'\le',
+    '≥': r'\ge',
+}
+
+# 乗算記号 -> LaTeX（* は入力のまま出力する）
+MULTIPLY_LATEX = {
+    '*': '*',
+    '×': r'\times',
+    '·': r'\cdot',
+}
+
+# 括弧の対応
+BRACKET_PAIRS = {'(': ')', '[': ']', '{': '}'}
+
+# ネストの深さの上限（再帰の深さを制限する）
+MAX_NESTING_DEPTH = 50
+
+_TOKEN_PATTERN = re.compile(r'''
+    (?P<ws>\s*)
+    (?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<word>[A-Za-z]+)
+      | (?P<greek>[αβγδεθλμπσφω])
+      | (?P<op><=|>=|\*\*|[-+*/^_=<>≤≥×·÷−!,|()\[\]{}])
+      | (?P<end>$)
+    )
+''', re.VERBOSE)
+
+
+def split_word(word, names=()):
+    """単語を names に含まれる名前と1文字の変数に分割した (位置, 部分) のリスト
+
+    1文字の変数が最も少なくなる分け方を選ぶ（xsinx -> x, sin, x、names が空なら1文字ずつ）。
+    """
+    if not names:
+        return list(enumerate(word))
+
+    # best[i] = word[i:] の分け方の (1文字の変数の数, 部分の数, 最初の部分の長さ)
+    # 名前の長さの上限までしか照合しないため、単語の長さに対して線形時間
+    longest = max(map(len, names))
+    best = [None] * len(word) + [(0, 0, 0)]
+    for start in range(len(word) - 1, -1, -1):
+        letters, count, _ = best[start + 1]
+        best[start] = (letters + 1, count + 1, 1)
+        for end in range(start + 2, min(start + longest, len(word)) + 1):
+            if word[start:end] in names:
+                letters, count, _ = best[end]
+                best[start] = min(best[start], (letters, count + 1, end - start))
+
+    parts = []
+    position = 0
+    while position < len(word):
+        length = best[position][2]
+        parts.append((position, word[position:position + length]))
+        position += length
+    return parts
+
+
+class ExpressionSyntaxError(ValueError):
+    """数式の構文エラー（position は入力文字列中の位置）"""
+
+    def __init__(self, message, position):
+        super().__init__(f"{message}（位置 {position + 1}）")
+        self.message = message
+        self.position = position
+
+
+class Token:
+    """字句解析の結果（ws は直前の空白）"""
+
+    def __init__(self, kind, text, ws, position):
+        self.kind = kind
+        self.text = text
+        self.ws = ws
+        self.position = position
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r}, {self.position})"
+
+
+def tokenize(text):
+    """入力文字列をトークン列に分割"""
+    tokens = []
+    pos = 0
+    length = len(text)
+    while True:
+        match = _TOKEN_PATTERN.match(text, pos)
+        if match is None:
+            ws_end = pos
+            while ws_end < length and text[ws_end].isspace():
+                ws_end += 1
+            raise ExpressionSyntaxError(f"使用できない文字 '{text[ws_end]}' があります", ws_end)
+
+        kind = match.lastgroup
+        ws = match.group('ws')
+        start = match.start(kind)
+        value = match.group(kind)
+
+        # 表記ゆれを正規化
+        if kind == 'op':
+            if value == '−':
+                value = '-'
+            elif value == '÷':
+                value = '/'
+
+        tokens.append(Token(kind, value, ws, start))
+        if kind == 'end':
+            return tokens
+        pos = match.end()
+
+
+class Node:
+    """構文木のノード（ws はノード先頭の直前にあった空白）"""
+
+    ws = ''
+
+    def children(self):
+        return ()
+
+    def walk(self):
+        """自身と子孫ノードを前順で列挙"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children()))
+
+
+class Number(Node):
+    def __init__(self, text, position):
+        self.text = text
+        self.position = position
+
+
+class Symbol(Node):
+    """1文字の変数（x, y, e など）"""
+
+    def __init__(self, text, position):
+        self.text = text
+        self.position = position
+
+
+class Greek(Node):
+    def __init__(self, command, position):
+        self.command = command
+        self.position = position
+
+
+class Group(Node):
+    """括弧でくくられた式（カンマ区切りで複数の要素を持てる）"""
+
+    def __init__(self, open_bracket, items, separators, close_bracket, close_ws, position):
+        self.open_bracket = open_bracket
+        self.items = items
+        self.separators = separators
+        self.close_bracket = close_bracket
+        self.close_ws = close_ws
+        self.position = position
+
+    def children(self):
+        return tuple(self.items)
+
+
+class Abs(Node):
+    def __init__(self, operand, close_ws, position):
+        self.operand = operand
+        self.close_ws = close_ws
+        self.position = position
+
+    def children(self):
+        return (self.operand,)
+
+
+class Call(Node):
+    """関数呼び出し（argument は Group または括弧なしの引数）"""
+
+    def __init__(self, name, argument, power, position):
+        self.name = name
+        self.argument = argument
+        self.power = power
+        self.position = position
+
+    def children(self):
+        if self.power is not None:
+            return (self.power, self.argument)
+        return (self.argument,)
+
+
+class Unary(Node):
+    def __init__(self, op, operand, position):
+        self.op = op
+        self.operand = operand
+        self.position = position
+
+    def children(self):
+        return (self.operand,)
+
+
+class BinaryOp(Node):
+    """+, -, * などの二項演算（op_ws は演算子の直前の空白）"""
+
+    def __init__(self, op, op_ws, left, right, position):
+        self.op = op
+        self.op_ws = op_ws
+        self.left = left
+        self.right = right
+        self.position = position
+
+    def children(self):
+        return (self.left, self.right)
+
+
+class Fraction(Node):
+    def __init__(self, numerator, denominator, position):
+        self.numerator = numerator
+        self.denominator = denominator
+        self.position = position
+
+    def children(self):
+        return (self.numerator, self.denominator)
+
+
+class Implicit(Node):
+    """暗黙の乗算（2x, x(y+1) など）"""
+
+    def __init__(self, left, right, position):
+        self.left = left
+        self.right = right
+        self.position = position
+
+    def children(self):
+        return (self.left, self.right)
+
+
+class Power(Node):
+    def __init__(self, base, exponent, position):
+        self.base = base
+        self.exponent = exponent
+        self.position = position
+
+    def children(self):
+        return (self.base, self.exponent)
+
+
+class Subscript(Node):
+    def __init__(self, base, subscript, position):
+        self.base = base
+        self.subscript = subscript
+        self.position = position
+
+    def children(self):
+        return (self.base, self.subscript)
+
+
+class Factorial(Node):
+    def __init__(self, operand, position):
+        self.operand = operand
+        self.position = position
+
+    def children(self):
+        return (self.operand,)
+
+
+class Relation(Node):
+    """等式・不等式（rest は (演算子, 演算子の直前の空白, 右辺) のリスト）"""
+
+    def __init__(self, first, rest, position):
+        self.first = first
+        self.rest = rest
+        self.position = position
+
+    def children(self):
+        return (self.first,) + tuple(side for _, _, side in self.rest)
+
+
+class ParsedExpression:
+    """構文解析の結果（式全体の前後の空白を保持する）"""
+
+    def __init__(self, source, root, leading_ws, trailing_ws):
+        self.source = source
+        self.root = root
+        self.leading_ws = leading_ws
+        self.trailing_ws = trailing_ws
+
+    def walk(self):
+        return self.root.walk()
+
+    def to_latex(self):
+        """入力の空白を保ったままDesmos用LaTeXを出力"""
+        emitter = LaTeXEmitter(keep_whitespace=True)
+        emitter.write(self.leading_ws)
+        emitter.emit(self.root)
+        emitter.write(self.trailing_ws)
+        return emitter.getvalue()
+
+    def normalized(self):
+        """空白を除いた正規形のLaTeX（キャッシュキーなどに使用）"""
+        emitter = LaTeXEmitter(keep_whitespace=False)
+        emitter.emit(self.root)
+        return emitter.getvalue()
+
+
+class Parser:
+    """再帰下降構文解析器"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.index = 0
+        self.depth = 0
+        self.abs_depth = 0
+
+    # --- トークン操作 ---
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def advance(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def at_op(self, *values):
+        token = self.tokens[self.index]
+        return token.kind == 'op' and token.text in values
+
+    def expect_op(self, value):
+        token = self.peek()
+        if token.kind != 'op' or token.text != value:
+            raise ExpressionSyntaxError(f"'{value}' が必要です", token.position)
+        return self.advance()
+
+    def enter(self, position):
+        self.depth += 1
+        if self.depth > MAX_NESTING_DEPTH:
+            raise ExpressionSyntaxError("括弧のネストが深すぎます", position)
+
+    def leave(self):
+        self.depth -= 1
+
+    # --- 文法規則 ---
+
+    def parse(self):
+        first = self.peek()
+        if first.kind == 'end':
+            raise ExpressionSyntaxError("式が空です", first.position)
+
+        root = self.parse_relation()
+        end = self.peek()
+        if end.kind != 'end':
+            if end.kind == 'op' and end.text in (')', ']', '}'):
+                raise ExpressionSyntaxError(f"対応する開き括弧のない '{end.text}' があります", end.position)
+            raise ExpressionSyntaxError(f"予期しない '{end.text}' があります", end.position)
+
+        leading_ws = root.ws
+        root.ws = ''
+        return ParsedExpression(self.text, root, leading_ws, end.ws)
+
+    def parse_relation(self):
+        first = self.parse_sum()
+        rest = []
+        while self.peek().kind == 'op' and self.peek().text in RELATION_LATEX:
+            op = self.advance()
+            rest.append((op.text, op.ws, self.parse_sum()))
+        if not rest:
+            return first
+        node = Relation(first, rest, first.position)
+        node.ws = first.ws
+        return node
+
+    def parse_sum(self):
+        left = self.parse_term()
+        while self.at_op('+', '-'):
+            op = self.advance()
+            right = self.parse_term()
+            node = BinaryOp(op.text, op.ws, left, right, op.position)
+            node.ws = left.ws
+            left = node
+        return left
+
+    def parse_term(self):
+        left = self.parse_implicit()
+        fractions = 0
+        while self.at_op('*', '×', '·', '/'):
+            op = self.advance()
+            right = self.parse_implicit()
+            if op.text == '/':
+                # 分数は入れ子で出力されるため連続数を制限する
+                fractions += 1
+                if fractions > MAX_NESTING_DEPTH:
+                    raise ExpressionSyntaxError("分数の連続が多すぎます", op.position)
+                node = Fraction(left, right, op.position)
+            else:
+                node = BinaryOp(op.text, op.ws, left, right, op.position)
+            node.ws = left.ws
+            left = node
+        return left
+
+    def parse_implicit(self, stop_at_function=False):
+        left = self.parse_unary()
+        while self.starts_operand(stop_at_function):
+            right = self.parse_power()
+            node = Implicit(left, right, right.position)
+            node.ws = left.ws
+            left = node
+        return left
+
+    def starts_operand(self, stop_at_function=False):
+        """次のトークンが暗黙の乗算の右辺になり得るか"""
+        token = self.peek()
+        if token.kind in ('number', 'greek'):
+            return True
+        if token.kind == 'word':
+            return not (stop_at_function and token.text in FUNCTION_LATEX)
+        if token.kind == 'op':
+            if token.text in BRACKET_PAIRS:
+                return True
+            # 絶対値の中では | は閉じ記号として扱う
+            if token.text == '|':
+                return self.abs_depth == 0
+        return False
+
+    def parse_unary(self):
+        if self.at_op('+', '-'):
+            op = self.advance()
+            self.enter(op.position)
+            operand = self.parse_unary()
+            self.leave()
+            node = Unary(op.text, operand, op.position)
+            node.ws = op.ws
+            return node
+        return self.parse_power()
+
+    def parse_power(self):
+        base = self.parse_postfix()
+        if self.at_op('^', '**'):
+            op = self.advance()
+            self.enter(op.position)
+            exponent = self.parse_unary()
+            self.leave()
+            node = Power(base, exponent, op.position)
+            node.ws = base.ws
+            return node
+        return base
+
+    def parse_postfix(self):
+        node = self.parse_primary()
+        count = 0
+        while True:
+            count += 1
+            if count > MAX_NESTING_DEPTH:
+                raise ExpressionSyntaxError("添字や ! の連続が多すぎます", self.peek().position)
+            if self.at_op('_'):
+                op = self.advance()
+                subscript = self.parse_primary()
+                new_node = Subscript(node, subscript, op.position)
+            elif self.at_op('!'):
+                op = self.advance()
+                new_node = Factorial(node, op.position)
+            else:
+                return node
+            new_node.ws = node.ws
+            node = new_node
+
+    def parse_primary(self):
+        token = self.peek()
+
+        if token.kind == 'number':
+            self.advance()
+            node = Number(token.text, token.position)
+        elif token.kind == 'greek':
+            self.advance()
+            node = Greek(GREEK_SYMBOLS[token.text], token.position)
+        elif token.kind == 'word':
+            node = self.parse_word()
+        elif token.kind == 'op' and token.text in BRACKET_PAIRS:
+            node = self.parse_group()
+        elif token.kind == 'op' and token.text == '|':
+            node = self.parse_abs()
+        elif token.kind == 'end':
+            raise ExpressionSyntaxError("式が途中で終わっています", token.position)
+        else:
+            raise ExpressionSyntaxError(f"'{token.text}' の前に式が必要です", token.position)
+
+        node.ws = token.ws
+        return node
+
+    def parse_word(self):
+        token = self.advance()
+        word = token.text
+
+        if word in FUNCTION_LATEX:
+            return self.parse_call(token)
+        if word in GREEK_NAMES:
+            return Greek(GREEK_NAMES[word], token.position)
+        if len(word) == 1:
+            return Symbol(word, token.position)
+
+        # 未知の単語は1文字ずつの変数の積として扱う（xy -> x*y）
+        parts = split_word(word)
+        node = Symbol(parts[0][1], token.position)
+        for offset, letter in parts[1:]:
+            node = Implicit(node, Symbol(letter, token.position + offset), token.position + offset)
+        return node
+
+    def parse_call(self, name_token):
+        self.enter(name_token.position)
+        power = None
+        if name_token.text in POWERABLE_FUNCTIONS and self.at_op('^'):
+            self.advance()
+            power = self.parse_postfix()
+
+        if self.at_op('('):
+            argument = self.parse_group()
+            argument.ws = ''
+        else:
+            # 括弧なしの引数（sin x, sin 2x など）
+            if not self.starts_operand():
+                raise ExpressionSyntaxError(f"関数 {name_token.text} の引数が必要です", self.peek().position)
+            argument = self.parse_implicit(stop_at_function=True)
+        self.leave()
+        return Call(name_token.text, argument, power, name_token.position)
+
+    def parse_group(self):
+        open_token = self.advance()
+        close_text = BRACKET_PAIRS[open_token.text]
+        self.enter(open_token.position)
+
+        # 括弧の中では絶対値の文脈をリセット
+        saved_abs_depth = self.abs_depth
+        self.abs_depth = 0
+
+        items = []
+        separators = []
+        if self.at_op(close_text):
+            raise ExpressionSyntaxError("括弧の中が空です", self.peek().position)
+        items.append(self.parse_relation())
+        while self.at_op(','):
+            separators.append(self.advance().ws)
+            items.append(self.parse_relation())
+
+        token = self.peek()
+        if token.kind == 'end':
+            raise ExpressionSyntaxError(f"'{open_token.text}' に対応する '{close_text}' がありません", open_token.position)
+        if token.kind != 'op' or token.text != close_text:
+            raise ExpressionSyntaxError(f"'{close_text}' が必要です", token.position)
+        close_token = self.advance()
+
+        self.abs_depth = saved_abs_depth
+        self.leave()
+        return Group(open_token.text, items, separators, close_text, close_token.ws, open_token.position)
+
+    def parse_abs(self):
+        open_token = self.advance()
+        self.enter(open_token.position)
+        self.abs_depth += 1
+        if self.at_op('|'):
+            raise ExpressionSyntaxError("絶対値の中が空です", self.peek().position)
+        operand = self.parse_sum()
+        token = self.peek()
+        if token.kind != 'op' or token.text != '|':
+            raise ExpressionSyntaxError("'|' に対応する '|' がありません", open_token.position)
+        close_token = self.advance()
+        self.abs_depth -= 1
+        self.leave()
+        return Abs(operand, close_token.ws, open_token.position)
+
+
+class LaTeXEmitter:
+    """構文木からLaTeX文字列を組み立てる（部分文字列をリストに追記して最後に連結）"""
+
+    def __init__(self, keep_whitespace=True):
+        self.keep_whitespace = keep_whitespace
+        self.parts = []
+        self.after_command = False
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+    def write(self, text, command=False):
+        if not text:
+            return
+        # \gt x のように制御綴の直後に英字が続く場合は空白で区切る
+        if self.after_command and text[0].isalpha():
+            self.parts.append(' ')
+        self.parts.append(text)
+        self.after_command = command
+
+    def space(self, ws):
+        if self.keep_whitespace and ws:
+            self.write(ws)
+
+    def emit(self, node, with_ws=False):
+        if with_ws:
+            self.space(node.ws)
+
+        if isinstance(node, Number) or isinstance(node, Symbol):
+            self.write(node.text)
+        elif isinstance(node, Greek):
+            self.write(node.command, command=True)
+        elif isinstance(node, Relation):
+            self.emit(node.first)
+            for op, op_ws, side in node.rest:
+                self.space(op_ws)
+                latex = RELATION_LATEX[op]
+                self.write(latex, command=latex.startswith('\\'))
+                self.emit(side, with_ws=True)
+        elif isinstance(node, (BinaryOp, Implicit)):
+            self.emit_chain(node)
+        elif isinstance(node, Unary):
+            self.write(node.op)
+            self.emit(node.operand, with_ws=True)
+        elif isinstance(node, Fraction):
+            self.write(r'\frac{')
+            self.emit_ungrouped(node.numerator)
+            self.write('}{')
+            self.emit_ungrouped(node.denominator)
+            self.write('}')
+        elif isinstance(node, Power):
+            self.emit(node.base)
+            self.write('^')
+            self.emit_script(node.exponent)
+        elif isinstance(node, Subscript):
+            self.emit(node.base)
+            self.write('_')
+            self.emit_script(node.subscript)
+        elif isinstance(node, Factorial):
+            self.emit(node.operand)
+            self.write('!')
+        elif isinstance(node, Call):
+            self.emit_call(node)
+        elif isinstance(node, Group):
+            self.write(node.open_bracket)
+            self.emit_items(node)
+            self.space(node.close_ws)
+            self.write(node.close_bracket)
+        elif isinstance(node, Abs):
+            self.write(r'\left|')
+            self.emit(node.operand, with_ws=True)
+            self.space(node.close_ws)
+            self.write(r'\right|')
+        else:
+            raise TypeError(f"未知のノード: {node!r}")
+
+    def emit_chain(self, node):
+        """左結合の演算の連なり（a+b+c...）を再帰せずに出力"""
+        spine = []
+        while isinstance(node, (BinaryOp, Implicit)):
+            spine.append(node)
+            node = node.left
+        self.emit(node)
+        for link in reversed(spine):
+            if isinstance(link, BinaryOp):
+                self.space(link.op_ws)
+                latex = MULTIPLY_LATEX.get(link.op, link.op)
+                self.write(latex, command=latex.startswith('\\'))
+            self.emit(link.right, with_ws=True)
+
+    def emit_items(self, group):
+        for i, item in enumerate(group.items):
+            if i > 0:
+                self.space(group.separators[i - 1])
+                self.write(',')
+            self.emit(item, with_ws=True)
+
+    def emit_ungrouped(self, node):
+        """分数の分子・分母など: 1組の括弧は外して出力"""
+        if isinstance(node, Group) and node.open_bracket in '({' and len(node.items) == 1:
+            self.emit(node.items[0])
+        else:
+            self.emit(node)
+
+    def emit_script(self, node):
+        """指数・添字: 1文字なら ^2、それ以外は ^{...}"""
+        if isinstance(node, (Number, Symbol)) and len(node.text) == 1:
+            self.write(node.text)
+            return
+        self.write('{')
+        self.emit_ungrouped(node)
+        self.write('}')
+
+    def emit_call(self, node):
+        start, end = FUNCTION_LATEX[node.name]
+        argument = node.argument
+
+        if node.power is not None:
+            # \sin^{2}\left(x\right)
+            self.write(start[:-len(r'\left(')], command=True)
+            self.write('^{')
+            self.emit_ungrouped(node.power)
+            self.write(r'}\left(')
+        else:
+            self.write(start)
+
+        if isinstance(argument, Group) and argument.open_bracket == '(':
+            self.emit_items(argument)
+            self.space(argument.close_ws)
+        else:
+            self.emit(argument)
+        self.write(end)
+
+
+def parse_expression(text):
+    """数式を構文解析して ParsedExpression を返す（構文エラー時は ExpressionSyntaxError）"""
+    return Parser(text).parse()
+
+
+def expression_to_latex(text):
+    """数式をDesmos用LaTeXに変換"""
+    return parse_expression(text).to_latex()
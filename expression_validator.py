@@ -0,0 +1,220 @@
+"""
+数式の事前チェック
+ブラウザで描画する前に、明らかに描画できない式（括弧の対応・未知の関数・空の辺）を検出する
+誤りの位置を返し、入力の下に ^ で示せるようにする
+"""
+
+import re
+import unicodedata
+
+from expression_parser import FUNCTION_LATEX, GREEK_NAMES, BRACKET_PAIRS, split_word
+
+# 変換で扱う関数以外にDesmosが解釈できる関数名・単語（事前チェックで誤りにしない）
+# Desmos の関数一覧（ヘルプの「Function List」）に合わせる
+DESMOS_WORDS = {
+    # 三角関数・双曲線関数
+    'arcsec', 'arccsc', 'arccot', 'sech', 'csch', 'coth',
+    'arcsinh', 'arccosh', 'arctanh', 'arcsech', 'arccsch', 'arccoth',
+    'arsinh', 'arcosh', 'artanh', 'arsech', 'arcsch', 'arcoth',
+    # 統計
+    'min', 'max', 'total', 'length', 'mean', 'median', 'quantile', 'quartile',
+    'var', 'variance', 'stdev', 'stddev', 'stdevp', 'mad', 'cov', 'corr', 'spearman', 'stats', 'count',
+    # 分布・検定
+    'normaldist', 'tdist', 'chisqdist', 'uniformdist', 'binomialdist', 'poissondist', 'geodist',
+    'pdf', 'cdf', 'random', 'ttest', 'tscore', 'ittest',
+    # リスト
+    'repeat', 'join', 'sort', 'shuffle', 'unique', 'for', 'with',
+    # 幾何
+    'polygon', 'distance', 'midpoint', 'segment', 'circle', 'arc', 'angle', 'directedangle',
+    'ray', 'line', 'vector', 'perpendicular', 'parallel', 'glider', 'intersection',
+    'translate', 'rotate', 'dilate', 'reflect',
+    # 整数・丸め
+    'mod', 'sign', 'sgn', 'round', 'gcd', 'lcm', 'nCr', 'nPr',
+    # 複素数
+    'real', 'imag', 'conj', 'arg',
+    # その他
+    'cbrt', 'nthroot', 'erf', 'sum', 'prod', 'int', 'piecewise',
+    'rgb', 'hsv', 'tone', 'histogram', 'dotplot', 'boxplot',
+    'tau', 'infty', 'infinity',
+}
+
+KNOWN_WORDS = set(FUNCTION_LATEX) | set(GREEK_NAMES) | DESMOS_WORDS
+
+# 単語を既知の名前と1文字の変数に分けたとき、1文字の変数がこの数以上続くものを
+# 関数呼び出し（直後に括弧）・単独の単語のそれぞれで誤りとする
+# （ab(x) や xy、xsinx のような単語は変数と関数の積として扱われるため許可する）
+UNKNOWN_FUNCTION_LENGTH = 3
+UNKNOWN_WORD_LENGTH = 4
+
+CLOSING_BRACKETS = {close: open_ for open_, close in BRACKET_PAIRS.items()}
+
+# 関係演算子（LaTeXのコマンドを含む、長いものを先に照合）
+_RELATION_PATTERN = re.compile(r'\\(?:leq?|geq?|lt|gt)(?![A-Za-z])|<=|>=|[=<>≤≥]')
+_WORD_PATTERN = re.compile(r'(?<![\\A-Za-z])[A-Za-z]+')
+# 名前・文字列を引数に取るLaTeXのコマンド（\begin{cases} など、引数の中の単語は調べない）
+_LATEX_NAME_ARGUMENT_PATTERN = re.compile(
+    r'\\(?:begin|end|text|textrm|mathrm|mathit|mathbf|operatorname)\s*\{[^{}]*\}')
+_CALL_PATTERN = re.compile(r'\s*\(')
+_SUBSCRIPT_PREFIX_PATTERN = re.compile(r'_\{?\s*$')
+
+
+class ExpressionValidationError(ValueError):
+    """事前チェックで見つかった誤り（position と length は式の中での位置と長さ）"""
+
+    def __init__(self, message, expression, position, length=1):
+        super().__init__(f"{message}（位置 {position + 1}）")
+        self.message = message
+        self.expression = expression
+        self.position = position
+        self.length = max(1, length)
+        self.index = None  # 複数の式のうち何番目か（1から、1つだけの場合は None）
+
+    def pointer(self):
+        """式と、その下に誤りの位置を ^ で示した2行の文字列"""
+        line = self.expression.replace('\n', ' ')
+        offset = _display_width(line[:self.position])
+        width = _display_width(line[self.position:self.position + self.length]) or 1
+        return f"{line}\n{' ' * offset}{'^' * width}"
+
+
+def _display_width(text):
+    """等幅フォントでの表示幅（全角文字は2）"""
+    return sum(2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1 for char in text)
+
+
+def _check_brackets(text):
+    """括弧の対応（\\{ \\} のようにエスケープされた括弧は数えない）"""
+    stack = []
+    position = 0
+    while position < len(text):
+        char = text[position]
+        if char == '\\':
+            position += 2
+            continue
+        if char in BRACKET_PAIRS:
+            stack.append((char, position))
+        elif char in CLOSING_BRACKETS:
+            if not stack:
+                raise ExpressionValidationError(f"対応する開き括弧のない '{char}' があります", text, position)
+            open_char, open_position = stack.pop()
+            if BRACKET_PAIRS[open_char] != char:
+                raise ExpressionValidationError(
+                    f"'{open_char}' が '{char}' で閉じられています（'{BRACKET_PAIRS[open_char]}' が必要です）", text, position)
+        position += 1
+
+    if stack:
+        open_char, open_position = stack[-1]
+        raise ExpressionValidationError(
+            f"'{open_char}' に対応する '{BRACKET_PAIRS[open_char]}' がありません", text, open_position)
+
+
+def _top_level_relations(text):
+    """括弧の外にある関係演算子の (位置, 演算子) のリスト"""
+    depth = 0
+    relations = []
+    position = 0
+    while position < len(text):
+        match = _RELATION_PATTERN.match(text, position)
+        if match is not None and depth == 0:
+            relations.append((position, match.group()))
+            position = match.end()
+            continue
+        char = text[position]
+        if char == '\\':
+            # LaTeXのコマンド名（\left の後の括弧は数える）とエスケープされた括弧（\{ など）は読み飛ばす
+            position += 1
+            if position < len(text) and not text[position].isalpha():
+                position += 1
+            while position < len(text) and text[position].isalpha():
+                position += 1
+            continue
+        if char in BRACKET_PAIRS:
+            depth += 1
+        elif char in CLOSING_BRACKETS:
+            depth -= 1
+        position += 1
+    return relations
+
+
+def _check_sides(text):
+    """等式・不等式の両辺が空でないか"""
+    relations = _top_level_relations(text)
+    boundaries = [(0, None)] + relations + [(len(text), None)]
+    for (start, before), (end, after) in zip(boundaries, boundaries[1:]):
+        segment_start = start + len(before) if before else start
+        if text[segment_start:end].strip():
+            continue
+        if before is None:
+            raise ExpressionValidationError(f"'{after}' の左辺が空です", text, end, len(after))
+        if after is None:
+            raise ExpressionValidationError(f"'{before}' の右辺が空です", text, start, len(before))
+        raise ExpressionValidationError(f"'{before}' と '{after}' の間に式がありません", text, end, len(after))
+
+
+def _check_words(text):
+    """未知の関数名・単語（LaTeXのコマンド名と、\\operatorname{...} などの名前の引数は対象外）"""
+    # 位置がずれないように、名前の引数は同じ長さの空白に置き換えてから調べる
+    searched = _LATEX_NAME_ARGUMENT_PATTERN.sub(lambda match: ' ' * len(match.group()), text)
+    for match in _WORD_PATTERN.finditer(searched):
+        word = match.group()
+        # 添字（x_max, a_{left} など）の中の単語は名前の一部として許可
+        if _SUBSCRIPT_PREFIX_PATTERN.search(text, max(0, match.start() - 4), match.start()):
+            continue
+
+        for offset, run in _unknown_runs(word):
+            start = match.start() + offset
+            is_call = offset + len(run) == len(word) and _CALL_PATTERN.match(text, match.end()) is not None
+            if is_call and len(run) >= UNKNOWN_FUNCTION_LENGTH:
+                raise ExpressionValidationError(f"関数 {run} は使用できません", text, start, len(run))
+            if len(run) >= UNKNOWN_WORD_LENGTH:
+                raise ExpressionValidationError(
+                    f"'{run}' は使用できない単語です（変数は1文字で指定してください）", text, start, len(run))
+
+
+def _unknown_runs(word):
+    """単語を既知の名前と1文字の変数に分け（パーサーと同じ分け方）、続いた1文字の変数の (位置, 文字列) を返す"""
+    runs = []
+    for offset, part in split_word(word, KNOWN_WORDS):
+        if part in KNOWN_WORDS:
+            continue
+        if runs and runs[-1][0] + len(runs[-1][1]) == offset:
+            runs[-1] = (runs[-1][0], runs[-1][1] + part)
+        else:
+            runs.append((offset, part))
+    return runs
+
+
+def validate_expression(text):
+    """1つの式を事前チェック（誤りがあれば ExpressionValidationError）"""
+    if not text.strip():
+        raise ExpressionValidationError("式が空です", text, 0)
+    _check_brackets(text)
+    _check_sides(text)
+    _check_words(text)
+
+
+def validate_expressions(parts):
+    """複数の式を順に事前チェック（誤りのある式の番号を index に設定）"""
+    for index, part in enumerate(parts, 1):
+        try:
+            validate_expression(part)
+        except ExpressionValidationError as e:
+            if len(parts) > 1:
+                e.index = index
+            raise
+
+
+class DesmosExpressionError(Exception):
+    """描画中にDesmosが報告した式の誤り（事前チェックで見つからなかったもの）
+
+    errors は (式の番号, Desmosのメッセージ) のリスト（式が1つだけの場合、番号は None）。
+    console_errors は式の設定中にページのコンソールに出たエラー（参考情報）。
+    """
+
+    def __init__(self, errors, console_errors=()):
+        self.errors = [(index, message) for index, message in errors]
+        self.console_errors = list(console_errors)
+        details = "; ".join(
+            f"{index}番目の式: {message}" if index else message for index, message in self.errors
+        )
+        super().__init__(f"Desmosが式を解釈できません: {details}")
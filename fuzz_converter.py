@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+LaTeX変換のファズテスト
+正規表現の破滅的バックトラックを起こしやすい入力（閉じない括弧、連続する / や = など）を
+上限長ぎりぎりまで生成し、1件あたりの変換時間が上限を超えないかを確認する
+
+使い方:
+    python fuzz_converter.py                  # 既定の設定で実行
+    python fuzz_converter.py --seed 1 --iterations 2000 --ceiling-ms 50
+"""
+
+import argparse
+import logging
+import random
+import sys
+import time
+
+from latex_converter import LaTeXConverter, MAX_EXPRESSION_LENGTH
+
+# 1件あたりの変換時間の上限（ミリ秒）
+DEFAULT_CEILING_MS = 50.0
+
+# バックトラックを誘発しやすい部品
+ADVERSARIAL_MOTIFS = [
+    '(', ')', '((', '/', '//', '=', '==', ' ', 'x', 'ab', '1',
+    'sin(', 'sqrt(', '<', '<=', '>=', '**', '^', '|', "'", '\\',
+    '(x)/(', 'x/y', 'a = b/', 'θ', 'π', ',',
+]
+
+# 長さ上限まで同じ部品を繰り返す、既知の最悪パターン
+PATHOLOGICAL_SEEDS = [
+    '(', 'sin(', '(x)/', 'a/', 'x = ', '= x/y ', 'x ', 'x <= ', "x'", '/(',
+]
+
+
+def adversarial_inputs(seed=0, iterations=500, max_length=MAX_EXPRESSION_LENGTH):
+    """敵対的な入力を生成する（既知の最悪パターンの後にランダムな組み合わせを返す）"""
+    for motif in PATHOLOGICAL_SEEDS:
+        yield (motif * (max_length // len(motif) + 1))[:max_length]
+
+    rng = random.Random(seed)
+    for _ in range(iterations):
+        # 少数の部品を選んで長さ上限まで繰り返すと、同じ形の反復で最悪ケースに近づく
+        motifs = rng.sample(ADVERSARIAL_MOTIFS, rng.randint(1, 4))
+        parts = []
+        length = 0
+        target = rng.randint(max_length // 2, max_length)
+        while length < target:
+            motif = rng.choice(motifs)
+            parts.append(motif)
+            length += len(motif)
+        yield ''.join(parts)[:max_length]
+
+
+def run_fuzz(converter, inputs, ceiling_ms=DEFAULT_CEILING_MS):
+    """各入力の変換時間を計測し、(件数, 最大時間ms, 最も遅い入力, 上限超過のリスト) を返す"""
+    count = 0
+    worst_ms = 0.0
+    worst_input = None
+    slow = []
+
+    for expression in inputs:
+        started = time.perf_counter()
+        converter.convert_to_latex(expression)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        count += 1
+
+        if elapsed_ms > worst_ms:
+            worst_ms = elapsed_ms
+            worst_input = expression
+        if elapsed_ms > ceiling_ms:
+            slow.append((expression, elapsed_ms))
+
+    return count, worst_ms, worst_input, slow
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LaTeX変換のファズテスト（変換時間の上限を確認）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード（既定: 0）')
+    parser.add_argument('--iterations', type=int, default=500, help='ランダム入力の件数（既定: 500）')
+    parser.add_argument('--ceiling-ms', type=float, default=DEFAULT_CEILING_MS,
+                        help=f'1件あたりの変換時間の上限ミリ秒（既定: {DEFAULT_CEILING_MS}）')
+    args = parser.parse_args(argv)
+
+    # 変換ごとのログは計測の邪魔になるので抑制
+    logging.getLogger('latex_converter').setLevel(logging.ERROR)
+
+    inputs = adversarial_inputs(args.seed, args.iterations)
+    count, worst_ms, worst_input, slow = run_fuzz(LaTeXConverter(), inputs, args.ceiling_ms)
+
+    print(f"{count} 件を変換 / 最大 {worst_ms:.2f} ms（上限 {args.ceiling_ms:.1f} ms）")
+    if worst_input is not None:
+        print(f"最も遅い入力: {worst_input[:60]!r}...")
+
+    if slow:
+        print(f"❌ 上限を超えた入力: {len(slow)} 件")
+        for expression, elapsed_ms in sorted(slow, key=lambda item: -item[1])[:5]:
+            print(f"  {elapsed_ms:8.2f} ms  {expression[:60]!r}")
+        return 1
+
+    print("✅ すべての入力が上限時間内に変換されました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+グラフ画像のキャプション
+計算機のスクリーンショットAPIで直接撮影した画像には GraTeX のキャプションが付かないため、
+GraTeX と同じく右下に式を描き、ラベルサイズで文字の大きさを変える
+（Pillow は起動時間短縮のため、実際にキャプションを描くときに読み込む）
+"""
+
+import io
+
+# ラベルサイズ 1 あたりの文字の大きさ（ピクセル比 1 のときのピクセル数）
+CAPTION_FONT_UNIT = 9
+# 画像の端・キャプションの背景の余白（ピクセル比 1 のときのピクセル数）
+CAPTION_MARGIN = 16
+CAPTION_PADDING = 8
+# 画像の幅に対するキャプションの最大幅（収まらない場合は文字を小さくする）
+CAPTION_MAX_WIDTH_RATIO = 0.9
+
+# キャプションを描いた画像を保存するときのPNGの圧縮レベル（0〜9、小さいほど速く大きい）
+CAPTION_PNG_COMPRESS_LEVEL = 1
+
+CAPTION_COLOR = (0, 0, 0)
+CAPTION_BACKGROUND = (255, 255, 255, 220)
+
+# Unicode（θ, π など）を描けるフォントを優先し、なければ Pillow の既定フォントを使う
+CAPTION_FONTS = ('DejaVuSans.ttf', 'Arial.ttf')
+
+
+def _load_font(size):
+    from PIL import ImageFont
+
+    for name in CAPTION_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # 大きさを指定できない古い Pillow
+        return ImageFont.load_default()
+
+
+def _fit_font(draw, text, size, max_width):
+    """max_width に収まるまで文字を小さくしたフォント"""
+    while True:
+        font = _load_font(size)
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        if right - left <= max_width or size <= 8:
+            return font
+        size = max(8, int(size * max_width / (right - left)))
+
+
+def add_caption(image, text, label_size, pixel_ratio=1):
+    """PNGデータ image の右下に text を描いたPNGデータを返す（文字の大きさは label_size × ピクセル比に比例）
+
+    合成はキャプションの部分だけで行い、PNGは圧縮率を下げて保存する（大きな画像の再エンコードの時間を抑える）。
+    """
+    from PIL import Image, ImageDraw
+
+    with Image.open(io.BytesIO(image)) as source:
+        graph = source.convert('RGB')
+
+    margin = round(CAPTION_MARGIN * pixel_ratio)
+    padding = round(CAPTION_PADDING * pixel_ratio)
+    size = round(CAPTION_FONT_UNIT * label_size * pixel_ratio)
+    max_width = graph.width * CAPTION_MAX_WIDTH_RATIO - 2 * padding
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    try:
+        font = _fit_font(measure, text, size, max_width)
+    except UnicodeEncodeError:
+        # FreeType がない環境の既定フォントはASCII以外を描けないため置き換える
+        text = text.encode('ascii', 'replace').decode('ascii')
+        font = _fit_font(measure, text, size, max_width)
+
+    left, top, right, bottom = measure.textbbox((0, 0), text, font=font)
+    box = (
+        max(0, graph.width - margin - 2 * padding - (right - left)),
+        max(0, graph.height - margin - 2 * padding - (bottom - top)),
+        graph.width - margin,
+        graph.height - margin,
+    )
+    region = graph.crop(box).convert('RGBA')
+    overlay = Image.new('RGBA', region.size, CAPTION_BACKGROUND)
+    ImageDraw.Draw(overlay).text((padding - left, padding - top), text, fill=CAPTION_COLOR, font=font)
+    graph.paste(Image.alpha_composite(region, overlay).convert('RGB'), box[:2])
+
+    buffer = io.BytesIO()
+    graph.save(buffer, format='PNG', compress_level=CAPTION_PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
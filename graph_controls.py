@@ -0,0 +1,91 @@
+"""
+グラフ操作用のボタン・セレクトメニュー
+リアクションを1つずつ追加する代わりに、画像を送信する編集と同時に操作部品を付ける
+"""
+
+import logging
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# 選択できるラベルサイズ
+LABEL_SIZES = [1, 2, 3, 4, 6, 8]
+
+
+class GraphControlsView(discord.ui.View):
+    """グラフメッセージの操作部品（ラベルサイズ・ズーム・再生成・完了・削除）
+
+    操作は on_action(message, action, value) に渡す。
+    on_action が False を返したら（完了・削除など）操作の受け付けを終了する。
+    """
+
+    def __init__(self, owner_id, mode, on_action, label_size=4, timeout=300):
+        super().__init__(timeout=timeout)
+        self.owner_id = owner_id
+        self.on_action = on_action
+        self.message = None  # タイムアウト時に操作部品を外すためのメッセージ
+
+        self.label_size_select.options = [
+            discord.SelectOption(label=f"ラベルサイズ {size}", value=str(size), default=(size == label_size))
+            for size in LABEL_SIZES
+        ]
+
+        # モードに応じて使わない部品を外す
+        if mode == "3d":
+            self.remove_item(self.zoom_in_button)
+            self.remove_item(self.zoom_out_button)
+        else:
+            self.remove_item(self.refresh_button)
+
+    async def interaction_check(self, interaction):
+        """コマンドを実行したユーザーだけが操作できる"""
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("❌ このグラフを操作できるのはコマンドを実行したユーザーのみです", ephemeral=True)
+            return False
+        return True
+
+    async def dispatch(self, interaction, action, value=None):
+        """操作を受け付けて on_action に渡す"""
+        # 3秒以内に応答する必要があるため、先に応答を保留してから描画する
+        await interaction.response.defer()
+        try:
+            keep = await self.on_action(interaction.message, action, value)
+        except Exception as e:
+            logger.error(f"操作部品の処理エラー: {e}")
+            return
+        if not keep:
+            self.stop()
+
+    @discord.ui.select(placeholder="ラベルサイズ", row=0)
+    async def label_size_select(self, interaction, select):
+        await self.dispatch(interaction, 'label_size', int(select.values[0]))
+
+    @discord.ui.button(emoji='🔍', label="拡大", style=discord.ButtonStyle.secondary, row=1)
+    async def zoom_in_button(self, interaction, button):
+        await self.dispatch(interaction, 'zoom', 'in')
+
+    @discord.ui.button(emoji='🔭', label="縮小", style=discord.ButtonStyle.secondary, row=1)
+    async def zoom_out_button(self, interaction, button):
+        await self.dispatch(interaction, 'zoom', 'out')
+
+    @discord.ui.button(emoji='🔄', label="再生成", style=discord.ButtonStyle.secondary, row=1)
+    async def refresh_button(self, interaction, button):
+        await self.dispatch(interaction, 'refresh')
+
+    @discord.ui.button(emoji='✅', label="完了", style=discord.ButtonStyle.success, row=1)
+    async def done_button(self, interaction, button):
+        await self.dispatch(interaction, 'done')
+
+    @discord.ui.button(emoji='🚮', label="削除", style=discord.ButtonStyle.danger, row=1)
+    async def delete_button(self, interaction, button):
+        await self.dispatch(interaction, 'delete')
+
+    async def on_timeout(self):
+        """一定時間操作がなければ操作部品を外す"""
+        if self.message is None:
+            return
+        try:
+            await self.message.edit(view=None)
+        except discord.HTTPException as e:
+            logger.warning(f"操作部品の削除に失敗: {e}")
@@ -0,0 +1,760 @@
+"""
+GraTeX（Desmos）を操作するブラウザでのグラフ描画
+ゲートウェイ（main.py）のプロセス内、または描画ワーカー（render_worker.py）のプロセスで使う
+"""
+
+import asyncio
+import collections
+import logging
+import time
+
+from render_cache import RenderCache
+from image_payload import decode_capture_payload, image_buffer
+from graph_caption import add_caption
+from animation import format_parameter_value
+from camera_views import view_rotation, compose_views
+from expression_validator import DesmosExpressionError
+from render_timing import RenderTiming, timing_key
+from render_request import OUTPUT_SIZES, DEFAULT_OUTPUT_SIZE
+
+# Playwright はブラウザ初期化時に読み込む（起動時間短縮のため）
+
+logger = logging.getLogger(__name__)
+
+# 式を設定してから撮影するまでの待ち時間（秒、描画時間の統計がたまるまでの既定値）
+RENDER_SETTLE_SECONDS = 3.0
+# 一括生成ではページの準備が済んでいるため短くてよい
+BATCH_SETTLE_SECONDS = 1.0
+
+# 撮影の完了を待つ時間（秒、描画時間の統計がたまるまでの既定値）
+CAPTURE_TIMEOUT = 20.0
+
+# 計算機を空にして式を設定（式ごとに expr1, expr2, ... のIDを付ける）
+# definitions（{id, latex} のリスト）は式と同時に設定する定義（アニメーションのパラメータなど）
+# 式は引数で渡すため、JavaScript用のエスケープは不要
+SET_EXPRESSIONS_JS = """
+    ([calculatorName, latexList, definitions]) => {
+        const calculator = window.GraTeX && window.GraTeX[calculatorName];
+        if (!calculator) {
+            throw new Error(`GraTeX.${calculatorName} が利用できません`);
+        }
+        calculator.setBlank();
+        latexList.forEach((latex, index) => {
+            calculator.setExpression({id: `expr${index + 1}`, latex: latex});
+        });
+        (definitions || []).forEach((definition) => calculator.setExpression(definition));
+        console.log("数式を設定しました:", latexList);
+    }
+"""
+
+# 式の解析結果（expressionAnalysis）を待つ時間（秒、描画時間の統計がたまるまでの既定値）と、確認する間隔（ミリ秒）
+ANALYSIS_TIMEOUT = 1.5
+ANALYSIS_POLL_MS = 50
+
+# 設定した式の解析結果を待ち、{pending: 時間内に解析が終わらなかったか, errors: Desmosが誤りとした式の {id, message}} を返す
+# 解析結果を読めない計算機では null、時間内に解析が終わらなかった式は誤りとしない
+EXPRESSION_ERRORS_JS = """
+    async ([calculatorName, ids, timeoutMs, pollMs]) => {
+        const calculator = window.GraTeX[calculatorName];
+        if (!calculator || calculator.expressionAnalysis === undefined) {
+            return null;
+        }
+        const analyzed = () => ids.every((id) => calculator.expressionAnalysis[id] !== undefined);
+        const deadline = Date.now() + timeoutMs;
+        while (Date.now() < deadline && !analyzed()) {
+            await new Promise((resolve) => setTimeout(resolve, pollMs));
+        }
+        const errors = ids
+            .filter((id) => calculator.expressionAnalysis[id] && calculator.expressionAnalysis[id].isError)
+            .map((id) => ({id: id, message: calculator.expressionAnalysis[id].errorMessage || "不明なエラー"}));
+        return {pending: !analyzed(), errors: errors};
+    }
+"""
+
+# 式の設定中に記録するページのコンソールエラーの最大件数
+CONSOLE_ERROR_LIMIT = 10
+
+# パラメータを動かすアニメーションで、フレーム間にパラメータを変更してから撮影するまでの待ち時間（秒）
+SWEEP_SETTLE_SECONDS = 0.3
+SWEEP_PARAMETER_ID = 'sweep-parameter'
+
+# 指定したIDの式だけを書き換える（他の式はそのまま）
+SET_PARAMETER_JS = """
+    ([calculatorName, id, latex]) => {
+        window.GraTeX[calculatorName].setExpression({id: id, latex: latex});
+    }
+"""
+
+# 3Dの複数視点撮影で、カメラの回転を変えてから撮影するまでの待ち時間（秒）
+VIEW_SETTLE_SECONDS = 0.5
+
+# 3Dのカメラの回転（worldRotation3D）だけを変える（式やその他の設定はそのまま）
+SET_VIEW_ROTATION_JS = """
+    ([calculatorName, rotation]) => {
+        const calculator = window.GraTeX[calculatorName];
+        const state = calculator.getState();
+        state.graph.worldRotation3D = rotation;
+        calculator.setState(state, {allowUndo: false});
+    }
+"""
+
+# 撮影する画像の形式（Discordに添付するため PNG）
+CAPTURE_FORMAT = 'png'
+
+# 計算機のスクリーンショットAPIで、大きさ・ピクセル比・形式を指定して直接撮影する
+# GraTeXの画面（ボタン・プレビュー）を経由しないため、DOMの確認は不要
+# API が使えない計算機では null、timeoutMs 以内に撮影できなければ {timedOut: true}、撮影できれば base64 部分を返す
+DIRECT_SCREENSHOT_JS = """
+    ([calculatorName, width, height, pixelRatio, format, timeoutMs]) => {
+        const calculator = window.GraTeX && window.GraTeX[calculatorName];
+        if (!calculator || typeof calculator.asyncScreenshot !== 'function') {
+            return null;
+        }
+        return new Promise((resolve) => {
+            const timer = setTimeout(() => resolve({timedOut: true}), timeoutMs);
+            calculator.asyncScreenshot(
+                {width: width, height: height, targetPixelRatio: pixelRatio, format: format, showLabels: true},
+                (dataUrl) => {
+                    clearTimeout(timer);
+                    resolve({payload: dataUrl.slice(dataUrl.indexOf(',') + 1)});
+                }
+            );
+        });
+    }
+"""
+
+# 以下はスクリーンショットボタンで撮影する場合（APIが使えない場合のフォールバック）
+# 撮影前に前回の画像を消す
+CLEAR_PREVIEW_JS = """
+    () => {
+        const previewImg = document.getElementById('preview');
+        if (previewImg) {
+            previewImg.removeAttribute('src');
+        }
+    }
+"""
+
+# 画像生成の完了判定
+PREVIEW_READY_JS = """
+    () => {
+        const previewImg = document.getElementById('preview');
+        return previewImg && previewImg.src && previewImg.src.length > 100;
+    }
+"""
+
+# 生成された画像のbase64部分（data URLの接頭辞を除いて返し、Python側での文字列のコピーを減らす）
+PREVIEW_PAYLOAD_JS = """
+    () => {
+        const previewImg = document.getElementById('preview');
+        if (!previewImg || !previewImg.src) {
+            return null;
+        }
+        
+        // imgのsrcがdata URLの場合はそのまま使う
+        let dataUrl = previewImg.src;
+        if (!dataUrl.startsWith('data:')) {
+            // imgのsrcがblobやURLの場合は、canvasに描画してdata URLを取得
+            const canvas = document.createElement('canvas');
+            const ctx = canvas.getContext('2d');
+            
+            canvas.width = previewImg.naturalWidth || previewImg.width;
+            canvas.height = previewImg.naturalHeight || previewImg.height;
+            
+            ctx.drawImage(previewImg, 0, 0);
+            dataUrl = canvas.toDataURL('image/png');
+        }
+        return dataUrl.slice(dataUrl.indexOf(',') + 1);
+    }
+"""
+
+# フォールバック: ページ内のキャンバスから直接取得
+CANVAS_PAYLOAD_JS = """
+    () => {
+        const allCanvas = document.querySelectorAll('canvas');
+        for (let canvas of allCanvas) {
+            if (canvas.width > 0 && canvas.height > 0) {
+                try {
+                    const dataUrl = canvas.toDataURL('image/png');
+                    return dataUrl.slice(dataUrl.indexOf(',') + 1);
+                } catch (e) {
+                    continue;
+                }
+            }
+        }
+        return null;
+    }
+"""
+
+class GraTeXBot:
+    def __init__(self):
+        self.browser = None
+        self.page = None
+        # ページは1つなので描画は1件ずつ行う
+        self.render_lock = asyncio.Lock()
+        # 描画結果のディスクキャッシュ（RENDER_CACHE_DIR が空なら無効）
+        self.render_cache = RenderCache.from_env()
+        # 完了を待たない処理（参照を保持してガベージコレクションを防ぐ）
+        self.background_tasks = set()
+        # 式の設定中に出たページのコンソールエラー（Desmosのエラーの参考情報）
+        self.console_errors = collections.deque(maxlen=CONSOLE_ERROR_LIMIT)
+        # Desmosが式を誤りとしたため撮影せずに中止した描画の数
+        self.desmos_error_aborts = 0
+        # モード・式の複雑さごとの描画時間（待ち時間とタイムアウトを決める）
+        self.render_timing = RenderTiming()
+        
+    async def render(self, request):
+        """RenderRequestのモードに応じてグラフを生成（キャッシュにあればブラウザを使わずに返す）"""
+        cache_key = request.cache_key()
+        cached = await self.load_cached(cache_key)
+        if cached is not None:
+            logger.info(f"💾 描画キャッシュを使用: {request!r}")
+            return image_buffer(cached)
+        
+        # 描画中の他の要求は順番待ち
+        async with self.render_lock:
+            if request.mode == "3d" and request.views:
+                image = await self.generate_3d_views(request)
+            elif request.mode == "3d":
+                image = await self.generate_3d_graph(request)
+            else:
+                image = await self.generate_graph(request)
+        
+        await self.store_cached(cache_key, image.getvalue())
+        return image
+    
+    async def render_batch(self, requests):
+        """複数の2Dリクエストを続けて撮影し、(順番, PNGデータ) を撮影できた順に返す
+        
+        ページの準備は1回だけ行い、式の設定と撮影だけを繰り返す（ページは1つなので、式の設定・描画の待ち時間・撮影は1式ずつ順に行う）。
+        キャッシュ済みのものはブラウザを使わない。失敗したものは PNGデータが None になる。
+        """
+        pending = []
+        for index, request in enumerate(requests):
+            cached = await self.load_cached(request.cache_key())
+            if cached is not None:
+                yield index, cached
+            else:
+                pending.append(index)
+        
+        if not pending:
+            return
+        
+        async with self.render_lock:
+            await self.prepare_2d_page(requests[pending[0]].label_size)
+            
+            for index in pending:
+                request = requests[index]
+                key = timing_key(request)
+                try:
+                    await self.set_expressions('calculator2D', request.latex_expressions, key)
+                    if request.zoom_level != 0:
+                        await self.apply_zoom_level(request.zoom_level)
+                    
+                    # ページの準備が済んでいるため、描画の待ち時間は1枚ずつの生成より短くてよい
+                    await asyncio.sleep(self.render_timing.settle_seconds(key, BATCH_SETTLE_SECONDS))
+                    image = await self.capture_screenshot("一括", key, size=request.screenshot_size, caption=request.caption)
+                except Exception as e:
+                    logger.error(f"一括生成エラー ({index + 1}番目): {e}")
+                    yield index, None
+                    continue
+                
+                # キャッシュへの保存は次の撮影と並行して行う
+                task = asyncio.create_task(self.store_cached(request.cache_key(), image))
+                self.background_tasks.add(task)
+                task.add_done_callback(self.background_tasks.discard)
+                yield index, image
+    
+    async def render_sweep(self, request, parameter, values):
+        """パラメータを values の各値にしながら撮影し、フレーム（PNGデータ）を順に返す
+        
+        式の設定は最初の1回だけで、フレーム間ではパラメータの式だけを書き換える（再読み込み・setBlankなし）。
+        """
+        key = timing_key(request)
+        async with self.render_lock:
+            await self.prepare_2d_page(request.label_size)
+            # パラメータは式と同時に最初の値で定義する（式の誤りの確認で未定義の変数とされないように）
+            parameter_definition = {'id': SWEEP_PARAMETER_ID, 'latex': f"{parameter}={format_parameter_value(values[0])}"}
+            await self.set_expressions('calculator2D', request.latex_expressions, key, [parameter_definition])
+            if request.zoom_level != 0:
+                await self.apply_zoom_level(request.zoom_level)
+            
+            for number, value in enumerate(values, 1):
+                await self.page.evaluate(
+                    SET_PARAMETER_JS,
+                    ['calculator2D', SWEEP_PARAMETER_ID, f"{parameter}={format_parameter_value(value)}"]
+                )
+                # 最初のフレームは式全体、以降はパラメータの変更分だけ描画を待つ
+                if number == 1:
+                    await asyncio.sleep(self.render_timing.settle_seconds(key, BATCH_SETTLE_SECONDS))
+                else:
+                    await asyncio.sleep(SWEEP_SETTLE_SECONDS)
+                yield await self.capture_screenshot(
+                    f"フレーム{number}/{len(values)}", key, size=request.screenshot_size, caption=request.caption)
+    
+    async def set_expressions(self, calculator_name, latex_expressions, key=None, definitions=()):
+        """式を設定し、Desmosが誤りとした式があればすぐに DesmosExpressionError で中止する
+        
+        描画の待ち時間・撮影の前に止めるため、呼び出し側の render_lock もすぐに解放される。
+        key（描画時間の統計の区分）を指定すると、解析結果を待つ時間を統計から決め、かかった時間を記録する。
+        definitions（{id, latex} のリスト）は式と同時に設定するため、式が使う変数を未定義の誤りにしない。
+        """
+        latex_list = list(latex_expressions)
+        ids = [f"expr{index}" for index in range(1, len(latex_list) + 1)]
+        timeout = self.render_timing.analysis_timeout(key, ANALYSIS_TIMEOUT) if key else ANALYSIS_TIMEOUT
+        self.console_errors.clear()
+        await self.page.evaluate(SET_EXPRESSIONS_JS, [calculator_name, latex_list, list(definitions)])
+        
+        started = time.perf_counter()
+        analysis = await self.page.evaluate(
+            EXPRESSION_ERRORS_JS, [calculator_name, ids, round(timeout * 1000), ANALYSIS_POLL_MS])
+        if analysis is None:
+            return
+        if key:
+            # 時間内に終わらなかった場合は待った時間を記録し、次回の待ち時間を延ばす
+            self.render_timing.record(key, 'analysis', time.perf_counter() - started)
+        errors = analysis['errors']
+        if not errors:
+            return
+        
+        numbered = len(ids) > 1
+        error = DesmosExpressionError(
+            [(ids.index(item['id']) + 1 if numbered else None, item['message']) for item in errors],
+            self.console_errors,
+        )
+        self.desmos_error_aborts += 1
+        logger.warning(f"⛔ Desmosのエラーで描画を中止: {error}")
+        if error.console_errors:
+            logger.warning(f"コンソールのエラー: {error.console_errors}")
+        raise error
+    
+    def record_console_message(self, message):
+        """ページのコンソール出力のうちエラーだけを記録"""
+        if message.type == 'error':
+            self.console_errors.append(message.text)
+    
+    async def load_cached(self, cache_key):
+        """描画キャッシュからPNGデータを取得（ない・無効の場合は None）"""
+        if self.render_cache is None:
+            return None
+        try:
+            return await asyncio.to_thread(self.render_cache.get, cache_key)
+        except Exception as e:
+            logger.warning(f"描画キャッシュの読み込みに失敗: {e}")
+            return None
+    
+    async def store_cached(self, cache_key, image):
+        """PNGデータを描画キャッシュに保存"""
+        if self.render_cache is None:
+            return
+        try:
+            await asyncio.to_thread(self.render_cache.put, cache_key, image)
+        except Exception as e:
+            logger.warning(f"描画キャッシュの書き込みに失敗: {e}")
+        
+    async def initialize_browser(self):
+        """Playwrightブラウザを初期化"""
+        try:
+            from playwright.async_api import async_playwright
+            
+            self.playwright = await async_playwright().start()
+            
+            # Railway環境用のブラウザ起動オプション
+            self.browser = await self.playwright.chromium.launch(
+                headless=True,
+                args=[
+                    '--no-sandbox',
+                    '--disable-dev-shm-usage',
+                    '--disable-gpu',
+                    '--disable-web-security',
+                    '--disable-features=VizDisplayCompositor',
+                    '--disable-background-timer-throttling',
+                    '--disable-backgrounding-occluded-windows',
+                    '--disable-renderer-backgrounding'
+                ]
+            )
+            
+            self.page = await self.browser.new_page()
+            self.page.on('console', self.record_console_message)
+            self.page.on('pageerror', lambda error: self.console_errors.append(str(error)))
+            
+            # タイムアウトを延長
+            self.page.set_default_timeout(30000)
+            
+            # GraTeXページにアクセス（リトライ付き）
+            max_retries = 3
+            for attempt in range(max_retries):
+                try:
+                    await self.page.goto('https://teth-main.github.io/GraTeX/?wide=true&credit=true', 
+                                        wait_until='networkidle', timeout=30000)
+                    logger.info(f"GraTeXページへのアクセス成功 (試行 {attempt + 1})")
+                    break
+                except Exception as e:
+                    if attempt == max_retries - 1:
+                        raise e
+                    logger.warning(f"GraTeXページアクセス失敗 (試行 {attempt + 1}): {e}")
+                    await asyncio.sleep(2)
+            
+            logger.info("ブラウザの初期化が完了しました")
+            
+        except Exception as e:
+            logger.error(f"ブラウザの初期化に失敗: {e}")
+            raise
+    
+    async def prepare_2d_page(self, label_size):
+        """2D描画の準備（ページ・2Dモード・ラベルサイズ）"""
+        # ブラウザの状態を確認・初期化
+        await self.ensure_browser_ready()
+        
+        # 現在のURLがGraTeXでない場合は移動
+        current_url = self.page.url
+        if 'teth-main.github.io/GraTeX' not in current_url:
+            await self.page.goto('https://teth-main.github.io/GraTeX/?wide=true&credit=true')
+            await self.page.wait_for_load_state('networkidle')
+        
+        # 2Dモードを確実にする
+        await self.switch_to_2d_mode()
+        
+        # GraTeX.calculator2Dが利用可能になるまで待機
+        await self.page.wait_for_function(
+            "() => window.GraTeX && window.GraTeX.calculator2D",
+            timeout=15000
+        )
+        
+        # ラベルサイズを事前に設定
+        if label_size in [1, 2, 3, 4, 6, 8]:
+            try:
+                # name="labelSize"のselectを探す
+                label_select = await self.page.wait_for_selector('select[name="labelSize"]', timeout=5000)
+                await label_select.select_option(str(label_size))
+                logger.info(f"ラベルサイズを{label_size}に設定")
+            except Exception as e:
+                logger.warning(f"ラベルサイズの設定に失敗、フォールバック: {e}")
+                # フォールバック: form-controlクラスのselectを使用
+                try:
+                    label_selects = await self.page.query_selector_all('select.form-control')
+                    if len(label_selects) >= 2:  # 2番目のselectがラベルサイズ
+                        await label_selects[1].select_option(str(label_size))
+                        logger.info(f"フォールバックでラベルサイズを{label_size}に設定")
+                except Exception as e2:
+                    logger.warning(f"フォールバックも失敗: {e2}")
+    
+    async def generate_graph(self, request):
+        """RenderRequestからグラフ画像を生成（GraTeX内部API使用）"""
+        try:
+            # ページ・2Dモード・ラベルサイズを準備
+            await self.prepare_2d_page(request.label_size)
+            zoom_level = request.zoom_level
+            
+            # 変換済みのLaTeX式を設定（複数の式はそれぞれ別の式として1回の撮影にまとめる）
+            logger.info(f"LaTeX式を設定: {request.latex}")
+            key = timing_key(request)
+            await self.set_expressions('calculator2D', request.latex_expressions, key)
+            
+            # ズームレベルを適用
+            if zoom_level != 0:
+                await self.apply_zoom_level(zoom_level)
+            
+            # グラフが描画されるのを待つ（同じ区分の式の解析時間から決める）
+            await asyncio.sleep(self.render_timing.settle_seconds(key, RENDER_SETTLE_SECONDS))
+            
+            # 撮影して画像データを取得
+            return image_buffer(await self.capture_screenshot("2D", key, size=request.screenshot_size, caption=request.caption))
+            
+        except Exception as e:
+            logger.error(f"グラフ生成エラー: {e}")
+            raise
+    
+    async def prepare_3d_page(self, label_size):
+        """3D描画の準備（ページ・3Dモード・ラベルサイズ）"""
+        # ブラウザの状態を確認・初期化
+        await self.ensure_browser_ready()
+        
+        # 現在のURLがGraTeXでない場合は移動
+        current_url = self.page.url
+        if 'teth-main.github.io/GraTeX' not in current_url:
+            await self.page.goto('https://teth-main.github.io/GraTeX/?wide=true&credit=true')
+            await self.page.wait_for_load_state('networkidle')
+        
+        # 3Dモードに切り替え
+        logger.info("3Dモードに切り替え中...")
+        three_d_label = await self.page.query_selector('label[for="version-3d"]')
+        if three_d_label:
+            await three_d_label.click()
+            await asyncio.sleep(2)  # 切り替え完了を待機
+        else:
+            raise Exception("3D切り替えボタンが見つかりません")
+        
+        # GraTeX.calculator3Dが利用可能になるまで待機
+        await self.page.wait_for_function(
+            "() => window.GraTeX && window.GraTeX.calculator3D",
+            timeout=15000
+        )
+        
+        # ラベルサイズを事前に設定
+        if label_size in [1, 2, 3, 4, 6, 8]:
+            try:
+                # name="labelSize"のselectを探す
+                label_select = await self.page.wait_for_selector('select[name="labelSize"]', timeout=5000)
+                await label_select.select_option(str(label_size))
+                logger.info(f"ラベルサイズを{label_size}に設定")
+            except Exception as e:
+                logger.warning(f"ラベルサイズの設定に失敗、フォールバック: {e}")
+                # フォールバック: form-controlクラスのselectを使用
+                try:
+                    label_selects = await self.page.query_selector_all('select.form-control')
+                    if len(label_selects) >= 2:  # 2番目のselectがラベルサイズ
+                        await label_selects[1].select_option(str(label_size))
+                        logger.info(f"フォールバックでラベルサイズを{label_size}に設定")
+                except Exception as e2:
+                    logger.warning(f"フォールバックも失敗: {e2}")
+    
+    async def generate_3d_graph(self, request):
+        """RenderRequestから3Dグラフ画像を生成（GraTeX内部API使用）"""
+        try:
+            await self.prepare_3d_page(request.label_size)
+            
+            # 変換済みのLaTeX式を3D APIで設定（複数の式はそれぞれ別の式として1回の撮影にまとめる）
+            logger.info(f"3D LaTeX式を設定: {request.latex}")
+            key = timing_key(request)
+            await self.set_expressions('calculator3D', request.latex_expressions, key)
+            
+            # 3Dズームレベルを適用（必要に応じて将来実装）
+            if request.zoom_level != 0:
+                logger.info(f"3Dズームレベル {request.zoom_level} は現在未実装です")
+            
+            # グラフが描画されるのを待つ（同じ区分の式の解析時間から決める）
+            await asyncio.sleep(self.render_timing.settle_seconds(key, RENDER_SETTLE_SECONDS))
+            
+            # 撮影して画像データを取得
+            return image_buffer(await self.capture_screenshot("3D", key, 'calculator3D', request.screenshot_size, request.caption))
+            
+        except Exception as e:
+            logger.error(f"3Dグラフ生成エラー: {e}")
+            raise
+    
+    async def generate_3d_views(self, request):
+        """RenderRequestの各視点から3Dグラフを撮影し、1枚の画像にまとめる
+        
+        ページの準備と式の設定は1回だけ行い、視点ごとにカメラの回転だけを変えて撮影する。
+        """
+        try:
+            await self.prepare_3d_page(request.label_size)
+            
+            logger.info(f"3D LaTeX式を設定: {request.latex}（視点: {', '.join(request.views)}）")
+            key = timing_key(request)
+            await self.set_expressions('calculator3D', request.latex_expressions, key)
+            await asyncio.sleep(self.render_timing.settle_seconds(key, RENDER_SETTLE_SECONDS))
+            
+            captures = []
+            for name in request.views:
+                await self.page.evaluate(SET_VIEW_ROTATION_JS, ['calculator3D', view_rotation(name)])
+                # 式はそのままなので、視点の変更分だけ描画を待つ
+                await asyncio.sleep(VIEW_SETTLE_SECONDS)
+                captures.append((name, await self.capture_screenshot(
+                    f"3D {name}", key, 'calculator3D', request.screenshot_size, request.caption)))
+            
+            # 縮小・合成は描画ループを止めないよう別スレッドで行う
+            return image_buffer(await asyncio.to_thread(compose_views, captures))
+            
+        except Exception as e:
+            logger.error(f"3D複数視点の生成エラー: {e}")
+            raise
+
+    async def capture_screenshot(self, label="2D", key=None, calculator_name='calculator2D', size=None, caption=None):
+        """計算機を撮影し、PNGデータ（bytes）を返す
+        
+        size（幅, 高さ, ピクセル比）を指定して計算機のスクリーンショットAPIで直接撮影する。
+        caption（式, ラベルサイズ）を指定すると、GraTeX と同じく右下にキャプションを描く。
+        APIが使えない場合はスクリーンショットボタンで撮影する（size は使われず、キャプションは GraTeX が付ける）。
+        key（描画時間の統計の区分）を指定すると、完了を待つ時間を統計から決め、かかった時間を記録する。
+        """
+        timeout = self.render_timing.capture_timeout(key, CAPTURE_TIMEOUT) if key else CAPTURE_TIMEOUT
+        width, height, pixel_ratio = size or OUTPUT_SIZES[DEFAULT_OUTPUT_SIZE]
+        
+        started = time.perf_counter()
+        try:
+            result = await self.page.evaluate(
+                DIRECT_SCREENSHOT_JS,
+                [calculator_name, width, height, pixel_ratio, CAPTURE_FORMAT, round(timeout * 1000)]
+            )
+        except Exception as e:
+            logger.warning(f"{label} スクリーンショットAPIでの撮影に失敗、ボタンで撮影します: {e}")
+            result = None
+        
+        if result is not None:
+            # タイムアウトした場合も待った時間を記録し、次回の待ち時間を延ばす
+            if key:
+                self.render_timing.record(key, 'capture', time.perf_counter() - started)
+            if result.get('timedOut'):
+                raise Exception(f"{label}画像の撮影が{timeout:g}秒以内に終わりませんでした")
+            logger.info(f"✅ {label}画像を撮影 ({round(width * pixel_ratio)}x{round(height * pixel_ratio)})")
+            image = decode_capture_payload(result['payload'])
+            if caption is None:
+                return image
+            # 描画ループを止めないよう別スレッドで描く
+            text, label_size = caption
+            return await asyncio.to_thread(add_caption, image, text, label_size, pixel_ratio)
+        
+        return await self.capture_with_button(label, key, timeout)
+    
+    async def capture_with_button(self, label, key, timeout):
+        """スクリーンショットボタンで画像を生成し、PNGデータ（bytes）を返す（GraTeXのキャプション付き）"""
+        # 前回の画像が残っていると生成完了の判定がすぐに通ってしまうため消しておく
+        await self.page.evaluate(CLEAR_PREVIEW_JS)
+        
+        # Generateボタンをクリック
+        logger.info(f"{label}スクリーンショットボタンをクリック...")
+        await self.page.click('#screenshot-button')
+        
+        # 画像生成完了を待機 - id="preview"のimgタグが更新されるまで待つ
+        logger.info(f"{label}画像生成を待機中...")
+        started = time.perf_counter()
+        try:
+            await self.page.wait_for_function(PREVIEW_READY_JS, timeout=round(timeout * 1000))
+        finally:
+            # タイムアウトした場合も待った時間を記録し、次回の待ち時間を延ばす
+            if key:
+                self.render_timing.record(key, 'capture', time.perf_counter() - started)
+        
+        # 生成された画像をid="preview"から取得（base64部分のみ）
+        payload = await self.page.evaluate(PREVIEW_PAYLOAD_JS)
+        
+        if not payload:
+            # フォールバック: キャンバスから直接取得を試行
+            logger.warning(f"{label} preview imgから画像を取得できませんでした。キャンバスから取得を試行...")
+            payload = await self.page.evaluate(CANVAS_PAYLOAD_JS)
+        
+        if not payload:
+            raise Exception(f"{label}画像の生成に失敗しました - preview imgもキャンバスも見つかりません")
+        
+        logger.info(f"✅ {label}画像データの取得に成功!")
+        
+        # base64データを1回だけデコード（以降は同じ bytes を送信まで共有）
+        return decode_capture_payload(payload)
+
+    async def close(self):
+        """リソースをクリーンアップ"""
+        try:
+            if self.page:
+                await self.page.close()
+            if self.browser:
+                await self.browser.close()
+            if hasattr(self, 'playwright'):
+                await self.playwright.stop()
+            if self.render_cache is not None:
+                self.render_cache.close()
+        except Exception as e:
+            logger.error(f"クリーンアップエラー: {e}")
+
+    async def apply_zoom_level(self, zoom_level):
+        """指定されたズームレベルを適用"""
+        try:
+            # ズームレベルの制限
+            zoom_level = max(-3, min(3, zoom_level))
+            
+            # ベース範囲（zoom_level = 0の場合）
+            base_range = 10
+            
+            # ズームレベルに基づいて範囲を計算
+            # zoom_level > 0: 拡大（範囲を小さく）
+            # zoom_level < 0: 縮小（範囲を大きく）
+            if zoom_level > 0:
+                # 拡大：各レベルで範囲を半分にする
+                range_size = base_range / (2 ** zoom_level)
+            elif zoom_level < 0:
+                # 縮小：各レベルで範囲を2倍にする
+                range_size = base_range * (2 ** abs(zoom_level))
+            else:
+                range_size = base_range
+            
+            logger.info(f"ズームレベル {zoom_level} を適用: 範囲 ±{range_size}")
+            
+            # ビューポートを設定
+            result = await self.page.evaluate(f'''
+                () => {{
+                    if (window.GraTeX && window.GraTeX.calculator2D) {{
+                        try {{
+                            window.GraTeX.calculator2D.setMathBounds({{
+                                left: -{range_size},
+                                right: {range_size},
+                                bottom: -{range_size/2},
+                                top: {range_size/2}
+                            }});
+                            console.log("ズームレベル適用完了");
+                            return true;
+                        }} catch (e) {{
+                            console.error("ズームレベル適用エラー:", e);
+                            return false;
+                        }}
+                    }}
+                    return false;
+                }}
+            ''')
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"ズームレベル適用エラー: {e}")
+            return False
+
+    async def switch_to_2d_mode(self):
+        """2Dモードに切り替え"""
+        try:
+            if not self.page:
+                await self.initialize_browser()
+            
+            logger.info("2Dモードに切り替え中...")
+            two_d_label = await self.page.query_selector('label[for="version-2d"]')
+            if two_d_label:
+                await two_d_label.click()
+                await asyncio.sleep(2)  # 切り替え完了を待機
+                logger.info("✅ 2Dモードに切り替え完了")
+                return True
+            else:
+                logger.warning("2D切り替えボタンが見つかりません")
+                return False
+                
+        except Exception as e:
+            logger.error(f"2Dモード切り替えエラー: {e}")
+            return False
+
+    async def ensure_browser_ready(self):
+        """ブラウザが使用可能な状態であることを確認"""
+        try:
+            if self.browser is None or self.page is None:
+                logger.info("ブラウザが初期化されていません。再初期化中...")
+                await self.initialize_browser()
+                return
+            
+            # ページが閉じられているかチェック
+            if self.page.is_closed():
+                logger.info("ページが閉じられています。再初期化中...")
+                await self.initialize_browser()
+                return
+                
+            # ブラウザが閉じられているかチェック
+            try:
+                await self.page.evaluate("() => true")
+            except Exception:
+                logger.info("ブラウザ接続が無効です。再初期化中...")
+                await self.initialize_browser()
+                
+        except Exception as e:
+            logger.error(f"ブラウザ状態確認エラー: {e}")
+            await self.initialize_browser()
+
+    async def cleanup_browser(self):
+        """ブラウザをクリーンアップ"""
+        try:
+            if self.page and not self.page.is_closed():
+                await self.page.close()
+            if self.browser:
+                await self.browser.close()
+            if hasattr(self, 'playwright'):
+                await self.playwright.stop()
+            logger.info("ブラウザのクリーンアップが完了しました")
+        except Exception as e:
+            logger.warning(f"ブラウザクリーンアップ中にエラー: {e}")
+        finally:
+            self.page = None
+            self.browser = None
@@ -0,0 +1,26 @@
+"""
+撮影した画像データの受け渡し
+ブラウザから受け取ったbase64を1回だけデコードし、以降は同じ bytes を Discord への送信まで共有する
+"""
+
+import binascii
+import hashlib
+import io
+
+
+def decode_capture_payload(payload):
+    """ブラウザから受け取ったbase64（data URLの接頭辞なし）をPNGデータに変換"""
+    return binascii.a2b_base64(payload)
+
+
+def image_buffer(data):
+    """PNGデータをファイルとして扱えるようにする（BytesIO は元の bytes をコピーせずに共有する）"""
+    return io.BytesIO(data)
+
+
+def image_digest(image):
+    """画像のハッシュ（同じ画像の再送信を避けるために使用、アップロード済みの画像はURL）"""
+    if isinstance(image, str):
+        return image
+    # getbuffer() は共有中の bytes を複製してしまうため getvalue() を使う
+    return hashlib.sha256(image.getvalue()).hexdigest()
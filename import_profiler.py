@@ -0,0 +1,36 @@
+"""
+起動時のインポート時間計測
+モジュールごとのインポート時間を記録し、起動ログにレポートを出力する
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# (モジュール名, 所要時間[秒]) の記録
+_import_records = []
+
+
+@contextmanager
+def import_timer(name):
+    """with ブロック内のインポートにかかった時間を記録"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _import_records.append((name, time.perf_counter() - started))
+
+
+def import_time_report():
+    """記録したインポート時間を所要時間の長い順に返す"""
+    return sorted(_import_records, key=lambda record: record[1], reverse=True)
+
+
+def log_import_report(total=None):
+    """インポート時間のレポートをログに出力"""
+    lines = [f"  {name:<20} {elapsed * 1000:8.1f} ms" for name, elapsed in import_time_report()]
+    if total is not None:
+        lines.append(f"  {'(合計)':<20} {total * 1000:8.1f} ms")
+    logger.info("インポート時間レポート:\n" + "\n".join(lines))
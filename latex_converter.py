@@ -4,17 +4,29 @@ LaTeX変換ユーティリティ
 """
 
 import re
-import sympy as sp
-from sympy import sympify, latex, symbols
-from sympy.parsing.sympy_parser import parse_expr, standard_transformations, implicit_multiplication_application
+from collections import OrderedDict
+from functools import lru_cache
 import logging
 
+from expression_parser import parse_expression, ExpressionSyntaxError
+
 logger = logging.getLogger(__name__)
 
+# 変換を受け付ける式の最大文字数（Discordのスラッシュコマンド引数の上限もこれに合わせる）
+MAX_EXPRESSION_LENGTH = 1000
+
+class ExpressionTooLongError(ValueError):
+    """入力式が MAX_EXPRESSION_LENGTH を超えている"""
+
+    def __init__(self, length, limit=MAX_EXPRESSION_LENGTH):
+        self.length = length
+        self.limit = limit
+        super().__init__(f"式が長すぎます（{length}文字、上限{limit}文字）")
+
 class LaTeXConverter:
     def __init__(self):
-        # 基本的な変数を定義
-        self.variables = symbols('x y z t r theta phi a b c d e f g h i j k l m n o p q s u v w')
+        # 基本的な変数（SymPyは重いため、初回アクセス時に作成する）
+        self._variables = None
         
         # よく使われる関数の変換マップ
         self.function_map = {
@@ -54,7 +66,86 @@ class LaTeXConverter:
             'phi': r'\phi',
             'omega': r'\omega'
         }
-    
+
+        # 関数呼び出しの変換ルール（関数名 -> (開始, 終了)）
+        self.function_rules = {
+            'sin': (r'\sin\left(', r'\right)'),
+            'cos': (r'\cos\left(', r'\right)'),
+            'tan': (r'\tan\left(', r'\right)'),
+            'sec': (r'\sec\left(', r'\right)'),
+            'csc': (r'\csc\left(', r'\right)'),
+            'cot': (r'\cot\left(', r'\right)'),
+            'asin': (r'\arcsin\left(', r'\right)'),
+            'acos': (r'\arccos\left(', r'\right)'),
+            'atan': (r'\arctan\left(', r'\right)'),
+            'sinh': (r'\sinh\left(', r'\right)'),
+            'cosh': (r'\cosh\left(', r'\right)'),
+            'tanh': (r'\tanh\left(', r'\right)'),
+            'ln': (r'\ln\left(', r'\right)'),
+            'log': (r'\log\left(', r'\right)'),
+            'sqrt': (r'\sqrt{', '}'),
+            'exp': ('e^{', '}'),
+            'abs': (r'\left|', r'\right|'),
+        }
+
+        # 記号の置換ルール（** は ^ に、不等号はLaTeXコマンドに）
+        self.symbol_rules = {
+            '**': '^',
+            '<=': r'\le',
+            '>=': r'\ge',
+            '<': r'\lt',
+            '>': r'\gt',
+        }
+
+        # ギリシャ文字記号の置換ルール
+        self.greek_symbol_rules = {
+            'θ': r'\theta',
+            'π': r'\pi',
+        }
+
+        # 変換ルールを1つの正規表現にまとめて事前コンパイル
+        # 関数名は長いものを先に並べる（sinh を sin より優先）
+        function_names = '|'.join(sorted(self.function_rules, key=len, reverse=True))
+        symbols_alternation = '|'.join(re.escape(s) for s in sorted(self.symbol_rules, key=len, reverse=True))
+        # 引数は括弧を含まない範囲に限定し、各位置からの走査が次の括弧で止まるようにする（線形時間）
+        self.rule_pattern = re.compile(rf'\b({function_names})\(([^()]+)\)|({symbols_alternation})')
+        self.symbol_pattern = re.compile(symbols_alternation)
+        self.greek_symbol_pattern = re.compile('|'.join(self.greek_symbol_rules))
+
+        # 分数変換用のパターン
+        # どれも試行開始位置を区切りの直後に限定し、入力長に対して線形時間で終わるようにする
+        self.paren_fraction_pattern = re.compile(r'\(([^()]+)\)/\(([^()]+)\)')
+        self.equation_fraction_pattern = re.compile(r'(\s*)([^/\s]+)/([^/\s]+)(?=\s|$)')
+        self.simple_fraction_pattern = re.compile(r'(?<![^/\s\\])([^/\s\\]+)/([^/\s\\]+)\b')
+        self.inequality_command_pattern = re.compile(r'\\[lg][te]')
+
+    @property
+    def variables(self):
+        """基本的な変数のSymPyシンボル（convert_to_latex では使用しない）"""
+        if self._variables is None:
+            from sympy import symbols
+            self._variables = symbols('x y z t r theta phi a b c d e f g h i j k l m n o p q s u v w')
+        return self._variables
+
+    def _replace_rule(self, match):
+        """rule_pattern のマッチを変換後の文字列に置き換える"""
+        function_name = match.group(1)
+        if function_name is None:
+            return self.symbol_rules[match.group(3)]
+
+        # 引数内の ** や不等号も同時に変換する
+        start, end = self.function_rules[function_name]
+        argument = self.symbol_pattern.sub(self._replace_symbol, match.group(2))
+        return f'{start}{argument}{end}'
+
+    def _replace_symbol(self, match):
+        """symbol_pattern のマッチを置き換える"""
+        return self.symbol_rules[match.group(0)]
+
+    def _replace_greek_symbol(self, match):
+        """greek_symbol_pattern のマッチを置き換える"""
+        return self.greek_symbol_rules[match.group(0)]
+
     def preprocess_expression(self, expr):
         """式の前処理"""
         # スペースを削除
@@ -97,106 +188,92 @@ class LaTeXConverter:
         return expr
     
     def convert_to_latex(self, expression):
-        """プレーンな数学記法をLaTeX形式に変換（シンプルアプローチ）"""
+        """プレーンな数学記法をLaTeX形式に変換（構文解析 + 正規表現ルールのフォールバック）"""
+        return self.convert_with_syntax_error(expression)[0]
+    
+    def convert_with_syntax_error(self, expression):
+        """convert_to_latex と同じ変換を行い、(LaTeX, 構文解析のエラー) を返す
+        
+        構文解析できてLaTeXを出力した場合・入力がLaTeX形式の場合、エラーは None。
+        """
+        # 長すぎる式は変換せずに呼び出し元へエラーを返す
+        if len(expression) > MAX_EXPRESSION_LENGTH:
+            raise ExpressionTooLongError(len(expression))
+        
+        syntax_error = None
         try:
             # 入力がすでにLaTeX形式の場合はそのまま返す
             if '\\' in expression:
                 logger.info(f"入力は既にLaTeX形式のようです: {expression}")
-                return expression
-            
-            result = expression
-            
-            # 累乗記法の変換（^ は既にGraTeXで使えるのでそのまま）
-            # ただし ** があれば ^ に変換
-            result = result.replace('**', '^')
-            
-            # 三角関数の変換
-            trig_functions = {
-                r'\bsin\(([^)]+)\)': r'\\sin\\left(\1\\right)',
-                r'\bcos\(([^)]+)\)': r'\\cos\\left(\1\\right)',
-                r'\btan\(([^)]+)\)': r'\\tan\\left(\1\\right)',
-                r'\bsec\(([^)]+)\)': r'\\sec\\left(\1\\right)',
-                r'\bcsc\(([^)]+)\)': r'\\csc\\left(\1\\right)',
-                r'\bcot\(([^)]+)\)': r'\\cot\\left(\1\\right)',
-                r'\basin\(([^)]+)\)': r'\\arcsin\\left(\1\\right)',
-                r'\bacos\(([^)]+)\)': r'\\arccos\\left(\1\\right)',
-                r'\batan\(([^)]+)\)': r'\\arctan\\left(\1\\right)',
-                r'\bsinh\(([^)]+)\)': r'\\sinh\\left(\1\\right)',
-                r'\bcosh\(([^)]+)\)': r'\\cosh\\left(\1\\right)',
-                r'\btanh\(([^)]+)\)': r'\\tanh\\left(\1\\right)',
-            }
-            
-            for pattern, replacement in trig_functions.items():
-                result = re.sub(pattern, replacement, result)
-            
-            # ログ関数の変換
-            result = re.sub(r'\bln\(([^)]+)\)', r'\\ln\\left(\1\\right)', result)
-            result = re.sub(r'\blog\(([^)]+)\)', r'\\log\\left(\1\\right)', result)
+                return expression, None
             
-            # 平方根の変換
-            result = re.sub(r'\bsqrt\(([^)]+)\)', r'\\sqrt{\1}', result)
-            
-            # 指数関数の変換
-            result = re.sub(r'\bexp\(([^)]+)\)', r'e^{\1}', result)
-            
-            # 絶対値の変換
-            result = re.sub(r'\babs\(([^)]+)\)', r'\\left|\1\\right|', result)
-            
-            # 不等号の変換（分数変換の前に実行して、分数変換で不等号が壊れないようにする）
-            result = result.replace('<=', '\\le')
-            result = result.replace('>=', '\\ge')
-            result = result.replace('<', '\\lt')
-            result = result.replace('>', '\\gt')
-            
-            # 分数の変換（三角関数変換後に実行）
-            result = self.simple_fraction_conversion(result)
-            
-            # ギリシャ文字の変換
-            result = result.replace('θ', '\\theta')
-            result = result.replace('π', '\\pi')
+            try:
+                # 構文木を作成してLaTeXを出力（ネストした括弧にも対応）
+                result = parse_expression(expression).to_latex()
+            except ExpressionSyntaxError as e:
+                # 構文解析できない式は従来の正規表現ルールで変換
+                logger.debug(f"構文解析に失敗したためルール変換を使用: {e}")
+                syntax_error = e
+                result = self.rule_based_conversion(expression)
             
             if result != expression:
                 logger.info(f"LaTeX変換: {expression} -> {result}")
             
-            return result
+            return result, syntax_error
                 
         except Exception as e:
             logger.error(f"LaTeX変換エラー: {e}")
-            return expression
+            return expression, syntax_error
+    
+    def rule_based_conversion(self, expression):
+        """正規表現ルールによる変換（構文解析できない式のフォールバック）"""
+        # 関数・不等号・累乗記法を1回の走査でまとめて変換
+        # （不等号は分数変換の前に変換して、分数変換で不等号が壊れないようにする）
+        result = self.rule_pattern.sub(self._replace_rule, expression)
+        
+        # 分数の変換（関数変換後に実行）
+        result = self.simple_fraction_conversion(result)
+        
+        # ギリシャ文字の変換
+        return self.greek_symbol_pattern.sub(self._replace_greek_symbol, result)
+    
+    def parse(self, expression):
+        """式を構文解析して構文木を返す（検証やキャッシュキーの正規化に使用）"""
+        return parse_expression(expression)
     
     def simple_fraction_conversion(self, expr):
         """シンプルな分数変換"""
         try:
             # パターン1: 括弧で囲まれた分数 (a)/(b)
-            expr = re.sub(r'\(([^)]+)\)/\(([^)]+)\)', r'\\frac{\1}{\2}', expr)
+            expr = self.paren_fraction_pattern.sub(r'\\frac{\1}{\2}', expr)
             
             # パターン2: 等式の右辺の単純分数 y = a/b
-            def replace_simple_fraction(match):
-                left_part = match.group(1)  # "y = " の部分
-                numerator = match.group(2)   # 分子
-                denominator = match.group(3) # 分母
-                return f'{left_part}\\frac{{{numerator}}}{{{denominator}}}'
-            
-            # "=" の後の単純な分数を探す
-            expr = re.sub(r'([^=]+=\s*)([^/\s]+)/([^/\s]+)(?=\s|$)', replace_simple_fraction, expr)
+            # "=" で区切った各部分の先頭だけを照合する（"=" より前からの再走査を避ける）
+            segments = expr.split('=')
+            for i in range(1, len(segments)):
+                if not segments[i - 1]:
+                    continue
+                match = self.equation_fraction_pattern.match(segments[i])
+                # 部分の末尾は最後の部分でない限り式の末尾ではない
+                if match and (match.end() < len(segments[i]) or i == len(segments) - 1):
+                    space, numerator, denominator = match.groups()
+                    segments[i] = f'{space}\\frac{{{numerator}}}{{{denominator}}}' + segments[i][match.end():]
+            expr = '='.join(segments)
             
             # パターン3: 不等式や単純な分数表現の変換
             # 等式を含まず、単純な分数パターンを検出
             if '=' not in expr:
                 # 単純な分数 a/b（スペースや演算子で区切られている）
                 # 不等号が含まれている場合は \\le, \\ge などになっているので対応
-                expr = re.sub(r'\b([^/\s\\]+)/([^/\s\\]+)\b', r'\\frac{\1}{\2}', expr)
+                expr = self.simple_fraction_pattern.sub(r'\\frac{\1}{\2}', expr)
             else:
-                # 等式を含む場合でも不等号の前後の分数を変換
+                # 等式を含む場合でも不等号（LaTeX化済み）を含む部分の分数を変換
                 # 例: y = x/2 > 1 の x/2 部分
-                def replace_fraction_in_expression(match):
-                    full_expr = match.group(0)
-                    # 分数パターンを探して変換（不等号記号も考慮）
-                    result = re.sub(r'\b([^/\s\\]+)/([^/\s\\]+)\b', r'\\frac{\1}{\2}', full_expr)
-                    return result
-                
-                # 不等号（LaTeX化済み）を含む部分の分数を変換
-                expr = re.sub(r'[^=]*\\[lg][te][^=]*', replace_fraction_in_expression, expr)
+                segments = expr.split('=')
+                for i, segment in enumerate(segments):
+                    if self.inequality_command_pattern.search(segment):
+                        segments[i] = self.simple_fraction_pattern.sub(r'\\frac{\1}{\2}', segment)
+                expr = '='.join(segments)
             
             return expr
             
@@ -360,12 +437,67 @@ class LaTeXConverter:
 # グローバルコンバーター
 latex_converter = LaTeXConverter()
 
-def convert_expression(expression):
-    """式を変換する便利関数"""
+# 変換結果キャッシュの上限（式の種類数）
+CONVERSION_CACHE_SIZE = 1024
+
+@lru_cache(maxsize=CONVERSION_CACHE_SIZE)
+def _cached_convert(expression):
     return latex_converter.convert_to_latex(expression)
 
+def convert_expression(expression):
+    """式を変換する便利関数（同じ式の変換結果はキャッシュから返す）"""
+    return _cached_convert(expression)
+
+def conversion_cache_stats():
+    """変換キャッシュの統計（ヒット率など）"""
+    info = _cached_convert.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+def clear_conversion_cache():
+    """変換キャッシュを消去"""
+    _cached_convert.cache_clear()
+
+def convert_many(expressions, cache_size=CONVERSION_CACHE_SIZE):
+    """複数の式を順に変換し、(LaTeX, 構文解析のエラーまたは None) を返すイテレーター
+
+    一括変換で対話用の変換キャッシュを追い出さないよう、変換キャッシュは使わずに
+    呼び出しごとの cache_size 件のキャッシュで同じ式の変換を省く（構文解析は式ごとに1回だけ）。
+    上限を超える式は、結果の代わりに ExpressionTooLongError を返す。
+    """
+    cache = OrderedDict()
+    for expression in expressions:
+        result = cache.get(expression)
+        if result is not None:
+            cache.move_to_end(expression)
+        else:
+            try:
+                result = latex_converter.convert_with_syntax_error(expression)
+            except ExpressionTooLongError as e:
+                result = e
+            cache[expression] = result
+            if len(cache) > cache_size:
+                cache.popitem(last=False)
+        yield result
+
 def convert_for_javascript(expression):
     """JavaScript用にエスケープした式を取得（廃止予定：json.dumps()を使用推奨）"""
     # 後方互換性のため残しているが、新しいコードではjson.dumps()を使用すること
-    latex_expr = latex_converter.convert_to_latex(expression)
+    latex_expr = convert_expression(expression)
     return latex_converter.convert_for_desmos(latex_expr)
+
+def normalize_expression(expression):
+    """キャッシュキー用に式を正規化（構文解析できない場合は前後の空白のみ除去）"""
+    expression = expression.strip()
+    if '\\' in expression:
+        return expression
+    try:
+        return parse_expression(expression).normalized()
+    except ExpressionSyntaxError:
+        return expression
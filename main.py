@@ -1,19 +1,39 @@
-import discord
-from discord.ext import commands
-from discord import app_commands
+import time
+_import_started = time.perf_counter()
+
 import asyncio
-import base64
-import io
-import json
 import os
-from dotenv import load_dotenv
-from playwright.async_api import async_playwright
-from PIL import Image
 import re
 import logging
 
-# LaTeX変換機能をインポート
-from latex_converter import convert_expression
+from import_profiler import import_timer, log_import_report
+
+with import_timer('discord'):
+    import discord
+    from discord.ext import commands, tasks
+    from discord import app_commands
+
+with import_timer('dotenv'):
+    from dotenv import load_dotenv
+
+# グラフ生成リクエスト（LaTeX変換済みの式を保持）
+with import_timer('render_request'):
+    from render_request import RenderRequest, split_expressions, MAX_EXPRESSIONS, DEFAULT_OUTPUT_SIZE
+    from latex_converter import MAX_EXPRESSION_LENGTH, ExpressionTooLongError
+    from expression_validator import ExpressionValidationError, validate_expressions
+    from session_store import ReactionSession, SessionStore
+    from graph_controls import GraphControlsView
+    from render_coalescer import RenderCoalescer
+    from attachment_index import AttachmentIndex
+    from image_payload import image_buffer, image_digest
+    from contact_sheet import ContactSheetBuilder
+    from animation import AnimationEncoder, sweep_values
+    from camera_views import parse_views
+
+# 描画（ブラウザの操作）は描画ワーカーのプロセス、または RENDER_WORKERS=0 の場合はこのプロセス内で行う
+with import_timer('renderer'):
+    from graph_renderer import GraTeXBot
+    from render_pool import RenderWorkerPool
 
 # 環境変数を読み込み
 load_dotenv()
@@ -27,521 +47,42 @@ intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 
-class GraTeXBot:
-    def __init__(self):
-        self.browser = None
-        self.page = None
-        self.current_zoom_level = 0  # ズームレベルを追跡
-        
-    async def initialize_browser(self):
-        """Playwrightブラウザを初期化"""
-        try:
-            self.playwright = await async_playwright().start()
-            
-            # Railway環境用のブラウザ起動オプション
-            self.browser = await self.playwright.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                    '--disable-web-security',
-                    '--disable-features=VizDisplayCompositor',
-                    '--disable-background-timer-throttling',
-                    '--disable-backgrounding-occluded-windows',
-                    '--disable-renderer-backgrounding'
-                ]
-            )
-            
-            self.page = await self.browser.new_page()
-            
-            # タイムアウトを延長
-            self.page.set_default_timeout(30000)
-            
-            # GraTeXページにアクセス（リトライ付き）
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    await self.page.goto('https://teth-main.github.io/GraTeX/?wide=true&credit=true', 
-                                        wait_until='networkidle', timeout=30000)
-                    logger.info(f"GraTeXページへのアクセス成功 (試行 {attempt + 1})")
-                    break
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise e
-                    logger.warning(f"GraTeXページアクセス失敗 (試行 {attempt + 1}): {e}")
-                    await asyncio.sleep(2)
-            
-            logger.info("ブラウザの初期化が完了しました")
-            
-        except Exception as e:
-            logger.error(f"ブラウザの初期化に失敗: {e}")
-            raise
-    
-    async def generate_graph(self, latex_expression, label_size=4, zoom_level=0):
-        """LaTeX式からグラフ画像を生成（GraTeX内部API使用）"""
-        try:
-            # ブラウザの状態を確認・初期化
-            await self.ensure_browser_ready()
-            
-            # 入力式をLaTeX形式に変換
-            original_expr = latex_expression
-            try:
-                latex_expression = convert_expression(latex_expression)
-                if latex_expression != original_expr:
-                    logger.info(f"式を変換: {original_expr} -> {latex_expression}")
-            except Exception as e:
-                logger.warning(f"LaTeX変換に失敗、元の式を使用: {e}")
-                latex_expression = original_expr
-            
-            # 現在のURLがGraTeXでない場合は移動
-            current_url = self.page.url
-            if 'teth-main.github.io/GraTeX' not in current_url:
-                await self.page.goto('https://teth-main.github.io/GraTeX/?wide=true&credit=true')
-                await self.page.wait_for_load_state('networkidle')
-            
-            # 2Dモードを確実にする
-            await self.switch_to_2d_mode()
-            
-            # GraTeX.calculator2Dが利用可能になるまで待機
-            await self.page.wait_for_function(
-                "() => window.GraTeX && window.GraTeX.calculator2D",
-                timeout=15000
-            )
-            
-            # ラベルサイズを事前に設定
-            if label_size in [1, 2, 3, 4, 6, 8]:
-                try:
-                    # name="labelSize"のselectを探す
-                    label_select = await self.page.wait_for_selector('select[name="labelSize"]', timeout=5000)
-                    await label_select.select_option(str(label_size))
-                    logger.info(f"ラベルサイズを{label_size}に設定")
-                except Exception as e:
-                    logger.warning(f"ラベルサイズの設定に失敗、フォールバック: {e}")
-                    # フォールバック: form-controlクラスのselectを使用
-                    try:
-                        label_selects = await self.page.query_selector_all('select.form-control')
-                        if len(label_selects) >= 2:  # 2番目のselectがラベルサイズ
-                            await label_selects[1].select_option(str(label_size))
-                            logger.info(f"フォールバックでラベルサイズを{label_size}に設定")
-                    except Exception as e2:
-                        logger.warning(f"フォールバックも失敗: {e2}")
-            
-            # LaTeX式をJavaScript用にエスケープして設定
-            latex_for_js = convert_expression(latex_expression)  # LaTeX変換のみ
-            logger.info(f"LaTeX式を設定: {latex_expression}")
-            logger.info(f"LaTeX変換結果: {latex_for_js}")
-            await self.page.evaluate(f"""
-                () => {{
-                    if (window.GraTeX && window.GraTeX.calculator2D) {{
-                        window.GraTeX.calculator2D.setBlank();
-                        window.GraTeX.calculator2D.setExpression({{latex: {json.dumps(latex_for_js)}}});
-                        console.log("数式を設定しました:", {json.dumps(latex_for_js)});
-                    }} else {{
-                        throw new Error("GraTeX.calculator2D が利用できません");
-                    }}
-                }}
-            """)
-            
-            # ズームレベルを適用
-            if zoom_level != 0:
-                await self.apply_zoom_level(zoom_level)
-            
-            # 現在のズームレベルを更新
-            self.current_zoom_level = zoom_level
-            
-            # 少し待機してグラフが描画されるのを待つ
-            await asyncio.sleep(3)
-            
-            # Generateボタンをクリック
-            logger.info("スクリーンショットボタンをクリック...")
-            await self.page.click('#screenshot-button')
-            
-            # 画像生成完了を待機 - id="preview"のimgタグが更新されるまで待つ
-            logger.info("画像生成を待機中...")
-            await self.page.wait_for_function(
-                """
-                () => {
-                    const previewImg = document.getElementById('preview');
-                    return previewImg && previewImg.src && previewImg.src.length > 100;
-                }
-                """,
-                timeout=20000
-            )
-            
-            # 生成された画像をid="preview"から取得
-            image_data = await self.page.evaluate('''
-                () => {
-                    const previewImg = document.getElementById('preview');
-                    if (previewImg && previewImg.src) {
-                        // imgのsrcがdata URLの場合はそのまま返す
-                        if (previewImg.src.startsWith('data:')) {
-                            return previewImg.src;
-                        }
-                        
-                        // imgのsrcがblobやURLの場合は、canvasに描画してdata URLを取得
-                        const canvas = document.createElement('canvas');
-                        const ctx = canvas.getContext('2d');
-                        
-                        canvas.width = previewImg.naturalWidth || previewImg.width;
-                        canvas.height = previewImg.naturalHeight || previewImg.height;
-                        
-                        ctx.drawImage(previewImg, 0, 0);
-                        return canvas.toDataURL('image/png');
-                    }
-                    
-                    return null;
-                }
-            ''')
-            
-            if not image_data:
-                # フォールバック: キャンバスから直接取得を試行
-                logger.warning("preview imgから画像を取得できませんでした。キャンバスから取得を試行...")
-                image_data = await self.page.evaluate('''
-                    () => {
-                        const allCanvas = document.querySelectorAll('canvas');
-                        for (let canvas of allCanvas) {
-                            if (canvas.width > 0 && canvas.height > 0) {
-                                try {
-                                    return canvas.toDataURL('image/png');
-                                } catch (e) {
-                                    continue;
-                                }
-                            }
-                        }
-                        return null;
-                    }
-                ''')
-            
-            if not image_data:
-                raise Exception("画像の生成に失敗しました - preview imgもキャンバスも見つかりません")
-            
-            logger.info("✅ 画像データの取得に成功!")
-            
-            # base64データを画像に変換
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            return io.BytesIO(image_bytes)
-            
-        except Exception as e:
-            logger.error(f"グラフ生成エラー: {e}")
-            raise
-    
-    async def generate_3d_graph(self, latex_expression, label_size=4, zoom_level=0):
-        """LaTeX式から3Dグラフ画像を生成（GraTeX内部API使用）"""
-        try:
-            # ブラウザの状態を確認・初期化
-            await self.ensure_browser_ready()
-            
-            # 入力式をLaTeX形式に変換
-            original_expr = latex_expression
-            try:
-                latex_expression = convert_expression(latex_expression)
-                if latex_expression != original_expr:
-                    logger.info(f"3D式を変換: {original_expr} -> {latex_expression}")
-            except Exception as e:
-                logger.warning(f"3D LaTeX変換に失敗、元の式を使用: {e}")
-                latex_expression = original_expr
-            
-            # 現在のURLがGraTeXでない場合は移動
-            current_url = self.page.url
-            if 'teth-main.github.io/GraTeX' not in current_url:
-                await self.page.goto('https://teth-main.github.io/GraTeX/?wide=true&credit=true')
-                await self.page.wait_for_load_state('networkidle')
-            
-            # 3Dモードに切り替え
-            logger.info("3Dモードに切り替え中...")
-            three_d_label = await self.page.query_selector('label[for="version-3d"]')
-            if three_d_label:
-                await three_d_label.click()
-                await asyncio.sleep(2)  # 切り替え完了を待機
-            else:
-                raise Exception("3D切り替えボタンが見つかりません")
-            
-            # GraTeX.calculator3Dが利用可能になるまで待機
-            await self.page.wait_for_function(
-                "() => window.GraTeX && window.GraTeX.calculator3D",
-                timeout=15000
-            )
-            
-            # ラベルサイズを事前に設定
-            if label_size in [1, 2, 3, 4, 6, 8]:
-                try:
-                    # name="labelSize"のselectを探す
-                    label_select = await self.page.wait_for_selector('select[name="labelSize"]', timeout=5000)
-                    await label_select.select_option(str(label_size))
-                    logger.info(f"ラベルサイズを{label_size}に設定")
-                except Exception as e:
-                    logger.warning(f"ラベルサイズの設定に失敗、フォールバック: {e}")
-                    # フォールバック: form-controlクラスのselectを使用
-                    try:
-                        label_selects = await self.page.query_selector_all('select.form-control')
-                        if len(label_selects) >= 2:  # 2番目のselectがラベルサイズ
-                            await label_selects[1].select_option(str(label_size))
-                            logger.info(f"フォールバックでラベルサイズを{label_size}に設定")
-                    except Exception as e2:
-                        logger.warning(f"フォールバックも失敗: {e2}")
-            
-            # LaTeX式をJavaScript用にエスケープして3D APIで設定
-            latex_for_js = convert_expression(latex_expression)  # LaTeX変換のみ
-            logger.info(f"3D LaTeX式を設定: {latex_expression}")
-            logger.info(f"3D LaTeX変換結果: {latex_for_js}")
-            await self.page.evaluate(f"""
-                () => {{
-                    if (window.GraTeX && window.GraTeX.calculator3D) {{
-                        window.GraTeX.calculator3D.setBlank();
-                        window.GraTeX.calculator3D.setExpression({{latex: {json.dumps(latex_for_js)}}});
-                        console.log("3D数式を設定しました:", {json.dumps(latex_for_js)});
-                    }} else {{
-                        throw new Error("GraTeX.calculator3D が利用できません");
-                    }}
-                }}
-            """)
-            
-            # 3Dズームレベルを適用（必要に応じて将来実装）
-            if zoom_level != 0:
-                logger.info(f"3Dズームレベル {zoom_level} は現在未実装です")
-            
-            # 現在のズームレベルを更新
-            self.current_zoom_level = zoom_level
-            
-            # 少し待機してグラフが描画されるのを待つ
-            await asyncio.sleep(3)
-            
-            # Generateボタンをクリック
-            logger.info("3Dスクリーンショットボタンをクリック...")
-            await self.page.click('#screenshot-button')
-            
-            # 画像生成完了を待機 - id="preview"のimgタグが更新されるまで待つ
-            logger.info("3D画像生成を待機中...")
-            await self.page.wait_for_function(
-                """
-                () => {
-                    const previewImg = document.getElementById('preview');
-                    return previewImg && previewImg.src && previewImg.src.length > 100;
-                }
-                """,
-                timeout=20000
-            )
-            
-            # 生成された画像をid="preview"から取得
-            image_data = await self.page.evaluate('''
-                () => {
-                    const previewImg = document.getElementById('preview');
-                    if (previewImg && previewImg.src) {
-                        // imgのsrcがdata URLの場合はそのまま返す
-                        if (previewImg.src.startsWith('data:')) {
-                            return previewImg.src;
-                        }
-                        
-                        // imgのsrcがblobやURLの場合は、canvasに描画してdata URLを取得
-                        const canvas = document.createElement('canvas');
-                        const ctx = canvas.getContext('2d');
-                        
-                        canvas.width = previewImg.naturalWidth || previewImg.width;
-                        canvas.height = previewImg.naturalHeight || previewImg.height;
-                        
-                        ctx.drawImage(previewImg, 0, 0);
-                        return canvas.toDataURL('image/png');
-                    }
-                    
-                    return null;
-                }
-            ''')
-            
-            if not image_data:
-                # フォールバック: キャンバスから直接取得を試行
-                logger.warning("3D preview imgから画像を取得できませんでした。キャンバスから取得を試行...")
-                image_data = await self.page.evaluate('''
-                    () => {
-                        const allCanvas = document.querySelectorAll('canvas');
-                        for (let canvas of allCanvas) {
-                            if (canvas.width > 0 && canvas.height > 0) {
-                                try {
-                                    return canvas.toDataURL('image/png');
-                                } catch (e) {
-                                    continue;
-                                }
-                            }
-                        }
-                        return null;
-                    }
-                ''')
-            
-            if not image_data:
-                raise Exception("3D画像の生成に失敗しました - preview imgもキャンバスも見つかりません")
-            
-            logger.info("✅ 3D画像データの取得に成功!")
-            
-            # base64データを画像に変換
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            return io.BytesIO(image_bytes)
-            
-        except Exception as e:
-            logger.error(f"3Dグラフ生成エラー: {e}")
-            raise
+# グローバルインスタンス（描画ワーカー、または RENDER_WORKERS=0 ならこのプロセス内の描画）
+gratex_bot = RenderWorkerPool.from_env()
+if gratex_bot is None:
+    gratex_bot = GraTeXBot()
 
-    async def close(self):
-        """リソースをクリーンアップ"""
-        try:
-            if self.page:
-                await self.page.close()
-            if self.browser:
-                await self.browser.close()
-            if hasattr(self, 'playwright'):
-                await self.playwright.stop()
-        except Exception as e:
-            logger.error(f"クリーンアップエラー: {e}")
+# アップロード済み画像のURL（同じグラフは再アップロードせずにURLを参照する）
+attachment_index = AttachmentIndex()
 
-    async def zoom_desmos_graph(self, zoom_direction):
-        """GraTeX内のDesmosグラフをズームイン/アウト（ビューポート操作）"""
-        try:
-            # 現在のズームレベルを取得
-            old_zoom_level = self.current_zoom_level
-            
-            # ズームレベルを更新
-            if zoom_direction == 'in':
-                new_zoom_level = self.current_zoom_level + 1
-            else:
-                new_zoom_level = self.current_zoom_level - 1
-            
-            # ズームレベルを制限範囲内に収める
-            new_zoom_level = max(-3, min(3, new_zoom_level))
-            
-            # 制限に達している場合は何もしない
-            if new_zoom_level == old_zoom_level:
-                logger.info(f"ズームレベルが制限に達しています: {new_zoom_level}")
-                return False
-            
-            self.current_zoom_level = new_zoom_level
-            logger.info(f"新しいズームレベル: {self.current_zoom_level}")
-            
-            # 新しいズームレベルを適用
-            result = await self.apply_zoom_level(self.current_zoom_level)
-            
-            # ズーム操作後に少し待機
-            await asyncio.sleep(1)
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Desmosズーム操作エラー: {e}")
-            return False
+# 操作を受け付ける時間（秒、最後の操作から数える）
+SESSION_TTL = 300
 
-    async def apply_zoom_level(self, zoom_level):
-        """指定されたズームレベルを適用"""
-        try:
-            # ズームレベルの制限
-            zoom_level = max(-3, min(3, zoom_level))
-            
-            # ベース範囲（zoom_level = 0の場合）
-            base_range = 10
-            
-            # ズームレベルに基づいて範囲を計算
-            # zoom_level > 0: 拡大（範囲を小さく）
-            # zoom_level < 0: 縮小（範囲を大きく）
-            if zoom_level > 0:
-                # 拡大：各レベルで範囲を半分にする
-                range_size = base_range / (2 ** zoom_level)
-            elif zoom_level < 0:
-                # 縮小：各レベルで範囲を2倍にする
-                range_size = base_range * (2 ** abs(zoom_level))
-            else:
-                range_size = base_range
-            
-            logger.info(f"ズームレベル {zoom_level} を適用: 範囲 ±{range_size}")
-            
-            # ビューポートを設定
-            result = await self.page.evaluate(f'''
-                () => {{
-                    if (window.GraTeX && window.GraTeX.calculator2D) {{
-                        try {{
-                            window.GraTeX.calculator2D.setMathBounds({{
-                                left: -{range_size},
-                                right: {range_size},
-                                bottom: -{range_size/2},
-                                top: {range_size/2}
-                            }});
-                            console.log("ズームレベル適用完了");
-                            return true;
-                        }} catch (e) {{
-                            console.error("ズームレベル適用エラー:", e);
-                            return false;
-                        }}
-                    }}
-                    return false;
-                }}
-            ''')
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"ズームレベル適用エラー: {e}")
-            return False
+# 操作中のメッセージ（メッセージID -> セッション、5分間操作がなければ期限切れ）
+reaction_sessions = SessionStore(ttl=SESSION_TTL)
 
-    async def switch_to_2d_mode(self):
-        """2Dモードに切り替え"""
-        try:
-            if not self.page:
-                await self.initialize_browser()
-            
-            logger.info("2Dモードに切り替え中...")
-            two_d_label = await self.page.query_selector('label[for="version-2d"]')
-            if two_d_label:
-                await two_d_label.click()
-                await asyncio.sleep(2)  # 切り替え完了を待機
-                logger.info("✅ 2Dモードに切り替え完了")
-                return True
-            else:
-                logger.warning("2D切り替えボタンが見つかりません")
-                return False
-                
-        except Exception as e:
-            logger.error(f"2Dモード切り替えエラー: {e}")
-            return False
-
-    async def ensure_browser_ready(self):
-        """ブラウザが使用可能な状態であることを確認"""
-        try:
-            if self.browser is None or self.page is None:
-                logger.info("ブラウザが初期化されていません。再初期化中...")
-                await self.initialize_browser()
-                return
-            
-            # ページが閉じられているかチェック
-            if self.page.is_closed():
-                logger.info("ページが閉じられています。再初期化中...")
-                await self.initialize_browser()
-                return
-                
-            # ブラウザが閉じられているかチェック
-            try:
-                await self.page.evaluate("() => true")
-            except Exception:
-                logger.info("ブラウザ接続が無効です。再初期化中...")
-                await self.initialize_browser()
-                
-        except Exception as e:
-            logger.error(f"ブラウザ状態確認エラー: {e}")
-            await self.initialize_browser()
-
-    async def cleanup_browser(self):
-        """ブラウザをクリーンアップ"""
-        try:
-            if self.page and not self.page.is_closed():
-                await self.page.close()
-            if self.browser:
-                await self.browser.close()
-            if hasattr(self, 'playwright'):
-                await self.playwright.stop()
-            logger.info("ブラウザのクリーンアップが完了しました")
-        except Exception as e:
-            logger.warning(f"ブラウザクリーンアップ中にエラー: {e}")
-        finally:
-            self.page = None
-            self.browser = None
-
-# グローバルインスタンス
-gratex_bot = GraTeXBot()
+# 手動で付けられたリアクションの絵文字 -> (操作, 値)
+LABEL_SIZE_ACTIONS = {
+    '1⃣': ('label_size', 1),
+    '2⃣': ('label_size', 2),
+    '3⃣': ('label_size', 3),
+    '4⃣': ('label_size', 4),
+    '6⃣': ('label_size', 6),
+    '8⃣': ('label_size', 8),
+}
+REACTION_ACTIONS_2D = {
+    **LABEL_SIZE_ACTIONS,
+    '🔍': ('zoom', 'in'),
+    '🔭': ('zoom', 'out'),
+    '✅': ('done', None),
+    '🚮': ('delete', None),
+}
+REACTION_ACTIONS_3D = {
+    **LABEL_SIZE_ACTIONS,
+    '🔄': ('refresh', None),
+    '✅': ('done', None),
+    '🚮': ('delete', None),
+}
 
 @bot.event
 async def on_ready():
@@ -551,6 +92,13 @@ async def on_ready():
         await gratex_bot.initialize_browser()
         logger.info("GraTeX Bot の初期化が完了しました")
         
+        # HTTPの描画API（POST /render）もDiscordのコマンドと同じ描画・キャッシュを使う
+        register_renderer(gratex_bot.render)
+        
+        # 期限切れセッションの後片付けを開始（再接続時の on_ready では二重に起動しない）
+        if not sweep_reaction_sessions.is_running():
+            sweep_reaction_sessions.start()
+        
         # スラッシュコマンドを同期
         try:
             synced = await bot.tree.sync()
@@ -561,26 +109,43 @@ async def on_ready():
     except Exception as e:
         logger.error(f"初期化エラー: {e}")
 
+def validation_error_message(error):
+    """事前チェックの誤りを、式の下に位置を ^ で示したメッセージにする"""
+    where = f"{error.index}番目の式: " if error.index else ""
+    return f"❌ {where}{error.message}\n```\n{error.pointer()}\n```"
+
+# 画像の大きさの選択肢（幅×高さはピクセル比を掛けた実際の画素数）
+OUTPUT_SIZE_CHOICES = [
+    app_commands.Choice(name="サムネイル (640×360)", value="thumbnail"),
+    app_commands.Choice(name="標準 (1920×1080)", value="normal"),
+    app_commands.Choice(name="印刷用 (3840×2160)", value="print")
+]
+
+# ラベルサイズの選択肢（各コマンド共通）
+LABEL_SIZE_CHOICES = [
+    app_commands.Choice(name="極小 (1)", value=1),
+    app_commands.Choice(name="小 (2)", value=2),
+    app_commands.Choice(name="中小 (3)", value=3),
+    app_commands.Choice(name="標準 (4)", value=4),
+    app_commands.Choice(name="大 (6)", value=6),
+    app_commands.Choice(name="極大 (8)", value=8)
+]
+
 @bot.tree.command(name="gratex", description="LaTeX式からグラフを生成します")
 @app_commands.describe(
-    latex="LaTeX式またはDesmos記法の数式（例: y = sin(x), z = x^2 + y^2）",
+    latex="LaTeX式またはDesmos記法の数式（例: y = sin(x), z = x^2 + y^2）。; で区切ると複数の式を1つのグラフに描画",
     mode="グラフの種類（2D または 3D）",
     label_size="軸ラベルのサイズ",
-    zoom_level="ズームレベル（2Dのみ、-3～3）"
+    zoom_level="ズームレベル（2Dのみ、-3～3）",
+    views="複数の視点から撮影して1枚にまとめる（3Dのみ）",
+    size="画像の大きさ"
 )
 @app_commands.choices(
     mode=[
         app_commands.Choice(name="2D グラフ", value="2d"),
         app_commands.Choice(name="3D グラフ", value="3d")
     ],
-    label_size=[
-        app_commands.Choice(name="極小 (1)", value=1),
-        app_commands.Choice(name="小 (2)", value=2),
-        app_commands.Choice(name="中小 (3)", value=3),
-        app_commands.Choice(name="標準 (4)", value=4),
-        app_commands.Choice(name="大 (6)", value=6),
-        app_commands.Choice(name="極大 (8)", value=8)
-    ],
+    label_size=LABEL_SIZE_CHOICES,
     zoom_level=[
         app_commands.Choice(name="縮小 -3", value=-3),
         app_commands.Choice(name="縮小 -2", value=-2),
@@ -589,23 +154,34 @@ async def on_ready():
         app_commands.Choice(name="拡大 +1", value=1),
         app_commands.Choice(name="拡大 +2", value=2),
         app_commands.Choice(name="拡大 +3", value=3)
-    ]
+    ],
+    views=[
+        app_commands.Choice(name="4方向（正面・側面・上・等角）", value="front,side,top,isometric"),
+        app_commands.Choice(name="正面・上", value="front,top"),
+        app_commands.Choice(name="正面・側面", value="front,side"),
+        app_commands.Choice(name="等角", value="isometric")
+    ],
+    size=OUTPUT_SIZE_CHOICES
 )
 async def gratex_slash(
     interaction: discord.Interaction, 
-    latex: str, 
+    latex: app_commands.Range[str, 1, MAX_EXPRESSION_LENGTH], 
     mode: str = "2d",
     label_size: int = 4, 
-    zoom_level: int = 0
+    zoom_level: int = 0,
+    views: str = None,
+    size: str = DEFAULT_OUTPUT_SIZE
 ):
     """
     スラッシュコマンド: LaTeX式からグラフを生成
     
     Parameters:
-    - latex: LaTeX式またはDesmos記法の数式
+    - latex: LaTeX式またはDesmos記法の数式（; または改行で区切って複数指定可）
     - mode: グラフモード（"2d" または "3d"）
     - label_size: ラベルサイズ（1, 2, 3, 4, 6, 8）
     - zoom_level: ズームレベル（2Dのみ、負数で縮小、正数で拡大）
+    - views: 3Dの視点（カンマ区切り、複数の視点は1枚の画像にまとめる）
+    - size: 画像の大きさ（"thumbnail", "normal", "print"）
     """
     
     # パラメータ検証
@@ -621,6 +197,31 @@ async def gratex_slash(
         await interaction.response.send_message("❌ LaTeX式を入力してください", ephemeral=True)
         return
     
+    if len(latex) > MAX_EXPRESSION_LENGTH:
+        await interaction.response.send_message(f"❌ 式は{MAX_EXPRESSION_LENGTH}文字以内で入力してください", ephemeral=True)
+        return
+    
+    if len(split_expressions(latex)) > MAX_EXPRESSIONS:
+        await interaction.response.send_message(f"❌ 1つのグラフに描ける式は{MAX_EXPRESSIONS}個までです", ephemeral=True)
+        return
+    
+    # 明らかに描画できない式はブラウザを使わずにすぐ返す
+    try:
+        validate_expressions(split_expressions(latex))
+    except ExpressionValidationError as e:
+        await interaction.response.send_message(validation_error_message(e), ephemeral=True)
+        return
+    
+    try:
+        view_names = parse_views(views)
+    except ValueError as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    
+    if view_names and mode.lower() != "3d":
+        await interaction.response.send_message("❌ 視点の指定は3Dモードでのみ使用できます", ephemeral=True)
+        return
+    
     # 3Dモードの場合はzoom_levelを無視
     if mode.lower() == "3d" and zoom_level != 0:
         await interaction.response.send_message("ℹ️ 3Dモードではズームレベルは無視されます", ephemeral=True)
@@ -631,22 +232,28 @@ async def gratex_slash(
         return
     
     try:
-        # 入力式をLaTeX形式に変換
+        # 入力式をLaTeX形式に変換（変換はこのリクエスト作成時の1回のみ）
         mode_text = "2D" if mode.lower() == "2d" else "3D"  # エラーハンドリングで使用するため先に定義
-        original_latex = latex
-        converted_latex = convert_expression(latex)
+        request = RenderRequest.from_input(latex, mode, label_size, zoom_level, view_names, size)
+        original_latex = request.expression
         conversion_info = ""
         
-        if converted_latex != original_latex:
-            conversion_info = f"\n**変換後:** `{converted_latex}`"
-            logger.info(f"式を変換: {original_latex} -> {converted_latex}")
+        if request.converted:
+            conversion_info = f"\n**変換後:** `{request.latex}`"
+            logger.info(f"式を変換: {original_latex} -> {request.latex}")
+        
+        # 標準以外の大きさは結果に表示
+        size_info = ""
+        if request.output_size != DEFAULT_OUTPUT_SIZE:
+            size_name = next(choice.name for choice in OUTPUT_SIZE_CHOICES if choice.value == request.output_size)
+            size_info = f"\n**大きさ:** {size_name}"
         
         # 処理中メッセージ
         await interaction.response.send_message(f"🎨 GraTeXで{mode_text}グラフを生成中...")
         
         # モードに応じてグラフ生成
         if mode.lower() == "2d":
-            image_buffer = await gratex_bot.generate_graph(latex, label_size, zoom_level)
+            image = await render_or_reuse(request)
             
             # ズームレベル情報
             zoom_info = ""
@@ -658,44 +265,45 @@ async def gratex_slash(
             # 結果を送信
             embed = discord.Embed(
                 title="📊 GraTeX 2Dグラフ",
-                description=f"**入力式:** `{original_latex}`{conversion_info}\n**ラベルサイズ:** {label_size}\n**ズームレベル:** {zoom_level}{zoom_info}",
+                description=f"**入力式:** `{original_latex}`{conversion_info}\n**ラベルサイズ:** {label_size}\n**ズームレベル:** {zoom_level}{zoom_info}{size_info}",
                 color=0x00ff00
             )
             embed.set_footer(text="Powered by GraTeX 2D")
             
-            # リアクションを追加（2D用）
-            reactions = ['1⃣', '2⃣', '3⃣', '4⃣', '6⃣', '8⃣', '🔍', '🔭', '✅', '🚮']
+            # 手動リアクション用の操作（2D用）
+            actions = REACTION_ACTIONS_2D
             
         else:  # 3Dモード
-            image_buffer = await gratex_bot.generate_3d_graph(latex, label_size)
+            image = await render_or_reuse(request)
+            view_info = f"\n**視点:** {', '.join(request.views)}" if request.views else ""
             
             # 結果を送信
             embed = discord.Embed(
                 title="📊 GraTeX 3Dグラフ",
-                description=f"**入力式:** `{original_latex}`{conversion_info}\n**ラベルサイズ:** {label_size}\n**モード:** 3D",
+                description=f"**入力式:** `{original_latex}`{conversion_info}\n**ラベルサイズ:** {label_size}\n**モード:** 3D{view_info}{size_info}",
                 color=0x0099ff
             )
             embed.set_footer(text="Powered by GraTeX 3D")
             
-            # リアクションを追加（3D用）
-            reactions = ['1⃣', '2⃣', '3⃣', '4⃣', '6⃣', '8⃣', '🔄', '✅', '🚮']
+            # 手動リアクション用の操作（3D用）
+            actions = REACTION_ACTIONS_3D
         
-        # Discord画像ファイルを作成
-        file = discord.File(image_buffer, filename=f"gratex_{mode.lower()}_graph.png")
-        embed.set_image(url=f"attachment://gratex_{mode.lower()}_graph.png")
+        # 送信後はバッファが閉じられるため、先に画像のハッシュを計算
+        image_hash = image_digest(image)
         
-        # 処理中メッセージを編集して最終結果を表示
-        message = await interaction.edit_original_response(content=None, attachments=[file], embed=embed)
+        # Discord画像ファイルを作成（アップロード済みの画像はURLを参照）
+        attachments = attach_image(embed, image, f"gratex_{mode.lower()}_graph.png")
         
-        # リアクションを追加
-        for reaction in reactions:
-            await message.add_reaction(reaction)
+        # 操作部品（ボタン・セレクトメニュー）
+        view = GraphControlsView(interaction.user.id, request.mode, handle_control_action, label_size, timeout=SESSION_TTL)
         
-        # リアクション処理を設定
-        if mode.lower() == "2d":
-            await setup_reaction_handler_slash(interaction, message, latex, label_size)
-        else:
-            await setup_reaction_handler_3d(interaction, message, latex, label_size)
+        # 処理中メッセージを編集して最終結果と操作部品を1回で表示
+        message = await interaction.edit_original_response(content=None, attachments=attachments, embed=embed, view=view)
+        view.message = message
+        remember_attachment(request, message)
+        
+        # 操作のセッションを登録（手動で付けたリアクションも on_raw_reaction_add で同じ操作として扱う）
+        reaction_sessions.add(ReactionSession(message.id, message.channel.id, interaction.user.id, request, actions, image_hash=image_hash))
         
     except Exception as e:
         logger.error(f"{mode_text}グラフ生成エラー: {e}")
@@ -707,181 +315,359 @@ async def gratex_slash(
         )
         await interaction.edit_original_response(content=None, embed=error_embed)
 
-async def setup_reaction_handler_slash(interaction, message, latex_expression, current_label_size):
-    """スラッシュコマンド用のリアクション処理のセットアップ"""
-    
-    def check(reaction, user):
-        return (
-            user == interaction.user and 
-            reaction.message.id == message.id and
-            str(reaction.emoji) in ['1⃣', '2⃣', '3⃣', '4⃣', '6⃣', '8⃣', '🔍', '🔭', '✅', '🚮']
-        )
+# 一括生成で受け付ける式の上限
+MAX_BATCH_EXPRESSIONS = 30
+
+@bot.tree.command(name="gratex_batch", description="複数の式をまとめて描画し、一覧画像にします")
+@app_commands.describe(
+    expressions="; で区切った数式（例: y = x^2; y = sin(x)）",
+    file="1行に1つの数式を書いたテキストファイル",
+    label_size="軸ラベルのサイズ"
+)
+@app_commands.choices(label_size=LABEL_SIZE_CHOICES)
+async def gratex_batch_slash(
+    interaction: discord.Interaction,
+    expressions: str = None,
+    file: discord.Attachment = None,
+    label_size: int = 4
+):
+    """
+    スラッシュコマンド: 複数の式を続けて描画し、式のラベル付きの一覧画像にまとめる
     
-    timeout_duration = 300  # 5分
+    Parameters:
+    - expressions: ; で区切った数式
+    - file: 1行に1つの数式を書いたテキストファイル
+    - label_size: ラベルサイズ（1, 2, 3, 4, 6, 8）
+    """
     
-    while True:
+    # 入力を集める（ファイルの各行 + expressions の各式）
+    lines = []
+    if file is not None:
         try:
-            reaction, user = await bot.wait_for('reaction_add', timeout=timeout_duration, check=check)
-            emoji = str(reaction.emoji)
-            
-            if emoji == '🚮':
-                # メッセージ削除
-                await message.delete()
-                break
-                
-            elif emoji == '✅':
-                # 完了
-                await message.clear_reactions()
-                break
-                
-            elif emoji in ['1⃣', '2⃣', '3⃣', '4⃣', '6⃣', '8⃣']:
-                # ラベルサイズ変更
-                size_map = {'1⃣': 1, '2⃣': 2, '3⃣': 3, '4⃣': 4, '6⃣': 6, '8⃣': 8}
-                new_label_size = size_map[emoji]
-                
-                if new_label_size != current_label_size:
-                    await update_graph_slash(message, latex_expression, new_label_size)
-                    current_label_size = new_label_size
-                    
-            elif emoji == '🔍':
-                # 拡大（ズームイン）
-                await zoom_graph_slash(message, latex_expression, current_label_size, 'in')
-                
-            elif emoji == '🔭':
-                # 縮小（ズームアウト）
-                await zoom_graph_slash(message, latex_expression, current_label_size, 'out')
-            
-            # リアクションを削除
-            await reaction.remove(user)
-            
-        except asyncio.TimeoutError:
-            await message.clear_reactions()
-            break
-        except Exception as e:
-            logger.error(f"リアクション処理エラー: {e}")
-            break
-
-async def update_graph_slash(message, latex_expression, label_size):
-    """スラッシュコマンド用: グラフを更新"""
+            text = (await file.read()).decode('utf-8')
+        except UnicodeDecodeError:
+            await interaction.response.send_message("❌ ファイルはUTF-8のテキストで指定してください", ephemeral=True)
+            return
+        lines.extend(line.strip() for line in text.splitlines() if line.strip())
+    if expressions:
+        lines.extend(split_expressions(expressions))
+    
+    if not lines:
+        await interaction.response.send_message("❌ 数式またはファイルを指定してください", ephemeral=True)
+        return
+    
+    if len(lines) > MAX_BATCH_EXPRESSIONS:
+        await interaction.response.send_message(f"❌ 一度に描画できる式は{MAX_BATCH_EXPRESSIONS}個までです", ephemeral=True)
+        return
+    
     try:
-        # 新しいグラフを生成（現在のズームレベルを維持）
-        image_buffer = await gratex_bot.generate_graph(latex_expression, label_size, gratex_bot.current_zoom_level)
+        requests = [RenderRequest.from_input(line, "2d", label_size) for line in lines]
+    except ExpressionTooLongError as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
+    
+    try:
+        validate_expressions(lines)
+    except ExpressionValidationError as e:
+        await interaction.response.send_message(validation_error_message(e), ephemeral=True)
+        return
+    
+    await interaction.response.send_message(f"🎨 {len(requests)}個のグラフを生成中...")
+    
+    try:
+        # 縮小・ラベル付けは別スレッドで行い、次のグラフの式の設定・撮影と重ねる（撮影そのものは1式ずつ順に行う）
+        builder = ContactSheetBuilder()
+        failed = await builder.add_all(gratex_bot.render_batch(requests), [request.expression for request in requests])
         
-        # 新しいファイルを作成
-        file = discord.File(image_buffer, filename=f"gratex_graph_updated.png")
+        sheets = await asyncio.to_thread(builder.render)
+        files = [discord.File(image_buffer(sheet), filename=f"gratex_batch_{number}.png")
+                 for number, sheet in enumerate(sheets, 1)]
         
-        # ズームレベル情報
-        zoom_info = ""
-        if gratex_bot.current_zoom_level > 0:
-            zoom_info = f" (拡大 x{2**gratex_bot.current_zoom_level})"
-        elif gratex_bot.current_zoom_level < 0:
-            zoom_info = f" (縮小 x{2**abs(gratex_bot.current_zoom_level)})"
+        summary = f"📊 {len(requests)}個のグラフ"
+        if failed:
+            summary += f"（{failed}個は生成に失敗）"
+        await interaction.edit_original_response(content=summary, attachments=files)
         
-        # Embedを更新
+    except Exception as e:
+        logger.error(f"一括生成エラー: {e}")
+        error_embed = discord.Embed(
+            title="❌ エラー",
+            description=f"一括生成に失敗しました: {str(e)}",
+            color=0xff0000
+        )
+        await interaction.edit_original_response(content=None, embed=error_embed)
+
+# アニメーションのフレーム数の範囲とパラメータ名の形式（1文字、添字付きも可: a, b_1, k_{2}）
+MIN_ANIMATION_FRAMES = 2
+MAX_ANIMATION_FRAMES = 60
+PARAMETER_NAME_PATTERN = re.compile(r'^[a-wA-Z](_\{?[a-zA-Z0-9]+\}?)?$')
+
+@bot.tree.command(name="gratex_animate", description="パラメータを動かしたアニメーション（GIF/APNG）を生成します")
+@app_commands.describe(
+    latex="パラメータを含む数式（例: y = a sin(x)）",
+    parameter="動かすパラメータ名（例: a）",
+    start="パラメータの開始値",
+    end="パラメータの終了値",
+    frames=f"フレーム数（{MIN_ANIMATION_FRAMES}～{MAX_ANIMATION_FRAMES}）",
+    format="出力形式",
+    label_size="軸ラベルのサイズ",
+    zoom_level="ズームレベル（-3～3）"
+)
+@app_commands.choices(
+    format=[
+        app_commands.Choice(name="GIF", value="gif"),
+        app_commands.Choice(name="APNG", value="apng")
+    ],
+    label_size=LABEL_SIZE_CHOICES
+)
+async def gratex_animate_slash(
+    interaction: discord.Interaction,
+    latex: app_commands.Range[str, 1, MAX_EXPRESSION_LENGTH],
+    parameter: str,
+    start: float,
+    end: float,
+    frames: app_commands.Range[int, MIN_ANIMATION_FRAMES, MAX_ANIMATION_FRAMES] = 20,
+    format: str = "gif",
+    label_size: int = 4,
+    zoom_level: app_commands.Range[int, -3, 3] = 0
+):
+    """
+    スラッシュコマンド: パラメータを start から end まで動かしながら撮影し、アニメーションにする
+    
+    Parameters:
+    - latex: パラメータを含む数式（; で区切って複数指定可）
+    - parameter: 動かすパラメータ名
+    - start / end: パラメータの範囲
+    - frames: フレーム数
+    - format: "gif" または "apng"
+    - label_size: ラベルサイズ（1, 2, 3, 4, 6, 8）
+    - zoom_level: ズームレベル
+    """
+    
+    parameter = parameter.strip()
+    if not PARAMETER_NAME_PATTERN.match(parameter):
+        await interaction.response.send_message("❌ パラメータ名は1文字（x, y, z 以外、添字付きも可）で指定してください", ephemeral=True)
+        return
+    
+    if not (MIN_ANIMATION_FRAMES <= frames <= MAX_ANIMATION_FRAMES):
+        await interaction.response.send_message(f"❌ フレーム数は{MIN_ANIMATION_FRAMES}～{MAX_ANIMATION_FRAMES}で指定してください", ephemeral=True)
+        return
+    
+    if len(split_expressions(latex)) > MAX_EXPRESSIONS:
+        await interaction.response.send_message(f"❌ 1つのグラフに描ける式は{MAX_EXPRESSIONS}個までです", ephemeral=True)
+        return
+    
+    # 明らかに描画できない式はブラウザを使わずにすぐ返す
+    try:
+        validate_expressions(split_expressions(latex))
+    except ExpressionValidationError as e:
+        await interaction.response.send_message(validation_error_message(e), ephemeral=True)
+        return
+    
+    request = RenderRequest.from_input(latex, "2d", label_size, zoom_level)
+    values = sweep_values(start, end, frames)
+    
+    await interaction.response.send_message(f"🎞️ {parameter} = {start:g} → {end:g} のアニメーション（{frames}フレーム）を生成中...")
+    
+    try:
+        # 撮影したフレームはすぐにエンコード用スレッドへ渡し、その間に次のフレームを撮影する
+        encoder = AnimationEncoder(format)
+        try:
+            async for frame in gratex_bot.render_sweep(request, parameter, values):
+                encoder.add(frame)
+        except Exception:
+            encoder.close()
+            raise
+        animation_data = await asyncio.to_thread(encoder.finish)
+        
+        filename = f"gratex_animation.{encoder.extension}"
         embed = discord.Embed(
-            title="📊 GraTeX グラフ (更新済み)",
-            description=f"**LaTeX式:** `{latex_expression}`\n**ラベルサイズ:** {label_size}\n**ズームレベル:** {gratex_bot.current_zoom_level}{zoom_info}",
+            title="🎞️ GraTeX アニメーション",
+            description=f"**入力式:** `{request.expression}`\n**パラメータ:** {parameter} = {start:g} → {end:g}（{frames}フレーム）",
             color=0x00ff00
         )
-        embed.set_image(url="attachment://gratex_graph_updated.png")
-        embed.set_footer(text="Powered by GraTeX")
+        embed.set_image(url=f"attachment://{filename}")
+        embed.set_footer(text="Powered by GraTeX 2D")
         
-        # メッセージを編集
-        await message.edit(attachments=[file], embed=embed)
+        file = discord.File(image_buffer(animation_data), filename=filename)
+        await interaction.edit_original_response(content=None, attachments=[file], embed=embed)
         
     except Exception as e:
-        logger.error(f"グラフ更新エラー: {e}")
+        logger.error(f"アニメーション生成エラー: {e}")
+        error_embed = discord.Embed(
+            title="❌ エラー",
+            description=f"アニメーションの生成に失敗しました: {str(e)}",
+            color=0xff0000
+        )
+        await interaction.edit_original_response(content=None, embed=error_embed)
 
-async def zoom_graph_slash(message, latex_expression, label_size, zoom_direction):
-    """スラッシュコマンド用: グラフをズームイン/アウトして更新"""
+@bot.event
+async def on_raw_reaction_add(payload):
+    """全メッセージのリアクションを受け付けるディスパッチャー（メッセージIDでセッションを引く）"""
+    if bot.user is not None and payload.user_id == bot.user.id:
+        return
+    
+    session = reaction_sessions.get(payload.message_id)
+    if session is None or payload.user_id != session.user_id:
+        return
+    
+    action = session.action_for(str(payload.emoji))
+    if action is None:
+        return
+    
+    # メッセージキャッシュに依存しないよう、IDだけで操作できる部分メッセージを使う
+    message = bot.get_partial_messageable(payload.channel_id).get_partial_message(payload.message_id)
+    reaction_sessions.touch(session)
+    
     try:
-        # ズーム操作を実行
-        zoom_text = "拡大" if zoom_direction == 'in' else "縮小"
-        logger.info(f"ビューポート{zoom_text}操作を実行中...")
-        
-        # ビューポート操作を実行
-        zoom_result = await gratex_bot.zoom_desmos_graph(zoom_direction)
-        
-        if not zoom_result:
-            logger.warning(f"ビューポート{zoom_text}操作が失敗しました")
+        keep_session = await handle_session_action(session, message, *action)
+        if keep_session:
+            # リアクションを削除
+            await message.remove_reaction(payload.emoji, discord.Object(id=payload.user_id))
+    except Exception as e:
+        logger.error(f"リアクション処理エラー: {e}")
+
+async def handle_control_action(message, action, value):
+    """操作部品からの操作をセッションに渡す（セッションを続ける場合は True）"""
+    session = reaction_sessions.get(message.id)
+    if session is None:
+        return False
+    reaction_sessions.touch(session)
+    return await handle_session_action(session, message, action, value)
+
+async def handle_session_action(session, message, action, value):
+    """セッションに対する操作を実行（セッションを続ける場合は True）"""
+    if action == 'delete':
+        # メッセージ削除
+        reaction_sessions.remove(session.message_id)
+        render_coalescer.cancel(session.message_id)
+        await message.delete()
+        return False
+    
+    if action == 'done':
+        # 完了（操作部品を外す、描画待ちの操作は反映してから終了する）
+        reaction_sessions.remove(session.message_id)
+        await message.edit(view=None)
+        return False
+    
+    request = session.request
+    if action == 'label_size':
+        # ラベルサイズ変更
+        if value != request.label_size:
+            session.request = request.replace(label_size=value)
+    
+    elif action == 'zoom':
+        # 拡大（ズームイン）/ 縮小（ズームアウト）: ズームレベルを -3 から 3 の範囲で1段階変更
+        step = 1 if value == 'in' else -1
+        new_zoom_level = max(-3, min(3, request.zoom_level + step))
+        if new_zoom_level != request.zoom_level:
+            session.request = request.replace(zoom_level=new_zoom_level)
+        else:
+            logger.info(f"ズームレベルが制限に達しています: {new_zoom_level}")
+    
+    # 連続した操作は目標状態にまとめ、最後の状態だけを描画する
+    # （🔄 は状態を変えずに3Dグラフを再生成して視点をリセットする）
+    if session.request is not request or action == 'refresh':
+        render_coalescer.submit(session.message_id, message, session.request)
+    
+    return True
+
+async def render_or_reuse(request):
+    """アップロード済みの同じグラフがあればそのURL、なければ描画した画像を返す"""
+    image_url = attachment_index.lookup(request.cache_key())
+    if image_url is not None:
+        logger.info(f"🔗 アップロード済みの画像を再利用: {request!r}")
+        return image_url
+    return await gratex_bot.render(request)
+
+def attach_image(embed, image, filename):
+    """埋め込みに画像を設定し、送信する添付ファイルのリストを返す（URLの場合は添付なし）"""
+    if isinstance(image, str):
+        embed.set_image(url=image)
+        return []
+    embed.set_image(url=f"attachment://{filename}")
+    return [discord.File(image, filename=filename)]
+
+def remember_attachment(request, message):
+    """画像を差し替えたメッセージの古いURLを無効化し、新しくアップロードした画像のURLを登録"""
+    attachment_index.invalidate_message(message.id)
+    if message.attachments:
+        attachment_index.record(request.cache_key(), message.attachments[0].url, message.id)
+
+async def publish_graph_update(message, request, image):
+    """描画した画像でメッセージを更新（前回と同じ画像なら送信しない）"""
+    session = reaction_sessions.get(message.id)
+    if session is not None:
+        digest = image_digest(image)
+        if digest == session.image_hash:
+            logger.info(f"画像に変化がないため更新を省略: {request!r}")
             return
+        session.image_hash = digest
+    
+    if request.mode == "3d":
+        await update_3d_graph(message, request, image)
+    else:
+        await update_graph_slash(message, request, image)
+
+# メッセージごとの描画のまとめ役
+render_coalescer = RenderCoalescer(render_or_reuse, publish_graph_update)
+
+@bot.event
+async def on_raw_message_delete(payload):
+    """削除されたメッセージの画像URL・セッションを破棄"""
+    attachment_index.invalidate_message(payload.message_id)
+    if reaction_sessions.remove(payload.message_id) is not None:
+        render_coalescer.cancel(payload.message_id)
+
+@bot.event
+async def on_raw_message_edit(payload):
+    """編集で添付ファイルが外された・差し替えられたメッセージの画像URLを破棄"""
+    # 添付ファイルを変えない編集（埋め込みの展開など）には attachments が含まれない
+    if 'attachments' in payload.data:
+        attachment_index.invalidate_missing(
+            payload.message_id, [attachment['url'] for attachment in payload.data['attachments']])
+
+@tasks.loop(seconds=30)
+async def sweep_reaction_sessions():
+    """期限切れのセッションを削除（操作部品は GraphControlsView のタイムアウトで外れる）"""
+    expired = reaction_sessions.sweep()
+    if expired:
+        logger.debug(f"期限切れセッションを削除: {len(expired)} 件")
+
+async def update_graph_slash(message, request, image):
+    """スラッシュコマンド用: 描画したグラフでメッセージを更新"""
+    try:
         
-        # スクリーンショットボタンをクリックして新しい画像を生成
-        await gratex_bot.page.click('#screenshot-button')
+        # ズームレベル情報
+        zoom_info = ""
+        if request.zoom_level > 0:
+            zoom_info = f" (拡大 x{2**request.zoom_level})"
+        elif request.zoom_level < 0:
+            zoom_info = f" (縮小 x{2**abs(request.zoom_level)})"
         
-        # 画像生成完了を待機
-        await gratex_bot.page.wait_for_function(
-            """
-            () => {
-                const previewImg = document.getElementById('preview');
-                return previewImg && previewImg.src && previewImg.src.length > 100;
-            }
-            """,
-            timeout=20000
+        # Embedを更新
+        embed = discord.Embed(
+            title="📊 GraTeX グラフ (更新済み)",
+            description=f"**LaTeX式:** `{request.expression}`\n**ラベルサイズ:** {request.label_size}\n**ズームレベル:** {request.zoom_level}{zoom_info}",
+            color=0x00ff00
         )
+        embed.set_footer(text="Powered by GraTeX")
         
-        # 生成された画像を取得
-        image_data = await gratex_bot.page.evaluate('''
-            () => {
-                const previewImg = document.getElementById('preview');
-                if (previewImg && previewImg.src) {
-                    if (previewImg.src.startsWith('data:')) {
-                        return previewImg.src;
-                    }
-                    
-                    const canvas = document.createElement('canvas');
-                    const ctx = canvas.getContext('2d');
-                    
-                    canvas.width = previewImg.naturalWidth || previewImg.width;
-                    canvas.height = previewImg.naturalHeight || previewImg.height;
-                    
-                    ctx.drawImage(previewImg, 0, 0);
-                    return canvas.toDataURL('image/png');
-                }
-                
-                return null;
-            }
-        ''')
+        # 新しいファイルを作成（アップロード済みの画像はURLを参照）
+        attachments = attach_image(embed, image, "gratex_graph_updated.png")
         
-        if image_data:
-            # base64データを画像に変換
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            image_buffer = io.BytesIO(image_bytes)
-            
-            # 新しいファイルを作成
-            file = discord.File(image_buffer, filename=f"gratex_graph_zoomed.png")
-            
-            # ズームレベル情報
-            zoom_info = ""
-            if gratex_bot.current_zoom_level > 0:
-                zoom_info = f" (拡大 x{2**gratex_bot.current_zoom_level})"
-            elif gratex_bot.current_zoom_level < 0:
-                zoom_info = f" (縮小 x{2**abs(gratex_bot.current_zoom_level)})"
-            
-            # Embedを更新
-            embed = discord.Embed(
-                title=f"📊 GraTeX グラフ ({zoom_text}済み)",
-                description=f"**LaTeX式:** `{latex_expression}`\n**ラベルサイズ:** {label_size}\n**ズームレベル:** {gratex_bot.current_zoom_level}{zoom_info}",
-                color=0x00ff00
-            )
-            embed.set_image(url="attachment://gratex_graph_zoomed.png")
-            embed.set_footer(text="Powered by GraTeX")
-            
-            # メッセージを編集
-            await message.edit(attachments=[file], embed=embed)
-            
-            logger.info(f"✅ ビューポート{zoom_text}操作完了")
-        else:
-            logger.error("ズーム後の画像取得に失敗")
+        # メッセージを編集
+        edited = await message.edit(attachments=attachments, embed=embed)
+        remember_attachment(request, edited)
         
     except Exception as e:
-        logger.error(f"ズーム操作エラー: {e}")
+        logger.error(f"グラフ更新エラー: {e}")
 
-async def update_graph(message, latex_expression, label_size):
+async def update_graph(message, request):
     """レガシー用: グラフを更新（下位互換性のため保持）"""
     try:
         # 新しいグラフを生成
-        image_buffer = await gratex_bot.generate_graph(latex_expression, label_size)
+        image_buffer = await gratex_bot.render(request)
         
         # 新しいファイルを作成
         file = discord.File(image_buffer, filename=f"gratex_graph_updated.png")
@@ -889,7 +675,7 @@ async def update_graph(message, latex_expression, label_size):
         # Embedを更新
         embed = discord.Embed(
             title="📊 GraTeX グラフ (更新済み)",
-            description=f"**LaTeX式:** `{latex_expression}`\n**ラベルサイズ:** {label_size}",
+            description=f"**LaTeX式:** `{request.expression}`\n**ラベルサイズ:** {request.label_size}",
             color=0x00ff00
         )
         embed.set_image(url="attachment://gratex_graph_updated.png")
@@ -901,105 +687,6 @@ async def update_graph(message, latex_expression, label_size):
     except Exception as e:
         logger.error(f"グラフ更新エラー: {e}")
 
-async def zoom_graph(message, latex_expression, label_size, zoom_direction):
-    """グラフをズームイン/アウトして更新"""
-    try:
-        # Desmosでズーム操作を実行
-        zoom_text = "拡大" if zoom_direction == 'in' else "縮小"
-        logger.info(f"ビューポート{zoom_text}操作を実行中...")
-        
-        # ビューポート操作を実行
-        zoom_result = await gratex_bot.zoom_desmos_graph(zoom_direction)
-        
-        if not zoom_result:
-            logger.warning(f"ビューポート{zoom_text}操作が失敗しました")
-            return
-        
-        # スクリーンショットボタンをクリックして新しい画像を生成
-        await gratex_bot.page.click('#screenshot-button')
-        
-        # 画像生成完了を待機
-        await gratex_bot.page.wait_for_function(
-            """
-            () => {
-                const previewImg = document.getElementById('preview');
-                return previewImg && previewImg.src && previewImg.src.length > 100;
-            }
-            """,
-            timeout=20000
-        )
-        
-        # 生成された画像を取得
-        image_data = await gratex_bot.page.evaluate('''
-            () => {
-                const previewImg = document.getElementById('preview');
-                if (previewImg && previewImg.src) {
-                    if (previewImg.src.startsWith('data:')) {
-                        return previewImg.src;
-                    }
-                    
-                    const canvas = document.createElement('canvas');
-                    const ctx = canvas.getContext('2d');
-                    
-                    canvas.width = previewImg.naturalWidth || previewImg.width;
-                    canvas.height = previewImg.naturalHeight || previewImg.height;
-                    
-                    ctx.drawImage(previewImg, 0, 0);
-                    return canvas.toDataURL('image/png');
-                }
-                
-                return null;
-            }
-        ''')
-        
-        if image_data:
-            # base64データを画像に変換
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            image_buffer = io.BytesIO(image_bytes)
-            
-            # 新しいファイルを作成
-            file = discord.File(image_buffer, filename=f"gratex_graph_zoomed.png")
-            
-            # 変更後のビューポートを取得して表示
-            new_viewport = await gratex_bot.page.evaluate('''
-                () => {
-                    if (window.GraTeX && window.GraTeX.calculator2D) {
-                        try {
-                            const state = window.GraTeX.calculator2D.getState();
-                            return state.graph.viewport;
-                        } catch (e) {
-                            return null;
-                        }
-                    }
-                    return null;
-                }
-            ''')
-            
-            viewport_info = ""
-            if new_viewport:
-                x_range = new_viewport.get('xmax', 0) - new_viewport.get('xmin', 0)
-                y_range = new_viewport.get('ymax', 0) - new_viewport.get('ymin', 0)
-                viewport_info = f"\n**表示範囲:** X: {x_range:.1f}, Y: {y_range:.1f}"
-            
-            # Embedを更新
-            embed = discord.Embed(
-                title=f"📊 GraTeX グラフ ({zoom_text}済み)",
-                description=f"**LaTeX式:** `{latex_expression}`\n**ラベルサイズ:** {label_size}{viewport_info}",
-                color=0x00ff00
-            )
-            embed.set_image(url="attachment://gratex_graph_zoomed.png")
-            embed.set_footer(text="Powered by GraTeX")
-            
-            # メッセージを編集
-            await message.edit(attachments=[file], embed=embed)
-            
-            logger.info(f"✅ ビューポート{zoom_text}操作完了")
-        else:
-            logger.error("ズーム後の画像取得に失敗")
-        
-    except Exception as e:
-        logger.error(f"ズーム操作エラー: {e}")
-
 @bot.event
 async def on_disconnect():
     """Bot切断時の処理"""
@@ -1009,86 +696,55 @@ async def on_disconnect():
     except Exception as e:
         logger.error(f"切断時のクリーンアップエラー: {e}")
 
-async def setup_reaction_handler_3d(interaction, message, latex_expression, current_label_size):
-    """3D用のリアクション処理のセットアップ"""
-    
-    def check(reaction, user):
-        return (
-            user == interaction.user and 
-            reaction.message.id == message.id and
-            str(reaction.emoji) in ['1⃣', '2⃣', '3⃣', '4⃣', '6⃣', '8⃣', '🔄', '✅', '🚮']
-        )
-    
-    timeout_duration = 300  # 5分
-    
-    while True:
-        try:
-            reaction, user = await bot.wait_for('reaction_add', timeout=timeout_duration, check=check)
-            emoji = str(reaction.emoji)
-            
-            if emoji == '🚮':
-                # メッセージ削除
-                await message.delete()
-                break
-                
-            elif emoji == '✅':
-                # 完了
-                await message.clear_reactions()
-                break
-                
-            elif emoji in ['1⃣', '2⃣', '3⃣', '4⃣', '6⃣', '8⃣']:
-                # ラベルサイズ変更
-                size_map = {'1⃣': 1, '2⃣': 2, '3⃣': 3, '4⃣': 4, '6⃣': 6, '8⃣': 8}
-                new_label_size = size_map[emoji]
-                
-                if new_label_size != current_label_size:
-                    await update_3d_graph(message, latex_expression, new_label_size)
-                    current_label_size = new_label_size
-            
-            elif emoji == '🔄':
-                # 3Dグラフを再生成（視点をリセット）
-                await update_3d_graph(message, latex_expression, current_label_size)
-            
-            # リアクションを削除
-            await reaction.remove(user)
-            
-        except asyncio.TimeoutError:
-            await message.clear_reactions()
-            break
-        except Exception as e:
-            logger.error(f"3Dリアクション処理エラー: {e}")
-            break
-
-async def update_3d_graph(message, latex_expression, label_size):
-    """3D用: グラフを更新"""
+async def update_3d_graph(message, request, image):
+    """3D用: 描画したグラフでメッセージを更新"""
     try:
-        # 新しい3Dグラフを生成
-        image_buffer = await gratex_bot.generate_3d_graph(latex_expression, label_size)
-        
-        # 新しいファイルを作成
-        file = discord.File(image_buffer, filename=f"gratex_3d_graph_updated.png")
-        
         # Embedを更新
         embed = discord.Embed(
             title="📊 GraTeX 3Dグラフ (更新済み)",
-            description=f"**LaTeX式:** `{latex_expression}`\n**ラベルサイズ:** {label_size}\n**モード:** 3D",
+            description=f"**LaTeX式:** `{request.expression}`\n**ラベルサイズ:** {request.label_size}\n**モード:** 3D",
             color=0x0099ff
         )
-        embed.set_image(url="attachment://gratex_3d_graph_updated.png")
         embed.set_footer(text="Powered by GraTeX 3D")
         
+        # 新しいファイルを作成（アップロード済みの画像はURLを参照）
+        attachments = attach_image(embed, image, "gratex_3d_graph_updated.png")
+        
         # メッセージを編集
-        await message.edit(attachments=[file], embed=embed)
+        edited = await message.edit(attachments=attachments, embed=embed)
+        remember_attachment(request, edited)
         
     except Exception as e:
         logger.error(f"3Dグラフ更新エラー: {e}")
 
 # Keep-alive用サーバーを起動
-from server import keep_alive
+with import_timer('server'):
+    from server import start_server, register_renderer, add_health_source
+
+async def setup_hook():
+    """ログイン時に1回だけ呼ばれる: HTTPサーバーをBotと同じイベントループで起動"""
+    try:
+        await start_server()
+    except Exception as e:
+        logger.error(f"サーバー起動エラー: {e}")
+
+bot.setup_hook = setup_hook
+
+# /health にBotの状態を載せる（イベントループ上で読むためロックは不要）
+add_health_source("reaction_sessions", lambda: len(reaction_sessions))
+add_health_source("pending_renders", lambda: len(render_coalescer))
+add_health_source("desmos_error_aborts", lambda: gratex_bot.desmos_error_aborts)
+if isinstance(gratex_bot, RenderWorkerPool):
+    add_health_source("render_workers", gratex_bot.status)
+else:
+    add_health_source("render_timing", gratex_bot.render_timing.summary)
+
+# main モジュール全体のインポート時間
+MAIN_IMPORT_TIME = time.perf_counter() - _import_started
 
 if __name__ == "__main__":
-    # サーバーを起動
-    keep_alive()
+    # 起動時間の内訳をログに出力
+    log_import_report(MAIN_IMPORT_TIME)
     
     # Botを起動
     token = os.getenv('TOKEN')
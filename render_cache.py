@@ -0,0 +1,192 @@
+"""
+描画結果のディスクキャッシュ
+正規化した描画パラメータのハッシュをキーにPNGを保存し、再起動後もブラウザを使わずに返す
+
+- 索引: SQLite（サイズ・最終アクセス時刻）
+- 画像: キーのハッシュ名のファイル（一時ファイルに書いてから os.replace で置き換える）
+- 合計サイズが上限を超えたら最終アクセスが古いものから削除
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# キャッシュの既定の保存先と合計サイズの上限
+DEFAULT_CACHE_DIR = '.render_cache'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+INDEX_FILENAME = 'index.sqlite3'
+TEMP_SUFFIX = '.tmp'
+# 他のプロセス（描画ワーカー）の一時ファイルは、書き込み中の可能性があるためこの時間（秒）が過ぎるまで消さない
+TEMP_FILE_MAX_AGE = 3600
+
+
+class RenderCache:
+    """キー（16進数のハッシュ）-> PNGデータのディスクキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """環境変数 RENDER_CACHE_DIR / RENDER_CACHE_MAX_BYTES から作成（RENDER_CACHE_DIR が空なら無効）"""
+        directory = os.getenv('RENDER_CACHE_DIR', DEFAULT_CACHE_DIR)
+        if not directory:
+            return None
+        max_bytes = int(os.getenv('RENDER_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        return cls(directory, max_bytes)
+
+    def _connect(self):
+        """初回アクセス時に保存先と索引を用意する"""
+        if self._db is not None:
+            return self._db
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_temp_files()
+
+        db = sqlite3.connect(os.path.join(self.directory, INDEX_FILENAME), check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        db.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+        db.commit()
+        self._db = db
+        return db
+
+    @staticmethod
+    def _temp_prefix():
+        # 一時ファイルの名前にプロセスIDを付け、同じ保存先を使う他のプロセスのものと区別する
+        return f'{os.getpid()}-'
+
+    def _remove_temp_files(self):
+        """書き込み途中で終了した一時ファイルを削除（このプロセスのもの・古くなった他のプロセスのもの）"""
+        prefix = self._temp_prefix()
+        expired = time.time() - TEMP_FILE_MAX_AGE
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(TEMP_SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    if name.startswith(prefix) or os.path.getmtime(path) < expired:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _path(self, key):
+        # 1ディレクトリのファイル数が増えすぎないよう先頭2文字で分ける
+        return os.path.join(self.directory, key[:2], f'{key}.png')
+
+    def get(self, key):
+        """キャッシュされたPNGデータを返す（ない場合は None）"""
+        with self._lock:
+            db = self._connect()
+            if db.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is None:
+                self.misses += 1
+                return None
+
+            try:
+                # 結果は bytes として呼び出し元が保持するため、1回の read() で読み切る
+                with open(self._path(key), 'rb') as f:
+                    image = f.read()
+                if not image:
+                    raise OSError("キャッシュファイルが空です")
+            except OSError:
+                # 索引はあるがファイルが壊れている・消えている場合は索引から削除
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                db.commit()
+                self.misses += 1
+                return None
+
+            db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            db.commit()
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        """PNGデータを保存（一時ファイルに書き切ってから置き換えるため、途中で落ちても壊れない）"""
+        with self._lock:
+            db = self._connect()
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=self._temp_prefix(), suffix=TEMP_SUFFIX)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(image)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, path)
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+
+            # ファイルを置き換えてから索引に登録する（索引だけが残る状態を作らない）
+            db.execute(
+                'INSERT OR REPLACE INTO entries (key, size, last_access) VALUES (?, ?, ?)',
+                (key, len(image), time.time()),
+            )
+            db.commit()
+            self._evict(db)
+
+    def _evict(self, db):
+        """合計サイズが上限を超えていれば最終アクセスが古いものから削除"""
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        removed = []
+        for key, size in db.execute('SELECT key, size FROM entries ORDER BY last_access'):
+            if total <= self.max_bytes:
+                break
+            removed.append(key)
+            total -= size
+
+        # 索引から先に削除する（ファイルだけが残っても次回の put で上書きされる）
+        db.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in removed])
+        db.commit()
+        for key in removed:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+        logger.info(f"描画キャッシュから {len(removed)} 件を削除（合計 {total} バイト）")
+
+    def stats(self):
+        """キャッシュの統計"""
+        with self._lock:
+            db = self._connect()
+            count, total = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
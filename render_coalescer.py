@@ -0,0 +1,105 @@
+"""
+連続した操作の描画をまとめる
+メッセージごとに操作を目標状態へ畳み込み、最後の状態だけを描画・送信する
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 最後の操作から描画を始めるまでの待ち時間（秒）
+DEFAULT_DEBOUNCE_DELAY = 0.5
+
+
+class PendingRender:
+    """1つのメッセージの描画待ち状態"""
+
+    def __init__(self):
+        self.message = None
+        self.request = None
+        self.generation = 0  # 目標状態が更新されるたびに増える
+        self.task = None
+        self.render_task = None  # 描画中の render(request)（目標状態が変わったら取り消す）
+
+
+class RenderCoalescer:
+    """メッセージごとに目標状態を保持し、古くなった描画は取り消して最新の状態で描画し直す
+
+    render(request) で画像を作成し、publish(message, request, result) でメッセージを更新する。
+    """
+
+    def __init__(self, render, publish, delay=DEFAULT_DEBOUNCE_DELAY):
+        self.render = render
+        self.publish = publish
+        self.delay = delay
+        self._pending = {}  # メッセージID -> PendingRender
+
+    def submit(self, key, message, request):
+        """目標状態を更新し、必要なら描画タスクを開始（目標状態の世代番号を返す）"""
+        state = self._pending.get(key)
+        if state is None:
+            state = self._pending[key] = PendingRender()
+
+        state.message = message
+        state.request = request
+        state.generation += 1
+
+        # 古くなった描画はブラウザを占有し続けないよう取り消す（描画の順番待ちの間でも）
+        if state.render_task is not None and not state.render_task.done():
+            state.render_task.cancel()
+
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._run(key, state))
+        return state.generation
+
+    def cancel(self, key):
+        """描画待ち・描画中の処理を取り消す（メッセージの削除時など）"""
+        state = self._pending.pop(key, None)
+        if state is not None and state.task is not None:
+            state.task.cancel()
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def _run(self, key, state):
+        try:
+            while True:
+                # 操作が続いている間は描画を始めない
+                generation = state.generation
+                await asyncio.sleep(self.delay)
+                if generation != state.generation:
+                    continue
+
+                request = state.request
+                state.render_task = asyncio.create_task(self.render(request))
+                try:
+                    result = await state.render_task
+                except asyncio.CancelledError:
+                    # submit() が古い描画を取り消した場合は、最新の状態で描画し直す
+                    if asyncio.current_task().cancelling() or generation == state.generation:
+                        raise
+                    logger.info(f"古い描画を中止: {request!r}")
+                    continue
+                finally:
+                    state.render_task = None
+
+                # 描画の完了と同時に目標状態が変わった場合は、この結果を送信せずに最新の状態で描画し直す
+                if generation != state.generation:
+                    logger.info(f"古い描画結果を破棄: {request!r}")
+                    continue
+
+                await self.publish(state.message, request, result)
+
+                if generation == state.generation:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"描画エラー: {e}")
+        finally:
+            if self._pending.get(key) is state:
+                del self._pending[key]
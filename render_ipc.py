@@ -0,0 +1,52 @@
+"""
+ゲートウェイと描画ワーカーの間の通信形式
+1つのメッセージは「JSONのヘッダー + 画像などのバイナリ」で、先頭にそれぞれの長さを付けて送る
+
+    +------------------+------------------+--------------+------------------+
+    | ヘッダー長 (4B)  | バイナリ長 (4B)  | ヘッダー JSON | バイナリ         |
+    +------------------+------------------+--------------+------------------+
+
+画像はbase64にせずそのまま送るため、受け渡しでデータが膨らまない。
+"""
+
+import json
+import struct
+
+# 長さ（ビッグエンディアンの符号なし32ビット整数 x 2）
+PREFIX = struct.Struct('>II')
+
+# 受け付けるヘッダーとバイナリの上限（壊れたデータで巨大な読み込みをしないため）
+MAX_HEADER_SIZE = 1024 * 1024
+MAX_PAYLOAD_SIZE = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """通信形式に合わないデータを受け取った"""
+
+
+def encode_message(header, payload=b''):
+    """メッセージを送信するバイト列のリストにする（バイナリはコピーしない）"""
+    data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    return [PREFIX.pack(len(data), len(payload)), data, payload]
+
+
+def write_message(writer, header, payload=b''):
+    """メッセージを書き込む（送信を待つ場合は呼び出し側で writer.drain() する）"""
+    writer.writelines(encode_message(header, payload))
+
+
+async def read_message(reader):
+    """メッセージを1つ読み込み (ヘッダー, バイナリ) を返す
+
+    相手が接続を閉じた場合は asyncio.IncompleteReadError になる。
+    """
+    header_size, payload_size = PREFIX.unpack(await reader.readexactly(PREFIX.size))
+    if header_size > MAX_HEADER_SIZE or payload_size > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"メッセージが大きすぎます（ヘッダー {header_size} / バイナリ {payload_size} バイト）")
+
+    try:
+        header = json.loads(await reader.readexactly(header_size))
+    except ValueError as e:
+        raise ProtocolError(f"ヘッダーを読み込めません: {e}") from e
+    payload = await reader.readexactly(payload_size) if payload_size else b''
+    return header, payload
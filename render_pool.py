@@ -0,0 +1,304 @@
+"""
+描画ワーカーのプロセス管理（ゲートウェイ側）
+描画は別プロセスのワーカー（render_worker.py）で行い、ゲートウェイのイベントループを止めないようにする
+GraTeXBot と同じ render / render_batch / render_sweep を持ち、main.py からは区別せずに使える
+"""
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import sys
+
+from render_ipc import read_message, write_message, ProtocolError
+from image_payload import image_buffer
+from render_cache import RenderCache
+from expression_validator import DesmosExpressionError
+
+logger = logging.getLogger(__name__)
+
+# 既定のワーカー数と、ワーカーからの応答を待つ時間（秒、これを超えたらワーカーを再起動）
+DEFAULT_RENDER_WORKERS = 1
+DEFAULT_WORKER_TIMEOUT = 120
+
+# ワーカーの起動コマンド
+WORKER_COMMAND = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_worker.py')]
+
+# 終了を依頼してからプロセスの終了を待つ時間（秒、過ぎたら強制終了）
+SHUTDOWN_GRACE_SECONDS = 10
+
+
+class RenderWorkerError(Exception):
+    """ワーカーでの描画の失敗、またはワーカーとの通信の失敗"""
+
+
+class RenderWorker:
+    """1つのワーカープロセスとの接続（要求は1度に1件ずつ）
+
+    ワーカーが落ちた・応答しない場合はプロセスを終了させ、次の要求の前に起動し直す。
+    """
+
+    def __init__(self, number, command=None, timeout=DEFAULT_WORKER_TIMEOUT):
+        self.number = number
+        self.command = command or WORKER_COMMAND
+        self.timeout = timeout
+        self.process = None
+        self._loop = None
+        self._broken = False
+        self.restarts = 0
+        # Desmosのエラーで中止した描画の数（再起動をまたいで累計する）
+        self.desmos_error_aborts = 0
+        self._reported_aborts = 0
+        # ワーカーが最後に報告した描画時間の統計
+        self.render_timing = {}
+        self._ids = itertools.count(1)
+        # 起動時の準備と描画の要求が重ならないようにする
+        self._lock = asyncio.Lock()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.returncode is None and not self._broken
+
+    async def start(self):
+        """ワーカープロセスを起動（ログは標準エラー出力をそのまま引き継ぐ）"""
+        self._loop = asyncio.get_running_loop()
+        self._broken = False
+        self._reported_aborts = 0
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        logger.info(f"🧵 描画ワーカー{self.number}を起動しました (pid {self.process.pid})")
+
+    async def ensure_started(self):
+        """ワーカーが動いていなければ起動（落ちていた場合は再起動）"""
+        if self.alive:
+            return
+        if self.process is not None:
+            await self.process.wait()
+            self.restarts += 1
+            logger.warning(f"🔁 描画ワーカー{self.number}を再起動します（終了コード {self.process.returncode}）")
+        await self.start()
+
+    def kill(self):
+        """ワーカーを強制終了（応答しない・通信が食い違った場合、次の要求の前に再起動する）"""
+        if self.process is None or self.process.returncode is not None:
+            return
+        self._broken = True
+        try:
+            self.process.kill()
+        except ProcessLookupError:
+            pass
+
+    async def restart(self):
+        """描画中の要求が終わるのを待ってから、ワーカーを起動し直す（他のワーカーには影響しない）"""
+        async with self._lock:
+            self.kill()
+            await self.ensure_started()
+
+    async def stop(self):
+        """ワーカーに終了を依頼し、終わらなければ強制終了"""
+        if self.process is None or self.process.returncode is not None:
+            return
+        if self._loop is not asyncio.get_running_loop():
+            # 起動したイベントループが既に終わっている（Bot終了後など）。
+            # このプロセスが終了すればワーカーは標準入力が閉じられて自分で終了する
+            return
+        try:
+            write_message(self.process.stdin, {'op': 'shutdown'})
+            await self.process.stdin.drain()
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), SHUTDOWN_GRACE_SECONDS)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.kill()
+            await self.process.wait()
+
+    async def call(self, op, **fields):
+        """要求を送り、応答を (ヘッダー, バイナリ) として順に返す（result / end で終わる）
+
+        途中で止めた場合はワーカーがまだ応答を送っているため、通信を揃えるためにワーカーを終了させる。
+        """
+        async with self._lock:
+            await self.ensure_started()
+            async with contextlib.aclosing(self._exchange(op, fields)) as responses:
+                async for response in responses:
+                    yield response
+
+    async def _exchange(self, op, fields):
+        request_id = next(self._ids)
+        finished = False
+        try:
+            write_message(self.process.stdin, {'id': request_id, 'op': op, **fields})
+            await self.process.stdin.drain()
+
+            while True:
+                header, payload = await asyncio.wait_for(read_message(self.process.stdout), self.timeout)
+                if header.get('id') != request_id:
+                    raise ProtocolError(f"別の要求への応答を受け取りました: {header.get('id')} != {request_id}")
+                if header['type'] in ('result', 'end', 'error'):
+                    self._count_aborts(header.get('desmos_error_aborts', self._reported_aborts))
+                    self.render_timing = header.get('render_timing', self.render_timing)
+                if header['type'] == 'error':
+                    finished = True
+                    if header.get('error') == 'DesmosExpressionError':
+                        raise DesmosExpressionError(header.get('errors', []), header.get('console_errors', []))
+                    raise RenderWorkerError(header.get('message', '描画ワーカーでエラーが発生しました'))
+                if header['type'] in ('result', 'end'):
+                    finished = True
+                yield header, payload
+                if finished:
+                    return
+
+        except asyncio.TimeoutError:
+            raise RenderWorkerError(f"描画ワーカー{self.number}が{self.timeout}秒以内に応答しませんでした")
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as e:
+            raise RenderWorkerError(f"描画ワーカー{self.number}との通信に失敗しました: {e}") from e
+        finally:
+            if not finished:
+                self.kill()
+
+    def _count_aborts(self, reported):
+        """ワーカーが報告した累計（起動からの数）の増分を加える"""
+        self.desmos_error_aborts += max(0, reported - self._reported_aborts)
+        self._reported_aborts = reported
+
+
+class RenderWorkerPool:
+    """描画ワーカーをまとめて管理し、空いているワーカーに要求を割り当てる
+
+    render_cache を指定すると、キャッシュ済みのグラフはワーカーを待たずにゲートウェイで返す
+    （保存はワーカーが同じ保存先に行う）。
+    """
+
+    def __init__(self, size=DEFAULT_RENDER_WORKERS, command=None, timeout=DEFAULT_WORKER_TIMEOUT, render_cache=None):
+        self.workers = [RenderWorker(number, command, timeout) for number in range(1, size + 1)]
+        self.render_cache = render_cache
+        # 呼び出し元が取り消した後もワーカーで続けている描画（参照を保持してガベージコレクションを防ぐ）
+        self._background = set()
+        self._idle = asyncio.Queue()
+        for worker in self.workers:
+            self._idle.put_nowait(worker)
+
+    @classmethod
+    def from_env(cls):
+        """環境変数 RENDER_WORKERS / RENDER_WORKER_TIMEOUT から作成（RENDER_WORKERS が 0 なら None）"""
+        size = int(os.getenv('RENDER_WORKERS', DEFAULT_RENDER_WORKERS))
+        if size <= 0:
+            return None
+        timeout = float(os.getenv('RENDER_WORKER_TIMEOUT', DEFAULT_WORKER_TIMEOUT))
+        return cls(size, timeout=timeout, render_cache=RenderCache.from_env())
+
+    async def load_cached(self, cache_key):
+        """描画キャッシュからPNGデータを取得（ない・無効の場合は None）"""
+        if self.render_cache is None:
+            return None
+        try:
+            return await asyncio.to_thread(self.render_cache.get, cache_key)
+        except Exception as e:
+            logger.warning(f"描画キャッシュの読み込みに失敗: {e}")
+            return None
+
+    async def _call(self, op, **fields):
+        """空いているワーカーで要求を処理し、応答を順に返す（応答が終わるまでワーカーを占有）"""
+        worker = await self._idle.get()
+        try:
+            async with contextlib.aclosing(worker.call(op, **fields)) as responses:
+                async for header, payload in responses:
+                    yield header, payload
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def initialize_browser(self):
+        """全ワーカーを起動し、それぞれのブラウザを準備する"""
+        await asyncio.gather(*(self._initialize(worker) for worker in self.workers))
+
+    async def _initialize(self, worker):
+        async for _ in worker.call('initialize'):
+            pass
+
+    async def render(self, request):
+        """グラフを描画（GraTeXBot.render と同じくBytesIOを返す、キャッシュにあれば描画中のワーカーを待たない）"""
+        cached = await self.load_cached(request.cache_key())
+        if cached is not None:
+            logger.info(f"💾 描画キャッシュを使用: {request!r}")
+            return image_buffer(cached)
+
+        # ワーカーの順番待ちの間に取り消された場合は、ワーカーに送らずにそのまま終わる
+        worker = await self._idle.get()
+        task = asyncio.create_task(self._render_on(worker, request))
+        self._background.add(task)
+        task.add_done_callback(self._finish_background)
+        # 送った後に取り消されても、応答の途中で止めるとワーカーの再起動が必要になるため最後まで受け取る
+        # （結果はワーカーが描画キャッシュに保存する）
+        return await asyncio.shield(task)
+
+    async def _render_on(self, worker, request):
+        try:
+            image = None
+            async for _, payload in worker.call('render', request=request.to_dict()):
+                image = payload
+            return image_buffer(image)
+        finally:
+            self._idle.put_nowait(worker)
+
+    def _finish_background(self, task):
+        self._background.discard(task)
+        # 呼び出し元が取り消した後のエラーは受け取る人がいないため、ここで受け取ってログに残す
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"ワーカーでの描画のエラー: {task.exception()}")
+
+    async def render_batch(self, requests):
+        """複数の2Dリクエストを1つのワーカーで続けて描画し、(順番, PNGデータ) を撮影できた順に返す
+
+        キャッシュ済みのものは先に返し、残りだけをワーカーに送る。
+        """
+        pending = []
+        for index, request in enumerate(requests):
+            cached = await self.load_cached(request.cache_key())
+            if cached is not None:
+                yield index, cached
+            else:
+                pending.append(index)
+
+        if not pending:
+            return
+
+        params = [requests[index].to_dict() for index in pending]
+        async for header, payload in self._call('render_batch', requests=params):
+            if header['type'] == 'item':
+                yield pending[header['index']], payload if header['ok'] else None
+
+    async def render_sweep(self, request, parameter, values):
+        """パラメータを動かしながら撮影したフレーム（PNGデータ）を順に返す"""
+        async for header, payload in self._call('render_sweep', request=request.to_dict(),
+                                                parameter=parameter, values=list(values)):
+            if header['type'] == 'item':
+                yield payload
+
+    async def restart_worker(self, number):
+        """指定した番号のワーカーだけを再起動"""
+        await self.workers[number - 1].restart()
+
+    async def cleanup_browser(self):
+        """ゲートウェイの切断時に呼ばれる（ワーカーのブラウザは接続と無関係なため閉じない）"""
+
+    async def close(self):
+        """全ワーカーを終了"""
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+        if self.render_cache is not None:
+            self.render_cache.close()
+
+    @property
+    def desmos_error_aborts(self):
+        """全ワーカーでDesmosのエラーにより中止した描画の数"""
+        return sum(worker.desmos_error_aborts for worker in self.workers)
+
+    def status(self):
+        """各ワーカーの状態（稼働中か・再起動回数・Desmosのエラーで中止した描画の数・描画時間の統計）"""
+        return [
+            {'worker': worker.number, 'alive': worker.alive, 'restarts': worker.restarts,
+             'desmos_error_aborts': worker.desmos_error_aborts, 'render_timing': worker.render_timing}
+            for worker in self.workers
+        ]
@@ -0,0 +1,138 @@
+"""
+グラフ生成リクエスト
+入力式・変換済みLaTeX・描画パラメータをまとめて処理全体に受け渡す
+"""
+
+import hashlib
+import json
+import re
+
+from latex_converter import convert_expression, normalize_expression
+
+# 描画結果の形式が変わったら更新する（古いキャッシュを使わないようにするため）
+# 2: 計算機のスクリーンショットAPIで直接撮影（GraTeXのキャプションなし）
+# 3: 直接撮影した画像にラベルサイズのキャプション（空白を除いた入力式）を描く
+RENDER_FORMAT_VERSION = 3
+
+# 出力サイズ: 名前 -> (幅, 高さ, ピクセル比)。画像のピクセル数は 幅×ピクセル比 × 高さ×ピクセル比
+OUTPUT_SIZES = {
+    'thumbnail': (640, 360, 1),
+    'normal': (1280, 720, 1.5),
+    'print': (1280, 720, 3),
+}
+DEFAULT_OUTPUT_SIZE = 'normal'
+
+# 1つのグラフに描く式の上限と、式の区切り（改行または ;）
+# LaTeXの空白 \; は式の途中にあるため区切りとしない
+MAX_EXPRESSIONS = 10
+EXPRESSION_SEPARATOR = re.compile(r'(?<!\\);|\n')
+
+
+def split_expressions(text):
+    """入力を式ごとに分割（前後の空白を除き、空の式は除く）"""
+    return [part.strip() for part in EXPRESSION_SEPARATOR.split(text) if part.strip()]
+
+
+class RenderRequest:
+    """1回のグラフ生成に必要なパラメータ（LaTeX変換は作成時に1度だけ行う）"""
+
+    __slots__ = ('expression', 'latex', 'mode', 'label_size', 'zoom_level', 'latex_expressions', 'views',
+                 'output_size')
+
+    def __init__(self, expression, latex, mode="2d", label_size=4, zoom_level=0, latex_expressions=None, views=(),
+                 output_size=DEFAULT_OUTPUT_SIZE):
+        if output_size not in OUTPUT_SIZES:
+            raise ValueError(f"出力サイズは {', '.join(OUTPUT_SIZES)} のいずれかを指定してください")
+        self.expression = expression
+        self.latex = latex  # 表示用（複数の式は "; " で連結）
+        self.mode = mode
+        self.label_size = label_size
+        self.zoom_level = zoom_level
+        # 計算機に1つずつ設定する式
+        self.latex_expressions = tuple(latex_expressions) if latex_expressions else (latex,)
+        # 3Dで撮影する視点（空なら標準の1方向、複数なら1枚にまとめる）
+        self.views = tuple(views)
+        # 画像の大きさ（OUTPUT_SIZES の名前）
+        self.output_size = output_size
+
+    @classmethod
+    def from_input(cls, expression, mode="2d", label_size=4, zoom_level=0, views=(), output_size=DEFAULT_OUTPUT_SIZE):
+        """ユーザー入力から作成（ここでLaTeX変換を行う、改行または ; で区切った複数の式にも対応）"""
+        parts = split_expressions(expression)
+        if len(parts) <= 1:
+            latex = convert_expression(expression)
+            return cls(expression, latex, mode.lower(), label_size, zoom_level, views=views, output_size=output_size)
+
+        latex_expressions = [convert_expression(part) for part in parts]
+        return cls(expression, "; ".join(latex_expressions), mode.lower(), label_size, zoom_level,
+                   latex_expressions, views, output_size)
+
+    @property
+    def expression_count(self):
+        return len(self.latex_expressions)
+
+    @property
+    def screenshot_size(self):
+        """撮影する (幅, 高さ, ピクセル比)"""
+        return OUTPUT_SIZES[self.output_size]
+
+    @property
+    def caption(self):
+        """画像に描くキャプション (式, ラベルサイズ)
+
+        空白を除いた入力式（複数の式は "; " で連結）。空白の違いだけのリクエストは同じキャッシュキー・同じ画像になる。
+        """
+        return "; ".join("".join(part.split()) for part in split_expressions(self.expression)), self.label_size
+
+    @property
+    def converted(self):
+        """入力式がLaTeX変換で書き換えられたか"""
+        return self.latex != self.expression
+
+    def to_dict(self):
+        """パラメータの辞書（描画ワーカーへの受け渡しにも使う）"""
+        return {
+            "expression": self.expression,
+            "latex": self.latex,
+            "mode": self.mode,
+            "label_size": self.label_size,
+            "zoom_level": self.zoom_level,
+            "latex_expressions": self.latex_expressions,
+            "views": self.views,
+            "output_size": self.output_size,
+        }
+
+    @classmethod
+    def from_dict(cls, params):
+        """to_dict() の辞書から作成（LaTeXは再変換しない）"""
+        return cls(**params)
+
+    def replace(self, **changes):
+        """一部のパラメータだけを変えたリクエストを作成（LaTeXは再変換しない）"""
+        params = self.to_dict()
+        params.update(changes)
+        return RenderRequest(**params)
+
+    def cache_key(self):
+        """描画結果のキャッシュキー（正規化した描画パラメータのSHA-256）"""
+        params = [
+            RENDER_FORMAT_VERSION,
+            [normalize_expression(part) for part in split_expressions(self.expression)],
+            self.mode,
+            self.label_size,
+            self.zoom_level if self.mode == "2d" else 0,
+            # キャプションは入力式のまま描くため、正規化で同じになる式（sin x と sin(x) など）も別の画像
+            self.caption[0],
+        ]
+        # 視点を指定しない場合は従来と同じキーにする（既存のキャッシュを使い続けるため）
+        if self.views:
+            params.append(list(self.views))
+        if self.output_size != DEFAULT_OUTPUT_SIZE:
+            params.append(self.output_size)
+        return hashlib.sha256(json.dumps(params, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def __repr__(self):
+        views = f", views={self.views!r}" if self.views else ""
+        size = f", output_size={self.output_size!r}" if self.output_size != DEFAULT_OUTPUT_SIZE else ""
+        return (f"RenderRequest({self.expression!r}, mode={self.mode!r}, "
+                f"label_size={self.label_size}, zoom_level={self.zoom_level}{views}{size})")
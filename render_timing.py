@@ -0,0 +1,156 @@
+"""
+描画にかかった時間の統計
+モード・式の複雑さ（構文木のノード数）ごとに直近の所要時間をヒストグラムで保持し、
+その分位点から描画の待ち時間とタイムアウトを決める（単純なグラフは早く、重いグラフは打ち切らずに）
+"""
+
+import bisect
+import re
+from collections import deque
+
+from expression_parser import parse_expression, ExpressionSyntaxError
+from render_request import split_expressions
+
+# 複雑さの区分（構文木のノード数の上限, 名前）、最後の上限を超えるものは 'heavy'
+COMPLEXITY_BUCKETS = ((8, 'simple'), (32, 'moderate'), (128, 'complex'))
+HEAVIEST_BUCKET = 'heavy'
+
+# ヒストグラムの区間の上限（秒）
+LATENCY_BOUNDS = (
+    0.025, 0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0,
+    5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0,
+)
+
+# 区分ごとに保持する直近の記録数と、統計を使い始めるのに必要な記録数（それまでは既定値を使う）
+ROLLING_WINDOW = 100
+MIN_SAMPLES = 5
+
+# 式の解析（expressionAnalysis）が終わってから撮影するまでの待ち時間 = 解析時間の90パーセンタイル × 係数
+SETTLE_FACTOR = 1.5
+MIN_SETTLE_SECONDS = 0.2
+MAX_SETTLE_SECONDS = 10.0
+
+# タイムアウト = 所要時間の99パーセンタイル × 係数（下限・上限の範囲内）
+# 上限は、1件の描画全体が描画ワーカーの応答待ち（RENDER_WORKER_TIMEOUT の既定 120秒）に収まるようにする
+TIMEOUT_FACTOR = 3.0
+ANALYSIS_TIMEOUT_RANGE = (1.5, 10.0)
+CAPTURE_TIMEOUT_RANGE = (5.0, 60.0)
+
+# 構文解析できない式（LaTeXで書かれた式など）のノード数の見積もりに使う字句
+_LATEX_TOKEN_PATTERN = re.compile(r'\\[A-Za-z]+|[A-Za-z]|[0-9.]+|[^\s{}]')
+
+
+def expression_complexity(expression):
+    """入力式の複雑さ（式ごとの構文木のノード数の合計）"""
+    total = 0
+    for part in split_expressions(expression):
+        try:
+            total += sum(1 for _ in parse_expression(part).walk())
+        except ExpressionSyntaxError:
+            total += len(_LATEX_TOKEN_PATTERN.findall(part))
+    return total
+
+
+def complexity_bucket(complexity):
+    for limit, name in COMPLEXITY_BUCKETS:
+        if complexity <= limit:
+            return name
+    return HEAVIEST_BUCKET
+
+
+def timing_key(request):
+    """リクエストの統計の区分（例: '2d/simple'）"""
+    return f"{request.mode}/{complexity_bucket(expression_complexity(request.expression))}"
+
+
+def _clamp(value, bounds):
+    low, high = bounds
+    return min(max(value, low), high)
+
+
+class LatencyHistogram:
+    """直近 window 件の所要時間のヒストグラム（古い記録から区間の度数を減らす）"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.counts = [0] * (len(LATENCY_BOUNDS) + 1)
+        self._recent = deque()
+        self.window = window
+        self.maximum = 0.0
+
+    def __len__(self):
+        return len(self._recent)
+
+    def add(self, seconds):
+        index = bisect.bisect_left(LATENCY_BOUNDS, seconds)
+        self._recent.append((index, seconds))
+        self.counts[index] += 1
+        if len(self._recent) > self.window:
+            old_index, _ = self._recent.popleft()
+            self.counts[old_index] -= 1
+        self.maximum = max(seconds for _, seconds in self._recent)
+
+    def percentile(self, fraction):
+        """fraction（0〜1）の分位点を含む区間の上限（秒、最後の区間は直近の最大値）"""
+        if not self._recent:
+            return None
+        target = fraction * len(self._recent)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BOUNDS[index] if index < len(LATENCY_BOUNDS) else self.maximum
+        return self.maximum
+
+
+class RenderTiming:
+    """区分（モード/複雑さ）と段階（analysis: 式の解析、capture: 撮影）ごとの所要時間の統計"""
+
+    def __init__(self, window=ROLLING_WINDOW, min_samples=MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._histograms = {}  # (区分, 段階) -> LatencyHistogram
+
+    def record(self, key, phase, seconds):
+        histogram = self._histograms.get((key, phase))
+        if histogram is None:
+            histogram = self._histograms[(key, phase)] = LatencyHistogram(self.window)
+        histogram.add(seconds)
+
+    def percentile(self, key, phase, fraction):
+        """記録が min_samples 件未満なら None"""
+        histogram = self._histograms.get((key, phase))
+        if histogram is None or len(histogram) < self.min_samples:
+            return None
+        return histogram.percentile(fraction)
+
+    def settle_seconds(self, key, default):
+        """式の解析が終わってから撮影するまでの待ち時間（秒）"""
+        observed = self.percentile(key, 'analysis', 0.9)
+        if observed is None:
+            return default
+        return _clamp(observed * SETTLE_FACTOR, (MIN_SETTLE_SECONDS, MAX_SETTLE_SECONDS))
+
+    def analysis_timeout(self, key, default):
+        """式の解析結果を待つ時間（秒）"""
+        observed = self.percentile(key, 'analysis', 0.99)
+        if observed is None:
+            return default
+        return _clamp(observed * TIMEOUT_FACTOR, ANALYSIS_TIMEOUT_RANGE)
+
+    def capture_timeout(self, key, default):
+        """撮影の完了を待つ時間（秒）"""
+        observed = self.percentile(key, 'capture', 0.99)
+        if observed is None:
+            return default
+        return _clamp(observed * TIMEOUT_FACTOR, CAPTURE_TIMEOUT_RANGE)
+
+    def summary(self):
+        """/health 用: 区分ごとの記録数・中央値・90パーセンタイル（秒）"""
+        result = {}
+        for (key, phase), histogram in sorted(self._histograms.items()):
+            result.setdefault(key, {})[phase] = {
+                'samples': len(histogram),
+                'p50': histogram.percentile(0.5),
+                'p90': histogram.percentile(0.9),
+            }
+        return result
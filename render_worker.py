@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+描画ワーカー
+ゲートウェイ（main.py）から標準入力で描画の要求を受け取り、ブラウザで描画した画像を標準出力で返す
+（通信形式は render_ipc.py を参照、ログは標準エラー出力に出す）
+
+要求（ヘッダーの op）:
+    initialize    ブラウザを起動する                 -> end
+    render        1つのグラフを描画する             -> result（バイナリ: PNGデータ）
+    render_batch  複数のグラフを続けて描画する       -> item（index, ok）を撮影順に繰り返し -> end
+    render_sweep  パラメータを動かしながら撮影する   -> item（index）をフレーム順に繰り返し -> end
+    shutdown      ブラウザを閉じて終了する
+失敗した場合はその時点で error（message, error: 例外の種類）を返し、次の要求を待つ。
+Desmosが式を誤りとした場合の error には errors（[式の番号, メッセージ] のリスト）と console_errors が付く。
+result / end / error には、このワーカーでDesmosのエラーにより中止した描画の累計（desmos_error_aborts）と
+描画時間の統計（render_timing、RenderTiming.summary()）が付く。
+"""
+
+import asyncio
+import logging
+import os
+
+from render_ipc import read_message, write_message
+from render_request import RenderRequest
+from expression_validator import DesmosExpressionError
+
+logger = logging.getLogger(__name__)
+
+
+def final_header(renderer, request_id, type, **fields):
+    """要求の最後の応答（result / end / error）のヘッダー"""
+    header = {
+        'id': request_id,
+        'type': type,
+        'desmos_error_aborts': getattr(renderer, 'desmos_error_aborts', 0),
+        **fields,
+    }
+    render_timing = getattr(renderer, 'render_timing', None)
+    if render_timing is not None:
+        header['render_timing'] = render_timing.summary()
+    return header
+
+
+async def handle_request(renderer, header, writer):
+    """1つの要求を処理して応答を書き込む"""
+    request_id = header.get('id')
+    op = header.get('op')
+
+    if op == 'initialize':
+        await renderer.initialize_browser()
+        write_message(writer, final_header(renderer, request_id, 'end'))
+
+    elif op == 'render':
+        image = await renderer.render(RenderRequest.from_dict(header['request']))
+        write_message(writer, final_header(renderer, request_id, 'result'), image.getvalue())
+
+    elif op == 'render_batch':
+        requests = [RenderRequest.from_dict(params) for params in header['requests']]
+        async for index, image in renderer.render_batch(requests):
+            write_message(writer, {'id': request_id, 'type': 'item', 'index': index, 'ok': image is not None}, image or b'')
+            # 撮影できたものから順にゲートウェイへ届ける
+            await writer.drain()
+        write_message(writer, final_header(renderer, request_id, 'end'))
+
+    elif op == 'render_sweep':
+        request = RenderRequest.from_dict(header['request'])
+        index = 0
+        async for frame in renderer.render_sweep(request, header['parameter'], header['values']):
+            write_message(writer, {'id': request_id, 'type': 'item', 'index': index}, frame)
+            await writer.drain()
+            index += 1
+        write_message(writer, final_header(renderer, request_id, 'end'))
+
+    else:
+        raise ValueError(f"不明な要求です: {op}")
+
+
+async def serve(renderer, reader, writer):
+    """ゲートウェイが接続を閉じるか shutdown を送るまで、要求を1つずつ処理する"""
+    while True:
+        try:
+            header, _ = await read_message(reader)
+        except asyncio.IncompleteReadError:
+            logger.info("ゲートウェイとの接続が閉じられました")
+            break
+
+        if header.get('op') == 'shutdown':
+            break
+
+        try:
+            await handle_request(renderer, header, writer)
+        except Exception as e:
+            logger.error(f"描画ワーカーの処理エラー ({header.get('op')}): {e}")
+            details = {}
+            if isinstance(e, DesmosExpressionError):
+                details = {'errors': e.errors, 'console_errors': e.console_errors}
+            write_message(writer, final_header(renderer, header.get('id'), 'error',
+                                               message=str(e), error=type(e).__name__, **details))
+        await writer.drain()
+
+
+async def open_stdio(output_fd):
+    """標準入力と、通信用に複製した標準出力を asyncio のストリームとして開く"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(0, 'rb', 0))
+    transport, protocol = await loop.connect_write_pipe(
+        asyncio.streams.FlowControlMixin, os.fdopen(output_fd, 'wb', 0))
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
+
+
+async def run_worker(output_fd, renderer_factory):
+    renderer = renderer_factory()
+    reader, writer = await open_stdio(output_fd)
+    try:
+        await serve(renderer, reader, writer)
+    finally:
+        await renderer.close()
+
+
+def main(renderer_factory=None):
+    """ワーカーを起動（renderer_factory を省略した場合はブラウザで描画する GraTeXBot を使う）"""
+    if renderer_factory is None:
+        from graph_renderer import GraTeXBot
+        renderer_factory = GraTeXBot
+
+    logging.basicConfig(level=logging.INFO, format=f'[worker {os.getpid()}] %(levelname)s:%(name)s:%(message)s')
+
+    # 標準出力は通信専用にし、print などの出力は標準エラー出力に回す
+    output_fd = os.dup(1)
+    os.dup2(2, 1)
+
+    asyncio.run(run_worker(output_fd, renderer_factory))
+
+
+if __name__ == "__main__":
+    main()
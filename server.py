@@ -1,55 +1,195 @@
-from bottle import route, run, Bottle
-import threading
+from aiohttp import web
+import asyncio
+import os
 import logging
 
+from latex_converter import conversion_cache_stats, ExpressionTooLongError, MAX_EXPRESSION_LENGTH
+from expression_validator import ExpressionValidationError, DesmosExpressionError, validate_expressions
+from render_request import RenderRequest, split_expressions, MAX_EXPRESSIONS, OUTPUT_SIZES, DEFAULT_OUTPUT_SIZE
+
 # ログ設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Bottleアプリケーション
-app = Bottle()
+# 描画APIで1件の描画を待つ時間（秒）
+RENDER_API_TIMEOUT = 120
+
+# 描画APIの結果をクライアント・プロキシがキャッシュしてよい時間（秒）
+RENDER_API_MAX_AGE = 86400
+
+# 描画APIで使う描画（RenderRequestを受け取るコルーチン関数）
+# Botの起動前は未登録で、/render は 503 を返す
+_renderer = None
+
+# /health に載せる追加情報（名前 -> 値を返す関数、イベントループ上で呼ばれるためBotの状態を直接読める）
+_health_sources = {}
+
+def register_renderer(render):
+    """/render で使う描画を登録（Discordのコマンドと同じ描画・順番待ち・キャッシュを使う）"""
+    global _renderer
+    _renderer = render
 
-@app.route('/')
-def home():
+def add_health_source(name, source):
+    """/health に載せる情報を追加"""
+    _health_sources[name] = source
+
+routes = web.RouteTableDef()
+
+@routes.get('/')
+async def home(request):
     """ヘルスチェック用エンドポイント"""
-    return {
+    return web.json_response({
         "status": "alive",
         "service": "GraTeX Discord Bot",
         "message": "Bot is running successfully!"
-    }
+    })
 
-@app.route('/health')
-def health():
+@routes.get('/health')
+async def health(request):
     """詳細なヘルスチェック"""
-    return {
+    result = {
         "status": "healthy",
         "service": "GraTeX Bot Keep-Alive Server",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "conversion_cache": conversion_cache_stats()
     }
+    for name, source in _health_sources.items():
+        try:
+            result[name] = source()
+        except Exception as e:
+            logger.warning(f"ヘルスチェック情報 {name} の取得に失敗: {e}")
+            result[name] = None
+    return web.json_response(result)
+
+class RenderAPIError(Exception):
+    """描画APIのエラー（HTTPステータスとメッセージ、details は応答に追加する情報）"""
+
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+def error_response(status, message, **details):
+    """エラーをJSONで返す"""
+    return web.json_response({"error": message, **details}, status=status)
+
+def parse_render_request(params):
+    """描画APIのパラメータをRenderRequestにする（不正な場合は RenderAPIError）"""
+    latex = params.get('latex')
+    if not isinstance(latex, str) or not latex.strip():
+        raise RenderAPIError(400, "latex を指定してください")
+
+    mode = str(params.get('mode', '2d')).lower()
+    if mode not in ('2d', '3d'):
+        raise RenderAPIError(400, "mode は 2d または 3d を指定してください")
 
-def run_server():
-    """サーバーを実行"""
     try:
-        # Railway環境では PORT 環境変数を使用
-        import os
-        port = int(os.environ.get('PORT', 8080))
-        
-        logger.info(f"Keep-alive サーバーをポート {port} で起動中...")
-        app.run(host='0.0.0.0', port=port, debug=False, quiet=True)
-        
-    except Exception as e:
-        logger.error(f"サーバー起動エラー: {e}")
+        label_size = int(params.get('label_size', 4))
+        zoom_level = int(params.get('zoom_level', 0))
+    except (TypeError, ValueError):
+        raise RenderAPIError(400, "label_size と zoom_level は整数で指定してください")
+    if label_size not in (1, 2, 3, 4, 6, 8):
+        raise RenderAPIError(400, "label_size は 1, 2, 3, 4, 6, 8 のいずれかを指定してください")
+    if not -3 <= zoom_level <= 3:
+        raise RenderAPIError(400, "zoom_level は -3 から 3 の範囲で指定してください")
+    if mode == '3d':
+        zoom_level = 0
+
+    size = str(params.get('size', DEFAULT_OUTPUT_SIZE)).lower()
+    if size not in OUTPUT_SIZES:
+        raise RenderAPIError(400, f"size は {', '.join(OUTPUT_SIZES)} のいずれかを指定してください")
+
+    if len(latex) > MAX_EXPRESSION_LENGTH:
+        raise RenderAPIError(413, str(ExpressionTooLongError(len(latex))))
+
+    parts = split_expressions(latex)
+    if len(parts) > MAX_EXPRESSIONS:
+        raise RenderAPIError(400, f"1つのグラフに描ける式は{MAX_EXPRESSIONS}個までです")
 
-def keep_alive():
-    """バックグラウンドでサーバーを起動"""
+    # 明らかに描画できない式は描画の順番待ちに並ばずにすぐ返す
     try:
-        server_thread = threading.Thread(target=run_server, daemon=True)
-        server_thread.start()
-        logger.info("Keep-alive サーバーがバックグラウンドで起動しました")
-        
+        validate_expressions(parts)
+    except ExpressionValidationError as e:
+        raise RenderAPIError(400, e.message, expression_index=e.index or 1,
+                             position=e.position, length=e.length, pointer=e.pointer())
+
+    try:
+        return RenderRequest.from_input(latex, mode, label_size, zoom_level, output_size=size)
+    except ExpressionTooLongError as e:
+        raise RenderAPIError(413, str(e))
+
+async def render_png(request, params):
+    """描画APIの本体: PNGを返す（ETagは描画パラメータのハッシュで、一致すれば描画せず304）"""
+    try:
+        return await _render_png(request, params)
+    except RenderAPIError as e:
+        return error_response(e.status, str(e), **e.details)
+
+async def _render_png(request, params):
+    render_request = parse_render_request(params)
+    etag = f'"{render_request.cache_key()}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={RENDER_API_MAX_AGE}',
+    }
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return web.Response(status=304, headers=headers)
+
+    if _renderer is None:
+        raise RenderAPIError(503, "描画の準備ができていません")
+
+    # 描画はDiscordのコマンドと同じ順番待ちに並ぶ（待っている間も他の接続は処理される）
+    try:
+        image = await asyncio.wait_for(_renderer(render_request), RENDER_API_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise RenderAPIError(504, f"{RENDER_API_TIMEOUT}秒以内に描画できませんでした")
+    except DesmosExpressionError as e:
+        # 事前チェックを通ったがDesmosが解釈できなかった式（入力の誤りなので 422）
+        raise RenderAPIError(422, str(e), expressions=[
+            {"expression_index": index or 1, "message": message} for index, message in e.errors
+        ])
     except Exception as e:
-        logger.error(f"Keep-alive サーバーの起動に失敗: {e}")
+        logger.error(f"描画APIのエラー: {e}")
+        raise RenderAPIError(502, f"描画に失敗しました: {e}")
+
+    return web.Response(body=image.getvalue(), content_type='image/png', headers=headers)
+
+@routes.post('/render')
+async def render_post(request):
+    """描画API: JSON {"latex", "mode", "label_size", "zoom_level", "size"} を受け取りPNGを返す"""
+    try:
+        params = await request.json()
+    except ValueError:
+        params = None
+    if not isinstance(params, dict):
+        return error_response(400, "JSONのオブジェクトを送信してください")
+    return await render_png(request, params)
+
+@routes.get('/render')
+async def render_get(request):
+    """描画API（クエリパラメータ版、URLだけでプロキシ・CDNにキャッシュさせる場合）"""
+    return await render_png(request, request.query)
+
+def create_app():
+    """aiohttpアプリケーションを作成（Botと同じイベントループで動かす）"""
+    app = web.Application()
+    app.add_routes(routes)
+    return app
+
+async def start_server(port=None):
+    """実行中のイベントループ上でサーバーを起動し、停止用の AppRunner を返す"""
+    # Railway環境では PORT 環境変数を使用
+    if port is None:
+        port = int(os.environ.get('PORT', 8080))
+
+    runner = web.AppRunner(create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    logger.info(f"Keep-alive サーバーをポート {port} で起動しました")
+    return runner
 
 if __name__ == "__main__":
     # 直接実行された場合はサーバーのみを起動
-    run_server()
+    web.run_app(create_app(), port=int(os.environ.get('PORT', 8080)), access_log=None)
@@ -0,0 +1,113 @@
+"""
+リアクション操作のセッション管理
+メッセージIDからセッションを O(1) で引けるテーブルと、一定時間操作がないセッションの期限切れ処理
+"""
+
+import time
+from collections import OrderedDict
+
+# 操作がないままセッションを保持する時間（秒）
+DEFAULT_SESSION_TTL = 300
+
+# 同時に保持するセッションの上限（超えた場合は最も長く操作されていないものから削除）
+DEFAULT_MAX_SESSIONS = 10000
+
+
+class ReactionSession:
+    """操作できる1つのグラフメッセージの状態
+
+    式・モード・ラベルサイズ・ズームレベルは request（RenderRequest）が保持し、
+    操作のたびにこのセッションの状態から描画する（他のメッセージの状態は参照しない）。
+    """
+
+    __slots__ = ('message_id', 'channel_id', 'user_id', 'request', 'actions', 'expires_at', 'image_hash')
+
+    def __init__(self, message_id, channel_id, user_id, request, actions, expires_at=0.0, image_hash=None):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.request = request
+        self.actions = actions  # 絵文字 -> (操作, 値)
+        self.expires_at = expires_at
+        self.image_hash = image_hash  # 最後に送信した画像のハッシュ
+
+    @property
+    def expression(self):
+        return self.request.expression
+
+    @property
+    def mode(self):
+        return self.request.mode
+
+    @property
+    def label_size(self):
+        return self.request.label_size
+
+    @property
+    def zoom_level(self):
+        return self.request.zoom_level
+
+    def action_for(self, emoji):
+        """絵文字に対応する操作を返す（対象外の絵文字は None）"""
+        return self.actions.get(emoji)
+
+    def __repr__(self):
+        return f"ReactionSession(message_id={self.message_id}, user_id={self.user_id}, request={self.request!r})"
+
+
+class SessionStore:
+    """メッセージID -> セッションのテーブル（最後に操作された順に並べて期限切れを先頭から取り除く）"""
+
+    def __init__(self, ttl=DEFAULT_SESSION_TTL, max_sessions=DEFAULT_MAX_SESSIONS, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self._sessions = OrderedDict()
+
+    def add(self, session):
+        """セッションを登録（同じメッセージの既存セッションは置き換える）"""
+        session.expires_at = self.clock() + self.ttl
+        self._sessions[session.message_id] = session
+        self._sessions.move_to_end(session.message_id)
+
+        # 上限を超えたら最も長く操作されていないセッションから削除
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get(self, message_id):
+        """有効なセッションを返す（未登録・期限切れは None）"""
+        session = self._sessions.get(message_id)
+        # 期限切れのセッションは sweep() で後片付けするまで残しておく
+        if session is None or session.expires_at <= self.clock():
+            return None
+        return session
+
+    def touch(self, session):
+        """操作があったセッションの期限を延長"""
+        if session.message_id in self._sessions:
+            session.expires_at = self.clock() + self.ttl
+            self._sessions.move_to_end(session.message_id)
+
+    def remove(self, message_id):
+        """セッションを削除して返す（未登録の場合は None）"""
+        return self._sessions.pop(message_id, None)
+
+    def sweep(self):
+        """期限切れのセッションを取り除いて返す"""
+        now = self.clock()
+        expired = []
+        # 期限は末尾ほど遅いので、期限内のセッションが現れた時点で終了する
+        while self._sessions:
+            message_id, session = next(iter(self._sessions.items()))
+            if session.expires_at > now:
+                break
+            del self._sessions[message_id]
+            expired.append(session)
+        return expired
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, message_id):
+        return self.get(message_id) is not None
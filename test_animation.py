@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+パラメータアニメーション（animation）のテスト
+"""
+
+import io
+
+from PIL import Image
+
+from animation import AnimationEncoder, sweep_values, format_parameter_value
+
+def make_png(width, height, color):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, format='PNG')
+    return output.getvalue()
+
+def test_sweep_values():
+    """パラメータの値が両端を含めて等間隔になり、Desmos向けの表記になるか"""
+    print("=== パラメータ値テスト ===")
+    values = sweep_values(-1, 1, 5)
+    print(f"値: {values}")
+    assert values == [-1, -0.5, 0, 0.5, 1]
+    assert sweep_values(3, 3, 1) == [3]
+
+    assert format_parameter_value(0.5) == "0.5"
+    assert format_parameter_value(2.0) == "2"
+    assert format_parameter_value(-1e-9) == "0"
+    assert format_parameter_value(1e-5) == "0.00001"
+    print("✓ パラメータ値正常")
+
+def test_encode_gif_and_apng():
+    """フレームが縮小されて、指定したフレーム数のGIF/APNGになるか"""
+    print("\n=== エンコードテスト ===")
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+    for format, expected in [('gif', 'GIF'), ('apng', 'PNG')]:
+        encoder = AnimationEncoder(format, max_width=400)
+        for color in colors:
+            encoder.add(make_png(1920, 1080, color))
+        data = encoder.finish()
+
+        with Image.open(io.BytesIO(data)) as animation:
+            print(f"{format}: {animation.format} {animation.size} {animation.n_frames}フレーム")
+            assert animation.format == expected
+            assert animation.size == (400, 225)
+            assert animation.n_frames == len(colors)
+            animation.seek(1)
+            assert animation.convert('RGB').getpixel((10, 10)) == (0, 255, 0)
+    encoder = AnimationEncoder('apng')
+    assert encoder.extension == 'png'
+    encoder.close()
+    print("✓ エンコード正常")
+
+def test_invalid_frame_raises():
+    """壊れたフレームがあれば finish() でエラーになるか"""
+    print("\n=== 不正フレームテスト ===")
+    encoder = AnimationEncoder('gif')
+    encoder.add(b'not a png')
+    try:
+        encoder.finish()
+    except Exception as e:
+        print(f"エラー: {type(e).__name__}")
+    else:
+        raise AssertionError("壊れたフレームでエラーになりませんでした")
+    print("✓ 不正フレーム検出")
+
+if __name__ == "__main__":
+    test_sweep_values()
+    test_encode_gif_and_apng()
+    test_invalid_frame_raises()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+アップロード済み画像のURL索引のテスト
+"""
+
+from attachment_index import AttachmentIndex, parse_cdn_expiry, is_discord_cdn_url
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def cdn_url(name, expires_at):
+    return (f"https://cdn.discordapp.com/attachments/1/2/{name}.png"
+            f"?ex={expires_at:x}&is=0&hm=abc&")
+
+def test_parse_cdn_url():
+    """CDNのURLと有効期限（ex=）を判定できるか"""
+    print("=== CDN URL解析テスト ===")
+
+    assert parse_cdn_expiry(cdn_url("a", 0x66000000)) == 0x66000000
+    assert parse_cdn_expiry("https://cdn.discordapp.com/attachments/1/2/a.png") is None
+    assert parse_cdn_expiry("https://cdn.discordapp.com/a.png?ex=zz") is None
+
+    assert is_discord_cdn_url(cdn_url("a", 1))
+    assert is_discord_cdn_url("https://media.discordapp.net/attachments/1/2/a.png")
+    assert not is_discord_cdn_url("http://cdn.discordapp.com/a.png")
+    assert not is_discord_cdn_url("https://example.com/a.png")
+    print("✓ 解析正常")
+
+def test_lookup_and_expiry():
+    """登録したURLを再利用でき、期限が近づいたら使わなくなるか"""
+    print("\n=== 再利用・期限テスト ===")
+    clock = FakeClock(1000)
+    index = AttachmentIndex(expiry_margin=100, clock=clock)
+
+    assert index.record("key", cdn_url("a", 5000), message_id=1)
+    assert not index.record("other", "https://example.com/a.png", message_id=1)
+
+    assert index.lookup("key") == cdn_url("a", 5000)
+    assert index.lookup("other") is None
+
+    clock.now = 4950  # 期限の100秒前を過ぎた
+    assert index.lookup("key") is None
+    assert len(index) == 0
+    print("✓ 期限切れ直前のURLは使わない")
+
+def test_invalidate_message():
+    """メッセージの削除・画像の差し替えでURLが無効化されるか"""
+    print("\n=== 無効化テスト ===")
+    index = AttachmentIndex(clock=FakeClock())
+
+    index.record("a", cdn_url("a", 10**9), message_id=1)
+    index.record("b", cdn_url("b", 10**9), message_id=1)
+    index.record("c", cdn_url("c", 10**9), message_id=2)
+
+    index.invalidate_message(1)
+    assert index.lookup("a") is None and index.lookup("b") is None
+    assert index.lookup("c") is not None
+
+    # 編集: 残っている添付ファイル（署名が変わっても同じファイル）のURLは使い続ける
+    index.record("d", cdn_url("d", 10**9), message_id=3)
+    index.record("e", cdn_url("e", 10**9), message_id=3)
+    index.invalidate_missing(3, [cdn_url("d", 2 * 10**9)])
+    assert index.lookup("d") is not None and index.lookup("e") is None
+    index.invalidate_missing(3, [])
+    assert index.lookup("d") is None
+    print("✓ 無効化正常")
+
+def test_bounded_index():
+    """上限を超えたら最も長く使われていないURLから削除されるか"""
+    print("\n=== 上限テスト ===")
+    index = AttachmentIndex(max_entries=2, clock=FakeClock())
+
+    index.record("a", cdn_url("a", 10**9), message_id=1)
+    index.record("b", cdn_url("b", 10**9), message_id=2)
+    index.lookup("a")
+    index.record("c", cdn_url("c", 10**9), message_id=3)
+
+    assert index.lookup("b") is None
+    assert index.lookup("a") is not None and index.lookup("c") is not None
+    print("✓ 上限正常")
+
+if __name__ == "__main__":
+    test_parse_cdn_url()
+    test_lookup_and_expiry()
+    test_invalidate_message()
+    test_bounded_index()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+一括変換APIとCLIのテスト
+"""
+
+import io
+import json
+
+import latex_converter
+from latex_converter import convert_many, convert_expression, conversion_cache_stats, MAX_EXPRESSION_LENGTH, ExpressionTooLongError
+from batch_convert import convert_stream
+
+EXPRESSIONS = [
+    "y = sin(x)",
+    "",
+    "y = (x+1)/(x-1)",
+    "r = cos(3θ)",
+    "y = sin(x",
+]
+
+def test_convert_many():
+    """convert_many が1件ずつの変換と同じ結果を返し、対話用の変換キャッシュを使わないか"""
+    print("=== convert_many テスト ===")
+
+    expressions = [e for e in EXPRESSIONS if e] + ["x" * (MAX_EXPRESSION_LENGTH + 1)]
+    before = conversion_cache_stats()
+    results = list(convert_many(expressions + expressions))
+    assert conversion_cache_stats() == before
+
+    assert isinstance(results[len(expressions) - 1], ExpressionTooLongError)
+    for expr, (latex, syntax_error) in zip(expressions[:-1], results):
+        print(f"{expr} -> {latex}")
+        assert latex == convert_expression(expr)
+    assert results[-1] is results[len(expressions) - 1]
+    assert results[:len(expressions)] == results[len(expressions):]
+    print("✓ 成功")
+
+def run_stream(workers):
+    output = io.StringIO()
+    count = convert_stream(io.StringIO("\n".join(EXPRESSIONS) + "\n"), output, workers=workers, chunk_size=2)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert count == len(records) == 4
+    return records
+
+def test_convert_stream():
+    """JSONL出力（行番号・構文エラー情報）のテスト"""
+    print("\n=== ストリーム変換テスト ===")
+
+    records = run_stream(workers=1)
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+
+    assert [r["line"] for r in records] == [1, 3, 4, 5]
+    assert records[1]["latex"] == "y = \\frac{x+1}{x-1}"
+    assert "syntax_error" not in records[0]
+    assert records[3]["syntax_error"]["position"] == 7
+    print("✓ 成功")
+
+def test_convert_stream_with_workers():
+    """複数ワーカーでも入力順の同じ結果になるか"""
+    print("\n=== 並列変換テスト ===")
+
+    assert run_stream(workers=2) == run_stream(workers=1)
+    print("✓ 成功")
+
+def test_parse_once():
+    """1つの式の構文解析は1回だけか（構文エラーの検出のために解析し直さない）"""
+    print("\n=== 構文解析回数テスト ===")
+
+    calls = []
+    original = latex_converter.parse_expression
+
+    def counting_parse(expression):
+        calls.append(expression)
+        return original(expression)
+
+    latex_converter.parse_expression = counting_parse
+    try:
+        records = run_stream(workers=1)
+    finally:
+        latex_converter.parse_expression = original
+    print(f"構文解析: {len(calls)} 回")
+    assert sorted(calls) == sorted(r["input"] for r in records)
+    assert records[3]["syntax_error"]["position"] == 7
+    print("✓ 成功")
+
+if __name__ == "__main__":
+    test_convert_many()
+    test_convert_stream()
+    test_convert_stream_with_workers()
+    test_parse_once()
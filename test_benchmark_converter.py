@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク（正しさ確認部分）のテスト
+"""
+
+from latex_converter import LaTeXConverter
+from benchmark_converter import load_baseline, check_correctness, find_regressions
+
+def test_outputs_match_baseline():
+    """既存テストケースの変換結果がベースラインと一致するか"""
+    print("=== ベースライン一致テスト ===")
+
+    baseline = load_baseline()
+    assert baseline is not None, "benchmark_baseline.json がありません"
+
+    mismatches = check_correctness(LaTeXConverter(), baseline)
+    for expr, expected, result in mismatches:
+        print(f"✗ {expr}: 期待 {expected} / 結果 {result}")
+
+    assert not mismatches
+    print(f"✓ {len(baseline['outputs'])} 件すべて一致")
+
+def test_regression_detection():
+    """性能劣化の判定ロジックのテスト"""
+    print("\n=== 性能劣化判定テスト ===")
+
+    baseline = {'timings_us': {'short': 10.0, 'long': 100.0}}
+
+    assert find_regressions({'short': 12.0, 'long': 140.0}, baseline) == []
+    assert find_regressions({'short': 16.0, 'long': 90.0}, baseline) == [('short', 10.0, 16.0)]
+    assert find_regressions({'short': 16.0}, None) == []
+    print("✓ 判定ロジック正常")
+
+if __name__ == "__main__":
+    test_outputs_match_baseline()
+    test_regression_detection()
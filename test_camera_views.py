@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+3Dの視点（camera_views）のテスト
+"""
+
+import io
+
+from PIL import Image
+
+from camera_views import VIEW_PRESETS, parse_views, view_rotation, compose_views
+from render_request import RenderRequest
+
+def make_png(width, height, color):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, format='PNG')
+    return output.getvalue()
+
+def test_view_rotation():
+    """各視点の回転行列が正規直交で、代表的な向きになっているか"""
+    print("=== 回転行列テスト ===")
+    for name in VIEW_PRESETS:
+        m = view_rotation(name)
+        rows = [m[0:3], m[3:6], m[6:9]]
+        for i in range(3):
+            for j in range(3):
+                dot = sum(rows[i][k] * rows[j][k] for k in range(3))
+                assert abs(dot - (1 if i == j else 0)) < 1e-9, name
+        print(f"{name}: {[round(v, 3) for v in m]}")
+
+    # 真上から見る視点は回転なし、正面からの視点は z軸が画面の上向き
+    assert view_rotation('top') == [1, 0, 0, 0, 1, 0, 0, 0, 1]
+    assert view_rotation('front')[3:6] == [0, 0, 1]
+    print("✓ 回転行列正常")
+
+def test_parse_views():
+    """視点名の解析と不正な指定の検出"""
+    print("\n=== 視点名テスト ===")
+    assert parse_views(None) == ()
+    assert parse_views("Front, top") == ('front', 'top')
+    for text in ["front,back", "front,side,top,isometric,front"]:
+        try:
+            parse_views(text)
+        except ValueError as e:
+            print(f"{text}: {e}")
+        else:
+            raise AssertionError(f"{text} がエラーになりませんでした")
+    print("✓ 視点名正常")
+
+def test_compose_and_cache_key():
+    """4視点が2x2の1枚にまとまり、視点ごとに別のキャッシュキーになるか"""
+    print("\n=== 合成・キャッシュキーテスト ===")
+    captures = [(name, make_png(1920, 1080, (i * 60, 0, 0))) for i, name in enumerate(VIEW_PRESETS)]
+    with Image.open(io.BytesIO(compose_views(captures))) as image:
+        print(f"合成画像: {image.size}")
+        assert image.width < image.height * 3  # 横1列ではなく2x2
+
+    single = RenderRequest.from_input("z = x^2 + y^2", "3d")
+    multi = RenderRequest.from_input("z = x^2 + y^2", "3d", views=('front', 'top'))
+    assert single.views == ()
+    assert single.cache_key() != multi.cache_key()
+    assert multi.replace(label_size=6).views == ('front', 'top')
+    print("✓ 合成・キャッシュキー正常")
+
+if __name__ == "__main__":
+    test_view_rotation()
+    test_parse_views()
+    test_compose_and_cache_key()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+一覧画像（コンタクトシート）作成のテスト
+"""
+
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from contact_sheet import ContactSheetBuilder
+
+def make_png(width, height, color):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(output, format='PNG')
+    return output.getvalue()
+
+def test_grid_layout():
+    """上限枚数ごとに一覧画像が分かれ、グリッド状に並ぶか"""
+    print("=== グリッド配置テスト ===")
+    builder = ContactSheetBuilder(columns=3, per_sheet=6, tile_width=200)
+    graph = make_png(1920, 1080, (0, 128, 255))
+
+    for index in range(8):
+        builder.add(index, graph, f"y = x^{index}")
+
+    sheets = [Image.open(io.BytesIO(sheet)) for sheet in builder.render()]
+    print(f"一覧画像: {[sheet.size for sheet in sheets]}")
+
+    assert len(sheets) == 2
+    # 1枚目は 3列 x 2行、2枚目は残り2枚を 2列 x 1行
+    assert sheets[0].width > sheets[1].width
+    assert sheets[0].height > sheets[1].height
+    # 左上のグラフ部分に元画像の色が入っている
+    assert sheets[0].getpixel((20, 20)) == (0, 128, 255)
+    print("✓ グリッド配置正常")
+
+def test_parallel_add_keeps_order():
+    """別スレッドから順不同に追加しても入力順に並ぶか（失敗したグラフも欄を残す）"""
+    print("\n=== 並行追加テスト ===")
+    builder = ContactSheetBuilder(columns=4, per_sheet=4, tile_width=100)
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for index in reversed(range(4)):
+            image = None if index == 2 else make_png(400, 200, colors[index])
+            pool.submit(builder.add, index, image, f"expr {index} θ")
+
+    assert len(builder) == 4
+    sheet = Image.open(io.BytesIO(builder.render()[0]))
+    # 1番目（赤）が左端、2番目（緑）がその右
+    assert sheet.getpixel((20, 20)) == (255, 0, 0)
+    assert sheet.getpixel((20 + 108, 20)) == (0, 255, 0)
+    print("✓ 入力順に配置")
+
+def test_add_all_overlaps_capture():
+    """縮小が次の画像を待つ間に始まり、途中で失敗した場合は縮小を待ってから例外を伝えるか"""
+    print("\n=== 撮影と縮小の重なりテスト ===")
+    builder = ContactSheetBuilder(columns=4, per_sheet=4, tile_width=100)
+    started = threading.Event()
+    original_add = builder.add
+
+    def add(index, image, label):
+        started.set()
+        original_add(index, image, label)
+
+    builder.add = add
+
+    async def images(fail=False):
+        yield 0, make_png(400, 200, (255, 0, 0))
+        # 次の「撮影」の間に、最初の画像の縮小が始まっているはず
+        deadline = time.perf_counter() + 5
+        while not started.is_set() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        assert started.is_set(), "撮影中に縮小が始まっていません"
+        if fail:
+            raise RuntimeError("描画に失敗しました")
+        yield 1, None
+
+    failed = asyncio.run(builder.add_all(images(), ["a", "b"]))
+    assert failed == 1 and len(builder) == 2
+    print("✓ 撮影中に縮小を開始")
+
+    started.clear()
+    try:
+        asyncio.run(builder.add_all(images(fail=True), ["a", "b"]))
+    except RuntimeError as e:
+        print(f"✓ 失敗を伝える: {e}")
+    else:
+        raise AssertionError("描画の失敗が伝わりませんでした")
+
+if __name__ == "__main__":
+    test_grid_layout()
+    test_parallel_add_keeps_order()
+    test_add_all_overlaps_capture()
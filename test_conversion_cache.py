@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+LaTeX変換キャッシュとRenderRequestのテスト
+"""
+
+from latex_converter import convert_expression, conversion_cache_stats, clear_conversion_cache
+from render_request import RenderRequest, split_expressions
+
+def test_conversion_cache_hits():
+    """同じ式の2回目以降の変換がキャッシュから返されるか"""
+    print("=== 変換キャッシュテスト ===")
+
+    clear_conversion_cache()
+    first = convert_expression("y = sin(x)/2")
+    second = convert_expression("y = sin(x)/2")
+    convert_expression("y = cos(x)")
+
+    stats = conversion_cache_stats()
+    print(f"統計: {stats}")
+
+    assert first == second
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+    assert abs(stats["hit_rate"] - 1 / 3) < 1e-9
+    print("✓ 成功")
+
+def test_render_request_converts_once():
+    """RenderRequestの変更で再変換が行われないか"""
+    print("\n=== RenderRequestテスト ===")
+
+    clear_conversion_cache()
+    request = RenderRequest.from_input("y = sqrt(x)", "2D", label_size=4)
+    updated = request.replace(label_size=8, zoom_level=1)
+
+    stats = conversion_cache_stats()
+    print(f"リクエスト: {updated!r} / LaTeX: {updated.latex}")
+
+    assert request.mode == "2d"
+    assert request.converted
+    assert updated.latex == request.latex == "y = \\sqrt{x}"
+    assert (updated.label_size, updated.zoom_level) == (8, 1)
+    assert stats["hits"] + stats["misses"] == 1
+    print("✓ 成功")
+
+def test_render_request_multiple_expressions():
+    """; や改行で区切った複数の式がそれぞれ変換されるか"""
+    print("\n=== 複数式テスト ===")
+
+    request = RenderRequest.from_input("y = sin(x); y = cos(x)\n y = x/2 ")
+    print(f"式: {request.latex_expressions}")
+
+    assert request.latex_expressions == ("y = \\sin\\left(x\\right)", "y = \\cos\\left(x\\right)", "y = \\frac{x}{2}")
+    assert request.expression_count == 3
+    assert request.latex == "; ".join(request.latex_expressions)
+    assert request.replace(label_size=8).latex_expressions == request.latex_expressions
+
+    # 単一の式は従来通り
+    single = RenderRequest.from_input("y = x")
+    assert single.latex_expressions == ("y = x",) and not single.converted
+
+    # 区切りの前後の空白はキャッシュキーに影響しない
+    assert RenderRequest.from_input("y=sin(x);y=cos(x)").cache_key() == \
+        RenderRequest.from_input("y = sin(x); y = cos(x)").cache_key()
+    assert split_expressions(" ; a ;; b \n") == ["a", "b"]
+
+    # LaTeXの空白 \; では分割しない
+    assert split_expressions(r"y = a\;b; y = \sin\;x") == [r"y = a\;b", r"y = \sin\;x"]
+    assert RenderRequest.from_input(r"y=x\;x").latex_expressions == (r"y=x\;x",)
+    print("✓ 成功")
+
+if __name__ == "__main__":
+    test_conversion_cache_hits()
+    test_render_request_converts_once()
+    test_render_request_multiple_expressions()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Desmosが誤りとした式で描画をすぐに中止するかのテスト
+ブラウザの代わりに、式の解析結果を返すだけの FakePage を使う
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from graph_renderer import GraTeXBot, SET_EXPRESSIONS_JS, EXPRESSION_ERRORS_JS
+from expression_validator import DesmosExpressionError
+from render_request import RenderRequest
+
+# GraTeXBot() がディスクキャッシュを使わないように（conftest.py）
+pytestmark = pytest.mark.usefixtures('no_render_cache')
+
+class FakePage:
+    """設定された式のうち、errors に含まれるもの・定義されていない変数 undefined を使うものをDesmosの誤りとして返すページ"""
+
+    def __init__(self, errors, undefined=None):
+        self.errors = errors
+        self.undefined = undefined
+        self.expressions = None
+        self.definitions = []
+
+    async def evaluate(self, script, args=None):
+        if script == SET_EXPRESSIONS_JS:
+            self.expressions = args[1]
+            self.definitions = args[2]
+        elif script == EXPRESSION_ERRORS_JS:
+            calculator_name, ids, timeout_ms, poll_ms = args
+            defined = any(d['latex'].startswith(f"{self.undefined}=") for d in self.definitions)
+            errors = dict(self.errors)
+            if self.undefined and not defined:
+                errors.update({latex: f"'{self.undefined}' is not defined"
+                               for latex in self.expressions if self.undefined in latex})
+            return {'pending': False, 'errors': [
+                {'id': id, 'message': errors[latex]}
+                for id, latex in zip(ids, self.expressions) if latex in errors
+            ]}
+
+def make_bot(errors, undefined=None):
+    bot = GraTeXBot()
+    bot.page = FakePage(errors, undefined)
+
+    async def prepare_2d_page(label_size):
+        pass
+
+    async def capture_screenshot(label="2D", key=None, calculator_name='calculator2D', size=None, caption=None):
+        raise AssertionError("Desmosのエラーで中止されずに撮影されました")
+
+    bot.prepare_2d_page = prepare_2d_page
+    bot.capture_screenshot = capture_screenshot
+    return bot
+
+def test_abort_on_desmos_error():
+    """描画の待ち時間・撮影の前にDesmosのメッセージで中止し、ページを解放するか"""
+    print("=== Desmosのエラーで中止するテスト ===")
+
+    async def run():
+        bot = make_bot({"y=x^{": "Too many variables"})
+        bot.console_errors.append("前の描画のエラー")
+        started = time.perf_counter()
+        try:
+            await bot.render(RenderRequest.from_input("y=x^{"))
+        except DesmosExpressionError as e:
+            print(f"✓ 中止: {e}")
+            assert e.errors == [(None, "Too many variables")]
+            assert "Too many variables" in str(e)
+            assert e.console_errors == []
+        else:
+            raise AssertionError("Desmosのエラーで中止されませんでした")
+        elapsed = time.perf_counter() - started
+        assert elapsed < 1, f"中止までに {elapsed:.2f} 秒かかりました"
+        assert not bot.render_lock.locked()
+        assert bot.desmos_error_aborts == 1
+        print(f"✓ {elapsed:.3f} 秒で中止し、ページを解放")
+
+    asyncio.run(run())
+
+def test_multiple_expressions():
+    """複数の式では誤りのある式の番号を付けるか"""
+    print("\n=== 複数の式のテスト ===")
+
+    async def run():
+        bot = make_bot({"a": "Undefined"})
+        try:
+            await bot.set_expressions('calculator2D', ["y=x", "a"])
+        except DesmosExpressionError as e:
+            print(f"✓ {e}")
+            assert e.errors == [(2, "Undefined")]
+            assert "2番目の式: Undefined" in str(e)
+        else:
+            raise AssertionError("Desmosのエラーで中止されませんでした")
+
+        # 誤りがなければそのまま続ける
+        await bot.set_expressions('calculator2D', ["y=x", "y=2x"])
+        assert bot.desmos_error_aborts == 1
+        print("✓ 誤りのない式はそのまま")
+
+    asyncio.run(run())
+
+def test_sweep_parameter_defined_with_expressions():
+    """アニメーションのパラメータが式と同時に定義され、未定義の変数として中止されないか"""
+    print("\n=== アニメーションのパラメータテスト ===")
+
+    async def run():
+        bot = make_bot({}, undefined="a")
+
+        async def capture_screenshot(label="2D", key=None, calculator_name='calculator2D', size=None, caption=None):
+            return b'frame'
+
+        bot.capture_screenshot = capture_screenshot
+        request = RenderRequest.from_input("y = a*x")
+        frames = [frame async for frame in bot.render_sweep(request, "a", [2])]
+        assert frames == [b'frame']
+        assert bot.page.definitions == [{'id': 'sweep-parameter', 'latex': 'a=2'}]
+        assert bot.desmos_error_aborts == 0
+
+        # パラメータを使う式でも、定義しなければ誤りになる（偽のページの確認）
+        try:
+            await bot.set_expressions('calculator2D', request.latex_expressions)
+        except DesmosExpressionError as e:
+            print(f"✓ 定義しない場合: {e}")
+        else:
+            raise AssertionError("未定義の変数が誤りになりませんでした")
+        print("✓ パラメータは式と同時に定義")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    os.environ['RENDER_CACHE_DIR'] = ''
+    test_abort_on_desmos_error()
+    test_multiple_expressions()
+    test_sweep_parameter_defined_with_expressions()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+計算機のスクリーンショットAPIでの直接撮影と、出力サイズのテスト
+ブラウザの代わりに、撮影の引数を記録する FakePage を使う
+"""
+
+import asyncio
+import base64
+import io
+import os
+
+import pytest
+
+from graph_renderer import GraTeXBot, DIRECT_SCREENSHOT_JS, CAPTURE_FORMAT
+from render_request import RenderRequest, OUTPUT_SIZES, DEFAULT_OUTPUT_SIZE
+
+# GraTeXBot() がディスクキャッシュを使わないように（conftest.py）
+pytestmark = pytest.mark.usefixtures('no_render_cache')
+
+class FakePage:
+    """スクリーンショットAPIの呼び出しを記録し、result を返すページ"""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    async def evaluate(self, script, args=None):
+        assert script == DIRECT_SCREENSHOT_JS
+        self.calls.append(args)
+        return self.result
+
+def test_output_sizes():
+    """出力サイズがキャッシュキー・受け渡しに反映されるか"""
+    print("=== 出力サイズテスト ===")
+    normal = RenderRequest.from_input("y = x")
+    thumbnail = RenderRequest.from_input("y = x", output_size='thumbnail')
+    assert normal.output_size == DEFAULT_OUTPUT_SIZE
+    assert normal.cache_key() != thumbnail.cache_key()
+    assert RenderRequest.from_dict(thumbnail.to_dict()).cache_key() == thumbnail.cache_key()
+    assert normal.replace(label_size=6).output_size == DEFAULT_OUTPUT_SIZE
+    assert "output_size='thumbnail'" in repr(thumbnail)
+
+    # 画素数はサムネイル < 標準 < 印刷用
+    pixels = [width * height * ratio ** 2 for width, height, ratio in
+              (OUTPUT_SIZES[name] for name in ('thumbnail', 'normal', 'print'))]
+    assert pixels == sorted(pixels)
+
+    try:
+        RenderRequest.from_input("y = x", output_size='huge')
+    except ValueError as e:
+        print(f"✓ 不明なサイズを拒否: {e}")
+    else:
+        raise AssertionError("不明なサイズが拒否されませんでした")
+    print("✓ 出力サイズ正常")
+
+def test_direct_capture():
+    """大きさ・ピクセル比・形式を指定してAPIで撮影し、使えない場合はボタンで撮影するか"""
+    print("\n=== 直接撮影テスト ===")
+
+    async def run():
+        bot = GraTeXBot()
+        png = b'\x89PNG\r\n\x1a\nimage'
+        bot.page = FakePage({'payload': base64.b64encode(png).decode()})
+        image = await bot.capture_screenshot("3D", '3d/simple', 'calculator3D', OUTPUT_SIZES['print'])
+        assert image == png
+        assert bot.page.calls == [['calculator3D', 1280, 720, 3, CAPTURE_FORMAT, 20000]]
+        assert bot.render_timing.summary()['3d/simple']['capture']['samples'] == 1
+        print("✓ APIで撮影")
+
+        # タイムアウトはボタンで撮り直さずにエラー
+        bot.page = FakePage({'timedOut': True})
+        try:
+            await bot.capture_screenshot("2D")
+        except Exception as e:
+            print(f"✓ タイムアウト: {e}")
+        else:
+            raise AssertionError("タイムアウトがエラーになりませんでした")
+
+        # APIが使えない計算機ではボタンで撮影
+        fallback = []
+
+        async def capture_with_button(label, key, timeout):
+            fallback.append(label)
+            return b'button'
+
+        bot.capture_with_button = capture_with_button
+        bot.page = FakePage(None)
+        assert await bot.capture_screenshot("2D") == b'button'
+        assert fallback == ["2D"]
+        print("✓ ボタンでの撮影にフォールバック")
+
+    asyncio.run(run())
+
+def test_caption():
+    """直接撮影した画像にラベルサイズの大きさでキャプションを描き、ボタンでの撮影には重ねて描かないか"""
+    print("\n=== キャプションテスト ===")
+    from PIL import Image
+
+    blank = io.BytesIO()
+    Image.new('RGB', (640, 360), (255, 255, 255)).save(blank, format='PNG')
+    payload = base64.b64encode(blank.getvalue()).decode()
+
+    def caption_height(image):
+        """白い背景でない行の数（キャプションの高さ）"""
+        with Image.open(io.BytesIO(image)) as graph:
+            bbox = Image.eval(graph.convert('L'), lambda value: 255 - value).getbbox()
+        return bbox[3] - bbox[1]
+
+    async def run():
+        bot = GraTeXBot()
+        bot.page = FakePage({'payload': payload})
+        request = RenderRequest.from_input("y = sin(x)\ny = cos(x)")
+        assert request.caption == ("y=sin(x); y=cos(x)", 4)
+
+        size = OUTPUT_SIZES['thumbnail']
+        heights = []
+        for label_size in (1, 4, 8):
+            image = await bot.capture_screenshot("2D", size=size, caption=request.replace(label_size=label_size).caption)
+            assert image != blank.getvalue()
+            heights.append(caption_height(image))
+        # ラベルサイズが大きいほどキャプションが大きい（同じ式でも画像が変わる）
+        assert heights == sorted(heights) and len(set(heights)) == 3, heights
+        print(f"✓ キャプションの高さ: {heights}")
+
+        # ボタンでの撮影は GraTeX がキャプションを付けるため、そのまま返す
+        async def capture_with_button(label, key, timeout):
+            return b'button'
+
+        bot.capture_with_button = capture_with_button
+        bot.page = FakePage(None)
+        assert await bot.capture_screenshot("2D", size=size, caption=request.caption) == b'button'
+        print("✓ ボタンでの撮影にはキャプションを重ねない")
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    os.environ['RENDER_CACHE_DIR'] = ''
+    test_output_sizes()
+    test_direct_capture()
+    test_caption()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+数式パーサー（構文解析・LaTeX出力）のテスト
+"""
+
+import time
+
+from expression_parser import parse_expression, expression_to_latex, ExpressionSyntaxError, Call, split_word, FUNCTION_LATEX
+from latex_converter import convert_expression, normalize_expression
+
+def test_nested_expressions():
+    """ネストした式の変換テスト"""
+    test_cases = [
+        ("sin(sqrt(x+1))", "\\sin\\left(\\sqrt{x+1}\\right)"),
+        ("(a+(b))/(c)", "\\frac{a+(b)}{c}"),
+        ("y = 1/(x+1)", "y = \\frac{1}{x+1}"),
+        ("y = sqrt(sin(x)^2 + 1)", "y = \\sqrt{\\sin\\left(x\\right)^2 + 1}"),
+        ("y = exp(-(x^2)/2)", "y = e^{\\frac{-(x^2)}{2}}"),
+        ("y = |x - |x||", "y = \\left|x - \\left|x\\right|\\right|"),
+        ("y = x^10", "y = x^{10}"),
+        ("y = 2^(x+1)", "y = 2^{x+1}"),
+        ("y = sin^2(x)", "y = \\sin^{2}\\left(x\\right)"),
+        ("r = 1 + cos(theta)", "r = 1 + \\cos\\left(\\theta\\right)"),
+        ("y = πx", "y = \\pi x"),
+        ("x>y", "x\\gt y"),
+        ("y = 1/2x", "y = \\frac{1}{2x}"),
+    ]
+
+    print("=== ネストした式の変換テスト ===")
+
+    for input_expr, expected in test_cases:
+        result = expression_to_latex(input_expr)
+        print(f"{input_expr} -> {result}")
+        assert result == expected, f"期待: {expected}"
+
+    print("✓ すべて成功")
+
+def test_syntax_errors():
+    """構文エラーの位置検出テスト"""
+    test_cases = [
+        ("", 0),
+        ("y =", 3),
+        ("= x", 0),
+        ("sin(x", 3),
+        ("y = x)", 5),
+        ("y = x $ 2", 6),
+        ("y = |x", 4),
+    ]
+
+    print("\n=== 構文エラーテスト ===")
+
+    for input_expr, position in test_cases:
+        try:
+            parse_expression(input_expr)
+        except ExpressionSyntaxError as e:
+            print(f"{input_expr!r}: {e}")
+            assert e.position == position, f"位置が違います: {e.position}"
+        else:
+            raise AssertionError(f"構文エラーになりませんでした: {input_expr!r}")
+
+    print("✓ すべて検出")
+
+def test_converter_fallback():
+    """構文解析できない式は従来ルールで変換されるか"""
+    print("\n=== フォールバックテスト ===")
+
+    result = convert_expression("y = sin(x) + x'")
+    print(f"y = sin(x) + x' -> {result}")
+    assert result == "y = \\sin\\left(x\\right) + x'"
+
+    print("✓ 成功")
+
+def test_tree_reuse():
+    """構文木の再利用（走査・正規化）のテスト"""
+    print("\n=== 構文木の再利用テスト ===")
+
+    tree = parse_expression("y = sin(cos(x))")
+    names = [node.name for node in tree.walk() if isinstance(node, Call)]
+    assert names == ['sin', 'cos']
+
+    assert normalize_expression("y = sin( x )") == normalize_expression("y=sin(x)")
+    assert normalize_expression(" y=x ") == "y=x"
+    print(f"正規形: {normalize_expression('y = sin( x )')}")
+
+    print("✓ 成功")
+
+def test_split_word():
+    """単語を名前と1文字の変数に分け、長い単語でも線形時間で終わるか"""
+    print("\n=== 単語の分割テスト ===")
+
+    assert split_word("xsinx", FUNCTION_LATEX) == [(0, 'x'), (1, 'sin'), (4, 'x')]
+    assert split_word("xy") == [(0, 'x'), (1, 'y')]
+
+    word = "x" * 1000
+    started = time.perf_counter()
+    assert len(split_word(word)) == len(split_word(word, FUNCTION_LATEX)) == 1000
+    elapsed = time.perf_counter() - started
+    print(f"1000文字: {elapsed * 1000:.2f} ms")
+    assert elapsed < 0.02
+
+    print("✓ 成功")
+
+if __name__ == "__main__":
+    test_nested_expressions()
+    test_syntax_errors()
+    test_converter_fallback()
+    test_tree_reuse()
+    test_split_word()
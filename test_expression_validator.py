@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+数式の事前チェック（expression_validator）のテスト
+"""
+
+from expression_validator import ExpressionValidationError, validate_expression, validate_expressions
+
+def expect_error(text):
+    try:
+        validate_expression(text)
+    except ExpressionValidationError as e:
+        return e
+    raise AssertionError(f"{text!r} が誤りとして検出されませんでした")
+
+def test_detects_errors():
+    """括弧の対応・未知の関数や単語・空の辺を、位置付きで検出するか"""
+    print("=== 誤り検出テスト ===")
+    cases = [
+        # (式, 位置, 長さ)
+        ("invalid_expression", 0, 7),
+        ("y = foo(x)", 4, 3),
+        ("y = xsinfoo(x)", 8, 3),
+        ("y = hello", 4, 5),
+        # LaTeXを含む式でも同じように検出する
+        (r"y = \frac{foo(x)}{2}", 10, 3),
+        ("y = sin(x", 7, 1),
+        ("y = (x]", 6, 1),
+        ("y = x)", 5, 1),
+        ("y =", 2, 1),
+        ("= x", 0, 1),
+        ("y <= <= x", 5, 2),
+        (r"y = \frac{x}{2", 12, 1),
+    ]
+    for text, position, length in cases:
+        error = expect_error(text)
+        print(f"{text!r}: {error.message}")
+        assert (error.position, error.length) == (position, length), (text, error.position, error.length)
+
+    pointer = expect_error("y = foo(x)").pointer()
+    print(pointer)
+    assert pointer == "y = foo(x)\n    ^^^"
+    # 全角文字の後ろでも ^ の位置がずれない
+    assert expect_error("ｙ = (x").pointer().splitlines()[1] == " " * 5 + "^"
+    print("✓ 誤り検出正常")
+
+def test_accepts_valid_expressions():
+    """描画できる式（簡単記法・LaTeX・Desmosの関数・添字）を誤りにしないか"""
+    print("\n=== 正常な式テスト ===")
+    for text in [
+        "y = sin(x)", "x^2 + y^2 = 1", "y = sin^2(x) + cos x", "y = ab(x)", "y = 2xy",
+        "r = theta", "y = max(x, 2)", "y = |x|", "x_{max} = 3", "y = a_left x",
+        "f(x) = x^2", "y < 2x <= 3", r"y = \frac{x}{2}", r"\left\{x>0\right\}", r"y \le x",
+        r"z = \sqrt{x^2 + y^2}", "y = floor(x) + ceil(x)",
+        # 関数名に続けて書いた変数・変数と関数の積・with
+        "y=sinx", "y=tanx", "y=xsinx", "r=2costheta", "y=xsin(x)", "y=2xcos(x)", "y=x^2 with x=1",
+        # Desmosの組み込み関数
+        "y = random(x)", "polygon((0,0),(1,1))", "y = piecewise(x)", "L = sort(unique([3,1,2]))",
+        "y = arg(x) + real(x) + imag(x)", "d = distance((0,0),(1,1))", "M = midpoint((0,0),(2,2))",
+        r"y = \begin{cases} x & x>0 \end{cases}", r"y = \operatorname{round}(x)",
+    ]:
+        validate_expression(text)
+    print("✓ 正常な式を通過")
+
+def test_multiple_expressions():
+    """複数の式では誤りのある式の番号が分かるか"""
+    print("\n=== 複数の式テスト ===")
+    try:
+        validate_expressions(["y = x", "y = (x", "y = 2x"])
+    except ExpressionValidationError as e:
+        print(f"{e.index}番目: {e.message}")
+        assert e.index == 2
+    else:
+        raise AssertionError("誤りが検出されませんでした")
+
+    try:
+        validate_expressions(["y = (x"])
+    except ExpressionValidationError as e:
+        assert e.index is None
+    print("✓ 式の番号正常")
+
+if __name__ == "__main__":
+    test_detects_errors()
+    test_accepts_valid_expressions()
+    test_multiple_expressions()
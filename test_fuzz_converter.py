@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+ファズテストと入力長上限のテスト
+"""
+
+import logging
+
+from latex_converter import LaTeXConverter, MAX_EXPRESSION_LENGTH, ExpressionTooLongError
+from fuzz_converter import adversarial_inputs, run_fuzz
+
+# CI環境のばらつきを考慮した上限（通常は数ミリ秒で終わる）
+FUZZ_CEILING_MS = 200.0
+
+def test_adversarial_inputs_within_ceiling():
+    """敵対的な入力でも変換時間が上限を超えないか"""
+    print("=== ファズテスト ===")
+    logging.getLogger('latex_converter').setLevel(logging.ERROR)
+
+    count, worst_ms, worst_input, slow = run_fuzz(
+        LaTeXConverter(), adversarial_inputs(seed=0, iterations=200), FUZZ_CEILING_MS)
+
+    print(f"{count} 件 / 最大 {worst_ms:.2f} ms: {worst_input[:30]!r}")
+    assert count > 200
+    assert not slow, f"上限超過: {[(expr[:30], ms) for expr, ms in slow]}"
+    print("✓ すべて上限時間内")
+
+def test_fallback_rules_unchanged():
+    """線形化したフォールバックのルール変換が従来と同じ結果になるか"""
+    print("\n=== フォールバック変換テスト ===")
+    converter = LaTeXConverter()
+
+    cases = [
+        ("y = a/b'", "y = \\frac{a}{b'}"),
+        ("y' = x/2 > 1", "y' = \\frac{x}{2} \\gt 1"),
+        ("x/2 > y'", "\\frac{x}{2} \\gt y'"),
+        ("(a)/(b) + c'", "\\frac{a}{b} + c'"),
+        ("a = b/c = d'", "a = \\frac{b}{c} = d'"),
+    ]
+    for expr, expected in cases:
+        result = converter.rule_based_conversion(expr)
+        print(f"{expr} -> {result}")
+        assert result == expected
+
+def test_expression_length_limit():
+    """上限を超える式は変換せずにエラーになるか"""
+    print("\n=== 入力長上限テスト ===")
+    converter = LaTeXConverter()
+
+    # 上限ちょうどは変換できる
+    converter.convert_to_latex('x' * MAX_EXPRESSION_LENGTH)
+
+    try:
+        converter.convert_to_latex('x' * (MAX_EXPRESSION_LENGTH + 1))
+    except ExpressionTooLongError as e:
+        print(f"✓ {e}")
+        assert e.length == MAX_EXPRESSION_LENGTH + 1
+        assert e.limit == MAX_EXPRESSION_LENGTH
+    else:
+        assert False, "ExpressionTooLongError が発生しませんでした"
+
+if __name__ == "__main__":
+    test_adversarial_inputs_within_ceiling()
+    test_fallback_rules_unchanged()
+    test_expression_length_limit()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+グラフ操作部品（ボタン・セレクトメニュー）のテスト
+"""
+
+import asyncio
+
+from graph_controls import GraphControlsView
+
+class FakeResponse:
+    def __init__(self):
+        self.deferred = False
+        self.messages = []
+
+    async def defer(self):
+        self.deferred = True
+
+    async def send_message(self, content, ephemeral=False):
+        self.messages.append(content)
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeInteraction:
+    def __init__(self, user_id, message="message"):
+        self.user = FakeUser(user_id)
+        self.message = message
+        self.response = FakeResponse()
+
+def test_components_by_mode():
+    """モードごとに必要な部品だけが付くか"""
+    print("=== 部品構成テスト ===")
+
+    async def run():
+        async def on_action(message, action, value):
+            return True
+
+        view_2d = GraphControlsView(1, "2d", on_action, label_size=6)
+        view_3d = GraphControlsView(1, "3d", on_action)
+
+        labels_2d = [getattr(item, 'label', None) for item in view_2d.children]
+        labels_3d = [getattr(item, 'label', None) for item in view_3d.children]
+        print(f"2D: {labels_2d}")
+        print(f"3D: {labels_3d}")
+
+        assert labels_2d == [None, "拡大", "縮小", "完了", "削除"]
+        assert labels_3d == [None, "再生成", "完了", "削除"]
+        assert [option.value for option in view_2d.label_size_select.options if option.default] == ["6"]
+
+    asyncio.run(run())
+    print("✓ 部品構成正常")
+
+def test_dispatch_and_owner_check():
+    """操作が on_action に渡り、他のユーザーの操作は拒否されるか"""
+    print("\n=== 操作受け付けテスト ===")
+
+    async def run():
+        calls = []
+
+        async def on_action(message, action, value):
+            calls.append((message, action, value))
+            return action != 'done'
+
+        view = GraphControlsView(1, "2d", on_action)
+
+        other = FakeInteraction(2)
+        assert not await view.interaction_check(other)
+        assert other.response.messages
+
+        owner = FakeInteraction(1)
+        assert await view.interaction_check(owner)
+
+        await view.dispatch(owner, 'zoom', 'in')
+        assert owner.response.deferred
+        assert calls == [("message", 'zoom', 'in')]
+        assert not view.is_finished()
+
+        await view.dispatch(FakeInteraction(1), 'done')
+        assert view.is_finished()
+
+    asyncio.run(run())
+    print("✓ 操作受け付け正常")
+
+if __name__ == "__main__":
+    test_components_by_mode()
+    test_dispatch_and_owner_check()
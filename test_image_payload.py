@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+画像受け渡し（image_payload）のテスト
+"""
+
+import base64
+import hashlib
+import os
+
+from image_payload import decode_capture_payload, image_buffer, image_digest
+from benchmark_image_handoff import make_payload, measure_peak, legacy_handoff, current_handoff
+
+def test_decode_and_digest():
+    """base64を元のPNGデータに戻し、ハッシュが正しく計算されるか"""
+    print("=== デコード・ハッシュテスト ===")
+    data = b'\x89PNG\r\n\x1a\n' + os.urandom(1000)
+
+    decoded = decode_capture_payload(base64.b64encode(data).decode('ascii'))
+    assert decoded == data
+
+    buffer = image_buffer(decoded)
+    assert image_digest(buffer) == hashlib.sha256(data).hexdigest()
+    assert buffer.read() == data
+
+    # アップロード済みの画像はURLをそのまま使う
+    assert image_digest("https://cdn.discordapp.com/a.png") == "https://cdn.discordapp.com/a.png"
+    print("✓ デコード・ハッシュ正常")
+
+def test_handoff_peak_memory():
+    """受け渡し1回のピークメモリが画像サイズ程度に収まるか"""
+    print("\n=== ピークメモリテスト ===")
+    size = 1024 * 1024
+    payload = make_payload(size)
+
+    legacy = measure_peak(legacy_handoff, payload)
+    current = measure_peak(current_handoff, payload)
+    print(f"従来: {legacy / size:.2f} 倍 / 現在: {current / size:.2f} 倍")
+
+    assert current < legacy
+    assert current <= size * 1.5
+    print("✓ ピークメモリ正常")
+
+if __name__ == "__main__":
+    test_decode_and_digest()
+    test_handoff_peak_memory()
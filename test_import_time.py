@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+起動時間（インポート時間）のテスト
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# main のインポート時間の上限（秒）。環境変数 IMPORT_TIME_BUDGET で変更可能
+IMPORT_TIME_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', '2.0'))
+
+# 起動時に読み込まれてはいけない重いモジュール
+DEFERRED_MODULES = ['sympy', 'PIL', 'playwright']
+
+def measure_main_import():
+    """別プロセスで main をインポートし、所要時間と読み込まれたモジュールを取得"""
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"loaded = [m for m in {DEFERRED_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'loaded': loaded}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_main_import_time():
+    """main のインポート時間が上限内で、重いモジュールが遅延されているか"""
+    print("=== 起動時間テスト ===")
+
+    # 1回目はバイトコードのコンパイルを含むため、2回目を計測する
+    measure_main_import()
+    measured = measure_main_import()
+
+    print(f"main のインポート: {measured['elapsed'] * 1000:.1f} ms（上限 {IMPORT_TIME_BUDGET * 1000:.0f} ms）")
+    print(f"起動時に読み込まれた重いモジュール: {measured['loaded'] or 'なし'}")
+
+    assert not measured['loaded'], f"遅延読み込みされていません: {measured['loaded']}"
+    assert measured['elapsed'] < IMPORT_TIME_BUDGET
+
+    print("✓ 成功")
+
+if __name__ == "__main__":
+    test_main_import_time()
@@ -6,30 +6,33 @@
 import json
 from latex_converter import convert_expression
 
+# 不等式テストケース（入力, 期待値）（ベンチマークからも再利用する）
+INEQUALITY_TEST_CASES = [
+    # 基本的な不等式
+    ("x > 5", "x \\gt 5"),
+    ("x < 3", "x \\lt 3"),
+    ("x >= 2", "x \\ge 2"),
+    ("x <= 10", "x \\le 10"),
+    
+    # 複合的な不等式
+    ("y <= sin(x)", "y \\le \\sin\\left(x\\right)"),
+    ("x^2 >= 4", "x^2 \\ge 4"),
+    ("sqrt(x) > 0", "\\sqrt{x} \\gt 0"),
+    ("log(x) < 1", "\\log\\left(x\\right) \\lt 1"),
+    
+    # 連続不等式
+    ("0 <= x <= 1", "0 \\le x \\le 1"),
+    ("1 < y < 5", "1 \\lt y \\lt 5"),
+    
+    # 分数を含む不等式
+    ("x/2 > 3", "\\frac{x}{2} \\gt 3"),
+    ("1/x <= 5", "\\frac{1}{x} \\le 5"),
+]
+
 def test_inequality_conversion():
     """不等式変換のテスト"""
     
-    test_cases = [
-        # 基本的な不等式
-        ("x > 5", "x \\gt 5"),
-        ("x < 3", "x \\lt 3"),
-        ("x >= 2", "x \\ge 2"),
-        ("x <= 10", "x \\le 10"),
-        
-        # 複合的な不等式
-        ("y <= sin(x)", "y \\le \\sin\\left(x\\right)"),
-        ("x^2 >= 4", "x^2 \\ge 4"),
-        ("sqrt(x) > 0", "\\sqrt{x} \\gt 0"),
-        ("log(x) < 1", "\\log\\left(x\\right) \\lt 1"),
-        
-        # 連続不等式
-        ("0 <= x <= 1", "0 \\le x \\le 1"),
-        ("1 < y < 5", "1 \\lt y \\lt 5"),
-        
-        # 分数を含む不等式
-        ("x/2 > 3", "\\frac{x}{2} \\gt 3"),
-        ("1/x <= 5", "\\frac{1}{x} \\le 5"),
-    ]
+    test_cases = INEQUALITY_TEST_CASES
     
     print("=== 不等式変換テスト ===")
     
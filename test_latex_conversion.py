@@ -14,53 +14,56 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 変換テストケース（ベンチマークからも再利用する）
+TEST_CASES = [
+    # 基本的な関数
+    "y = sin(x)",
+    "y = cos(x) + sin(x)",
+    "y = tan(x)",
+    "y = ln(x)",
+    "y = log(x)",
+    "y = sqrt(x)",
+    "y = exp(x)",
+    
+    # 累乗と複雑な式
+    "y = x^2",
+    "y = x^2 + y^2",
+    "y = sin(x)^2 + cos(x)^2",
+    "y = e^x",
+    "y = 2^x",
+    
+    # 分数
+    "y = 1/x",
+    "y = sin(x)/cos(x)",
+    "y = (x+1)/(x-1)",
+    
+    # 3D式
+    "z = x^2 + y^2",
+    "z = sin(x) * cos(y)",
+    "x^2 + y^2 + z^2 = 25",
+    "z = sqrt(x^2 + y^2)",
+    
+    # 円と楕円
+    "x^2 + y^2 = 1",
+    "x^2/4 + y^2/9 = 1",
+    
+    # 極座標
+    "r = sin(3*theta)",
+    "r = cos(theta)",
+    
+    # ギリシャ文字
+    "y = sin(θ)",
+    "r = cos(3θ)",
+    
+    # 複雑な式
+    "y = sin(x)^2 + cos(x)^2",
+    "z = (x^2 - y^2)/(x^2 + y^2 + 1)",
+    "y = (x^2 - 1)/(x + 1)",
+]
+
 def test_conversions():
     """変換テスト"""
-    test_cases = [
-        # 基本的な関数
-        "y = sin(x)",
-        "y = cos(x) + sin(x)",
-        "y = tan(x)",
-        "y = ln(x)",
-        "y = log(x)",
-        "y = sqrt(x)",
-        "y = exp(x)",
-        
-        # 累乗と複雑な式
-        "y = x^2",
-        "y = x^2 + y^2",
-        "y = sin(x)^2 + cos(x)^2",
-        "y = e^x",
-        "y = 2^x",
-        
-        # 分数
-        "y = 1/x",
-        "y = sin(x)/cos(x)",
-        "y = (x+1)/(x-1)",
-        
-        # 3D式
-        "z = x^2 + y^2",
-        "z = sin(x) * cos(y)",
-        "x^2 + y^2 + z^2 = 25",
-        "z = sqrt(x^2 + y^2)",
-        
-        # 円と楕円
-        "x^2 + y^2 = 1",
-        "x^2/4 + y^2/9 = 1",
-        
-        # 極座標
-        "r = sin(3*theta)",
-        "r = cos(theta)",
-        
-        # ギリシャ文字
-        "y = sin(θ)",
-        "r = cos(3θ)",
-        
-        # 複雑な式
-        "y = sin(x)^2 + cos(x)^2",
-        "z = (x^2 - y^2)/(x^2 + y^2 + 1)",
-        "y = (x^2 - 1)/(x + 1)",
-    ]
+    test_cases = TEST_CASES
     
     print("=" * 80)
     print("LaTeX変換テスト")
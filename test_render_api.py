@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+HTTPサーバー（server.py）のテスト
+ブラウザを使わない描画を登録し、描画APIとヘルスチェックを確認する
+"""
+
+import asyncio
+import io
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+from expression_validator import DesmosExpressionError
+
+class FakeRenderer:
+    """式とラベルサイズをそのまま画像データとして返す描画（呼び出し回数を記録）"""
+
+    def __init__(self, delay=0):
+        self.calls = 0
+        self.delay = delay
+
+    async def render(self, request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if request.expression == "y = x; y = a_{1}(x)":
+            raise DesmosExpressionError([(2, "Function 'a_1' is not defined")])
+        return io.BytesIO(f"png:{request.latex}:{request.label_size}".encode())
+
+async def with_client(renderer, check):
+    """テスト用サーバーを起動して check(client) を実行"""
+    server.register_renderer(renderer.render if renderer else None)
+    client = TestClient(TestServer(server.create_app()))
+    await client.start_server()
+    try:
+        await check(client)
+    finally:
+        await client.close()
+        server.register_renderer(None)
+
+def test_render_api():
+    """PNGとETagを返し、同じパラメータの If-None-Match には描画せず304を返すか"""
+    print("=== 描画APIテスト ===")
+    renderer = FakeRenderer()
+
+    async def check(client):
+        response = await client.post('/render', json={"latex": "y = x/2", "label_size": 6})
+        etag = response.headers['ETag']
+        print(f"POST: {response.status} {response.content_type} ETag={etag}")
+        assert response.status == 200
+        assert response.content_type == 'image/png'
+        assert await response.read() == b"png:y = \\frac{x}{2}:6"
+
+        # 同じ描画パラメータ（空白の違いは正規化）なら同じETagで、描画せずに304
+        response = await client.post('/render', json={"latex": "y=x/2", "label_size": 6},
+                                     headers={'If-None-Match': etag})
+        assert response.status == 304 and response.headers['ETag'] == etag
+        assert renderer.calls == 1
+
+        # ラベルサイズが違えば別のETag
+        response = await client.get('/render', params={"latex": "y=x/2", "label_size": "4"})
+        assert response.status == 200 and response.headers['ETag'] != etag
+        # 出力サイズが違えば別のETag
+        response = await client.post('/render', json={"latex": "y=x/2", "label_size": 6, "size": "print"})
+        assert response.status == 200 and response.headers['ETag'] != etag
+        print("✓ ETag・304正常")
+
+        for body, expected in [
+            ({"latex": ""}, 400),
+            ({"latex": "y = x", "mode": "4d"}, 400),
+            ({"latex": "y = x", "label_size": 5}, 400),
+            ({"latex": "y = x", "zoom_level": 9}, 400),
+            ({"latex": "y = x", "size": "huge"}, 400),
+            ({"latex": "x" * 2000}, 413),
+            ({"latex": "y = sin(x"}, 400),
+        ]:
+            response = await client.post('/render', json=body)
+            error = (await response.json())['error']
+            print(f"{str(body)[:40]}: {response.status} {error[:40]}")
+            assert response.status == expected
+
+        # 事前チェックの誤りは位置付きで返し、描画しない
+        calls = renderer.calls
+        response = await client.post('/render', json={"latex": "y = x; y = foo(x)"})
+        body = await response.json()
+        assert response.status == 400
+        assert (body['expression_index'], body['position'], body['length']) == (2, 4, 3)
+        assert body['pointer'] == "y = foo(x)\n    ^^^"
+        assert renderer.calls == calls
+
+        # 事前チェックを通ってもDesmosが解釈できない式は 422
+        response = await client.post('/render', json={"latex": "y = x; y = a_{1}(x)"})
+        body = await response.json()
+        assert response.status == 422
+        assert body['expressions'] == [{"expression_index": 2, "message": "Function 'a_1' is not defined"}]
+        print("✓ 入力チェック正常")
+
+    asyncio.run(with_client(renderer, check))
+
+    async def check_not_ready(client):
+        response = await client.post('/render', json={"latex": "y = x"})
+        assert response.status == 503
+
+    asyncio.run(with_client(None, check_not_ready))
+
+def test_health_during_render():
+    """描画を待っている間もヘルスチェックにすぐ応答し、Botの状態を返すか"""
+    print("\n=== 並行応答テスト ===")
+    renderer = FakeRenderer(delay=0.5)
+    server.add_health_source("pending_renders", lambda: renderer.calls)
+
+    async def check(client):
+        loop = asyncio.get_running_loop()
+        render = asyncio.create_task(client.post('/render', json={"latex": "y = x"}))
+        await asyncio.sleep(0.05)
+
+        started = loop.time()
+        response = await client.get('/health')
+        elapsed = loop.time() - started
+        body = await response.json()
+        print(f"/health: {elapsed * 1000:.1f} ms, pending_renders={body['pending_renders']}")
+        assert response.status == 200
+        assert body['pending_renders'] == 1
+        assert elapsed < 0.3
+        assert not render.done()
+
+        assert (await render).status == 200
+        print("✓ 描画中もヘルスチェックに応答")
+
+    try:
+        asyncio.run(with_client(renderer, check))
+    finally:
+        server._health_sources.pop("pending_renders", None)
+
+if __name__ == "__main__":
+    test_render_api()
+    test_health_during_render()
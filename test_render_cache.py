@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+描画結果のディスクキャッシュのテスト
+"""
+
+import os
+import tempfile
+import time
+
+from render_cache import RenderCache, TEMP_FILE_MAX_AGE
+from render_request import RenderRequest
+
+def test_put_get_and_restart():
+    """保存したPNGを取得でき、作り直したキャッシュ（再起動後）からも取得できるか"""
+    print("=== 保存・取得テスト ===")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = RenderCache(directory)
+        assert cache.get('ab' * 32) is None
+
+        cache.put('ab' * 32, b'\x89PNG first')
+        assert cache.get('ab' * 32) == b'\x89PNG first'
+        cache.close()
+
+        restarted = RenderCache(directory)
+        assert restarted.get('ab' * 32) == b'\x89PNG first'
+        stats = restarted.stats()
+        print(f"統計: {stats}")
+        assert stats['entries'] == 1 and stats['hits'] == 1
+        restarted.close()
+    print("✓ 再起動後も取得可能")
+
+def test_lru_eviction():
+    """合計サイズが上限を超えたら最終アクセスが古いものから削除されるか"""
+    print("\n=== 削除テスト ===")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = RenderCache(directory, max_bytes=250)
+        cache.put('aa' * 32, b'a' * 100)
+        cache.put('bb' * 32, b'b' * 100)
+
+        # aa を参照して bb を最も古くする
+        assert cache.get('aa' * 32) is not None
+        cache.put('cc' * 32, b'c' * 100)
+
+        assert cache.get('bb' * 32) is None
+        assert cache.get('aa' * 32) is not None
+        assert cache.get('cc' * 32) is not None
+        assert cache.stats()['bytes'] == 200
+        assert not os.path.exists(os.path.join(directory, 'bb', 'bb' * 32 + '.png'))
+        cache.close()
+    print("✓ 古いものから削除")
+
+def test_crash_leftovers():
+    """書き込み途中の一時ファイルや消えた画像ファイルがあっても壊れないか"""
+    print("\n=== 異常終了後の復旧テスト ===")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = RenderCache(directory)
+        cache.put('dd' * 32, b'd' * 10)
+        cache.close()
+
+        # 書き込み途中の一時ファイル（このプロセス・古くなった他のプロセス・書き込み中の他のプロセス）と、
+        # 索引だけが残った画像
+        def temp_file(name):
+            path = os.path.join(directory, 'dd', name)
+            with open(path, 'wb') as f:
+                f.write(b'partial')
+            return path
+
+        leftover = temp_file(f'{os.getpid()}-partial.tmp')
+        abandoned = temp_file('1-abandoned.tmp')
+        old = time.time() - TEMP_FILE_MAX_AGE - 1
+        os.utime(abandoned, (old, old))
+        in_flight = temp_file('1-in-flight.tmp')
+        os.remove(os.path.join(directory, 'dd', 'dd' * 32 + '.png'))
+
+        restarted = RenderCache(directory)
+        assert restarted.get('dd' * 32) is None
+        assert restarted.stats()['entries'] == 0
+        assert not os.path.exists(leftover)
+        assert not os.path.exists(abandoned)
+        # 他のワーカーが書き込み中の一時ファイルは消さない
+        assert os.path.exists(in_flight)
+        restarted.close()
+    print("✓ 復旧正常")
+
+def test_cache_key_normalization():
+    """空白の違いは同じキー、描画パラメータの違いは別のキーになるか"""
+    print("\n=== キャッシュキーテスト ===")
+
+    base = RenderRequest.from_input("y = x^2")
+    assert RenderRequest.from_input("y=x^2").cache_key() == base.cache_key()
+    # キャプションの文字が違う式は、正規化で同じになっても別のキー
+    assert RenderRequest.from_input("y = sin x").cache_key() != RenderRequest.from_input("y=sin(x)").cache_key()
+    assert base.replace(label_size=6).cache_key() != base.cache_key()
+    assert base.replace(zoom_level=1).cache_key() != base.cache_key()
+    assert RenderRequest.from_input("y = x^2", mode="3D").cache_key() != base.cache_key()
+    print("✓ キャッシュキー正常")
+
+if __name__ == "__main__":
+    test_put_get_and_restart()
+    test_lru_eviction()
+    test_crash_leftovers()
+    test_cache_key_normalization()
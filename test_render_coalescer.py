@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+連続操作の描画まとめ（RenderCoalescer）のテスト
+"""
+
+import asyncio
+
+from render_coalescer import RenderCoalescer
+
+class Recorder:
+    """描画・送信の呼び出しを記録する"""
+
+    def __init__(self, render_time=0.0):
+        self.render_time = render_time
+        self.rendered = []
+        self.finished = []
+        self.published = []
+        # ブラウザのページの代わり（描画は1件ずつ）
+        self.lock = asyncio.Lock()
+
+    async def render(self, request):
+        async with self.lock:
+            self.rendered.append(request)
+            await asyncio.sleep(self.render_time)
+            self.finished.append(request)
+            return f"image:{request}"
+
+    async def publish(self, message, request, result):
+        self.published.append((message, request, result))
+
+async def wait_idle(coalescer, key):
+    while coalescer.is_pending(key):
+        await asyncio.sleep(0.005)
+
+def test_rapid_inputs_render_once():
+    """短時間の連続操作は最後の状態だけが描画されるか"""
+    print("=== 連続操作テスト ===")
+
+    async def run():
+        recorder = Recorder()
+        coalescer = RenderCoalescer(recorder.render, recorder.publish, delay=0.05)
+
+        for zoom_level in [1, 2, 3]:
+            coalescer.submit(1, "message", zoom_level)
+            await asyncio.sleep(0.01)
+
+        await wait_idle(coalescer, 1)
+        return recorder
+
+    recorder = asyncio.run(run())
+    print(f"描画: {recorder.rendered} / 送信: {recorder.published}")
+    assert recorder.rendered == [3]
+    assert recorder.published == [("message", 3, "image:3")]
+    print("✓ 1回だけ描画")
+
+def test_stale_render_dropped():
+    """描画中に目標状態が変わった場合、古い結果は送信されないか"""
+    print("\n=== 古い描画の破棄テスト ===")
+
+    async def run():
+        recorder = Recorder(render_time=0.1)
+        coalescer = RenderCoalescer(recorder.render, recorder.publish, delay=0.01)
+
+        coalescer.submit(1, "message", "a")
+        await asyncio.sleep(0.05)  # "a" の描画中
+        coalescer.submit(1, "message", "b")
+
+        await wait_idle(coalescer, 1)
+        return recorder
+
+    recorder = asyncio.run(run())
+    print(f"描画: {recorder.rendered} / 送信: {[request for _, request, _ in recorder.published]}")
+    assert recorder.rendered == ["a", "b"]
+    assert [request for _, request, _ in recorder.published] == ["b"]
+    print("✓ 古い描画結果を破棄")
+
+def test_stale_render_cancelled():
+    """古くなった描画は最後まで待たずに取り消され、ページ（ロック）をすぐに明け渡すか"""
+    print("\n=== 古い描画の取り消しテスト ===")
+
+    async def run():
+        recorder = Recorder(render_time=1.0)
+        coalescer = RenderCoalescer(recorder.render, recorder.publish, delay=0.01)
+        loop = asyncio.get_running_loop()
+
+        coalescer.submit(1, "message", "a")
+        await asyncio.sleep(0.05)  # "a" の描画中
+        coalescer.submit(1, "message", "b")
+        await asyncio.sleep(0.05)
+        assert recorder.rendered == ["a", "b"], recorder.rendered  # "b" はもう描画中
+
+        started = loop.time()
+        await wait_idle(coalescer, 1)
+        return recorder, loop.time() - started
+
+    recorder, elapsed = asyncio.run(run())
+    print(f"描画完了: {recorder.finished} / 残り {elapsed:.2f} 秒")
+    assert recorder.finished == ["b"]
+    assert [request for _, request, _ in recorder.published] == ["b"]
+    assert elapsed < 1.1
+    print("✓ 古い描画を取り消し")
+
+def test_cancel_and_independent_messages():
+    """メッセージごとに独立して描画され、取り消した描画は送信されないか"""
+    print("\n=== 取り消しテスト ===")
+
+    async def run():
+        recorder = Recorder()
+        coalescer = RenderCoalescer(recorder.render, recorder.publish, delay=0.02)
+
+        coalescer.submit(1, "m1", "x")
+        coalescer.submit(2, "m2", "y")
+        coalescer.cancel(1)
+
+        await wait_idle(coalescer, 2)
+        await asyncio.sleep(0.03)
+        return recorder
+
+    recorder = asyncio.run(run())
+    assert recorder.published == [("m2", "y", "image:y")]
+    print("✓ 取り消し正常")
+
+if __name__ == "__main__":
+    test_rapid_inputs_render_once()
+    test_stale_render_dropped()
+    test_stale_render_cancelled()
+    test_cancel_and_independent_messages()
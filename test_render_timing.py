@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+描画時間の統計（render_timing.py）のテスト
+"""
+
+from render_timing import (
+    RenderTiming, LatencyHistogram, expression_complexity, complexity_bucket, timing_key,
+    MIN_SETTLE_SECONDS, CAPTURE_TIMEOUT_RANGE,
+)
+from render_request import RenderRequest
+
+def test_complexity():
+    """構文木のノード数で区分し、LaTeXの式も見積もれるか"""
+    print("=== 式の複雑さテスト ===")
+    simple = expression_complexity("y = x")
+    heavy = expression_complexity("sin(x*y) + cos(x^2 - y^2) = sqrt(x^2 + y^2) / (1 + abs(x*y))")
+    latex = expression_complexity(r"y=\frac{\sin\left(x\right)}{x}")
+    print(f"y = x: {simple}, 陰関数: {heavy}, LaTeX: {latex}")
+    assert complexity_bucket(simple) == 'simple'
+    assert complexity_bucket(heavy) in ('complex', 'heavy')
+    assert latex > simple
+    # 複数の式はノード数を合計する
+    assert expression_complexity("y = x; y = x") == 2 * simple
+
+    assert timing_key(RenderRequest.from_input("y = x")) == '2d/simple'
+    assert timing_key(RenderRequest.from_input("z = x", "3d")) == '3d/simple'
+    print("✓ 区分正常")
+
+def test_rolling_histogram():
+    """直近の記録だけで分位点を求めるか"""
+    print("\n=== ヒストグラムテスト ===")
+    histogram = LatencyHistogram(window=10)
+    for _ in range(10):
+        histogram.add(0.04)
+    assert histogram.percentile(0.9) == 0.05
+
+    # 古い記録は窓から外れて度数が減る
+    for _ in range(10):
+        histogram.add(2.5)
+    assert len(histogram) == 10
+    assert histogram.percentile(0.5) == 3.0
+    assert sum(histogram.counts) == 10
+
+    # 最後の区間を超えた場合は直近の最大値
+    histogram.add(500)
+    assert histogram.percentile(1.0) == 500
+    print("✓ ヒストグラム正常")
+
+def test_adaptive_waits():
+    """統計がたまるまでは既定値、その後は単純な式は短く・重い式は長く待つか"""
+    print("\n=== 待ち時間・タイムアウトテスト ===")
+    timing = RenderTiming(min_samples=5)
+    assert timing.settle_seconds('2d/simple', 3.0) == 3.0
+    assert timing.capture_timeout('2d/simple', 20.0) == 20.0
+
+    for _ in range(5):
+        timing.record('2d/simple', 'analysis', 0.03)
+        timing.record('2d/simple', 'capture', 0.4)
+        timing.record('3d/heavy', 'analysis', 4.0)
+        timing.record('3d/heavy', 'capture', 18.0)
+
+    simple_settle = timing.settle_seconds('2d/simple', 3.0)
+    heavy_settle = timing.settle_seconds('3d/heavy', 3.0)
+    simple_timeout = timing.capture_timeout('2d/simple', 20.0)
+    heavy_timeout = timing.capture_timeout('3d/heavy', 20.0)
+    print(f"simple: 待ち {simple_settle}秒 / タイムアウト {simple_timeout}秒")
+    print(f"heavy: 待ち {heavy_settle}秒 / タイムアウト {heavy_timeout}秒")
+    assert simple_settle == MIN_SETTLE_SECONDS
+    assert heavy_settle > 3.0
+    assert simple_timeout == CAPTURE_TIMEOUT_RANGE[0]
+    assert 20.0 < heavy_timeout <= CAPTURE_TIMEOUT_RANGE[1]
+    assert timing.analysis_timeout('3d/heavy', 1.5) > 1.5
+
+    summary = timing.summary()
+    assert summary['2d/simple']['analysis']['samples'] == 5
+    assert summary['3d/heavy']['capture']['p90'] == 20.0
+    print("✓ 待ち時間・タイムアウト正常")
+
+if __name__ == "__main__":
+    test_complexity()
+    test_rolling_histogram()
+    test_adaptive_waits()
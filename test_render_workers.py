@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+描画ワーカー（render_ipc / render_worker / render_pool）のテスト
+ブラウザの代わりに FakeRenderer を使うワーカープロセスを起動して確認する
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from render_ipc import PREFIX, MAX_PAYLOAD_SIZE, ProtocolError, encode_message, read_message
+from render_pool import RenderWorkerPool, RenderWorkerError
+from expression_validator import DesmosExpressionError
+from render_request import RenderRequest
+from render_cache import RenderCache
+
+FAKE_WORKER_COMMAND = [
+    sys.executable, '-c',
+    "import render_worker, test_render_workers; render_worker.main(test_render_workers.FakeRenderer)",
+]
+
+class FakeRenderer:
+    """ブラウザを使わずに、式の内容をそのまま画像データとして返す描画"""
+
+    def __init__(self):
+        self.desmos_error_aborts = 0
+
+    async def initialize_browser(self):
+        pass
+
+    async def render(self, request):
+        if request.expression == 'slow':
+            await asyncio.sleep(2)
+        if request.expression == 'crash':
+            os._exit(1)
+        if request.expression == 'fail':
+            raise ValueError("描画に失敗しました")
+        if request.expression == 'desmos':
+            self.desmos_error_aborts += 1
+            raise DesmosExpressionError([(None, "Too many variables")], ["console error"])
+        return io.BytesIO(f"png:{request.latex}:{request.label_size}".encode())
+
+    async def render_batch(self, requests):
+        for index in reversed(range(len(requests))):
+            yield index, None if requests[index].expression == 'fail' else f"png:{index}".encode()
+
+    async def render_sweep(self, request, parameter, values):
+        for value in values:
+            yield f"{parameter}={value}".encode()
+
+    async def close(self):
+        pass
+
+def feed(*messages):
+    reader = asyncio.StreamReader()
+    for message in messages:
+        reader.feed_data(b''.join(message))
+    reader.feed_eof()
+    return reader
+
+def test_message_format():
+    """メッセージの書き込みと読み込みが対応し、不正な長さを拒否するか"""
+    print("=== 通信形式テスト ===")
+
+    async def run():
+        reader = feed(encode_message({'id': 1, 'type': 'result'}, b'\x89PNG'), encode_message({'type': 'end'}))
+        assert await read_message(reader) == ({'id': 1, 'type': 'result'}, b'\x89PNG')
+        assert await read_message(reader) == ({'type': 'end'}, b'')
+        try:
+            await read_message(reader)
+        except asyncio.IncompleteReadError:
+            print("✓ 接続終了を検出")
+
+        try:
+            await read_message(feed([PREFIX.pack(2, MAX_PAYLOAD_SIZE + 1)]))
+        except ProtocolError as e:
+            print(f"✓ 不正な長さを拒否: {e}")
+        else:
+            raise AssertionError("不正な長さが拒否されませんでした")
+
+    asyncio.run(run())
+
+    request = RenderRequest.from_input("y = x/2; y = sin(x)", "3d", 6, views=('front', 'top'))
+    restored = RenderRequest.from_dict(json.loads(json.dumps(request.to_dict())))
+    assert restored.cache_key() == request.cache_key()
+    assert restored.latex_expressions == request.latex_expressions
+    print("✓ リクエストの受け渡し正常")
+
+def test_worker_pool():
+    """ワーカーでの描画・一括描画・アニメーション、エラーと再起動"""
+    print("\n=== 描画ワーカーテスト ===")
+
+    async def run():
+        pool = RenderWorkerPool(2, command=FAKE_WORKER_COMMAND, timeout=30)
+        try:
+            await pool.initialize_browser()
+
+            # 2つのワーカーで並行して描画
+            images = await asyncio.gather(*(
+                pool.render(RenderRequest.from_input("y = x", label_size=size)) for size in (1, 2, 3, 4)
+            ))
+            assert [image.getvalue() for image in images] == [f"png:y = x:{size}".encode() for size in (1, 2, 3, 4)]
+            print("✓ 描画正常")
+
+            requests = [RenderRequest.from_input(text) for text in ("y = x", "fail", "y = 2x")]
+            results = [item async for item in pool.render_batch(requests)]
+            assert results == [(2, b"png:2"), (1, None), (0, b"png:0")]
+            frames = [frame async for frame in pool.render_sweep(requests[0], "a", [0, 0.5, 1])]
+            assert frames == [b"a=0", b"a=0.5", b"a=1"]
+            print("✓ 一括描画・アニメーション正常")
+
+            # 描画の失敗はエラーとして返り、ワーカーはそのまま使える
+            for text in ("fail", "crash"):
+                try:
+                    await pool.render(RenderRequest.from_input(text))
+                except RenderWorkerError as e:
+                    print(f"✓ {text}: {e}")
+                else:
+                    raise AssertionError(f"{text} がエラーになりませんでした")
+
+            # 落ちたワーカーは次の要求の前に再起動される
+            for _ in range(2):
+                image = await pool.render(RenderRequest.from_input("y = x"))
+                assert image.getvalue() == b"png:y = x:4"
+            status = pool.status()
+            print(f"ワーカーの状態: {status}")
+            assert sum(worker['restarts'] for worker in status) == 1
+            assert all(worker['alive'] for worker in status)
+
+            # 1つのワーカーだけを手動で再起動
+            await pool.restart_worker(2)
+            assert pool.status()[1]['restarts'] == status[1]['restarts'] + 1
+            assert pool.status()[0]['restarts'] == status[0]['restarts']
+            print("✓ 再起動正常")
+
+            # Desmosのエラーは種類とメッセージを保ったまま返り、中止した数が数えられる
+            for _ in range(3):
+                try:
+                    await pool.render(RenderRequest.from_input("desmos"))
+                except DesmosExpressionError as e:
+                    assert e.errors == [(None, "Too many variables")]
+                    assert e.console_errors == ["console error"]
+                else:
+                    raise AssertionError("Desmosのエラーが返りませんでした")
+            await pool.render(RenderRequest.from_input("y = x"))
+            assert pool.desmos_error_aborts == 3
+            assert sum(worker['desmos_error_aborts'] for worker in pool.status()) == 3
+            print(f"✓ Desmosのエラー: {pool.desmos_error_aborts} 件を中止")
+        finally:
+            await pool.close()
+        assert not any(worker['alive'] for worker in pool.status())
+
+    asyncio.run(run())
+
+def test_cache_before_worker():
+    """キャッシュ済みのグラフは、描画中のワーカーを待たずにゲートウェイで返すか"""
+    print("\n=== ゲートウェイのキャッシュテスト ===")
+
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RenderCache(directory)
+            cached = RenderRequest.from_input("y = x^2")
+            cache.put(cached.cache_key(), b"cached png")
+
+            pool = RenderWorkerPool(1, command=FAKE_WORKER_COMMAND, timeout=30, render_cache=cache)
+            try:
+                await pool.initialize_browser()
+                slow = asyncio.create_task(pool.render(RenderRequest.from_input("slow")))
+                await asyncio.sleep(0.2)
+
+                started = time.perf_counter()
+                image = await pool.render(cached)
+                elapsed = time.perf_counter() - started
+                assert image.getvalue() == b"cached png"
+                assert elapsed < 1, f"キャッシュの取得に {elapsed:.2f} 秒かかりました"
+                print(f"✓ 描画中のワーカーを待たずに {elapsed * 1000:.1f} ms で取得")
+
+                # 一括描画ではキャッシュ済みのものを先に返し、残りの順番を保ってワーカーに送る
+                requests = [RenderRequest.from_input(text) for text in ("y = x", "y = x^2", "y = 2x")]
+                results = [item async for item in pool.render_batch(requests)]
+                assert results == [(1, b"cached png"), (2, b"png:1"), (0, b"png:0")]
+                await slow
+                print("✓ 一括描画の順番正常")
+            finally:
+                await pool.close()
+
+    asyncio.run(run())
+
+def test_cancel_render():
+    """取り消した描画: 順番待ちならワーカーに送らず、送った後ならワーカーを再起動せずに最後まで受け取るか"""
+    print("\n=== 描画の取り消しテスト ===")
+
+    async def run():
+        pool = RenderWorkerPool(1, command=FAKE_WORKER_COMMAND, timeout=30)
+        try:
+            await pool.initialize_browser()
+            running = asyncio.create_task(pool.render(RenderRequest.from_input("slow")))
+            await asyncio.sleep(0.2)
+            queued = asyncio.create_task(pool.render(RenderRequest.from_input("y = x")))
+            await asyncio.sleep(0.05)
+
+            for task in (running, queued):
+                task.cancel()
+            await asyncio.gather(running, queued, return_exceptions=True)
+            assert running.cancelled() and queued.cancelled()
+
+            # 取り消した後もワーカーは再起動されず、次の描画に使える
+            image = await pool.render(RenderRequest.from_input("y = 2x"))
+            assert image.getvalue() == b"png:y = 2x:4"
+            assert pool.status()[0]['restarts'] == 0 and pool.status()[0]['alive']
+            print("✓ 取り消してもワーカーはそのまま")
+        finally:
+            await pool.close()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_message_format()
+    test_worker_pool()
+    test_cache_before_worker()
+    test_cancel_render()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+リアクション操作のセッション管理のテスト
+"""
+
+from render_request import RenderRequest
+from session_store import ReactionSession, SessionStore
+
+class FakeClock:
+    """テスト用の時計（手動で進める）"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_session(message_id, user_id=1):
+    return ReactionSession(message_id, 10, user_id, request=None, actions={'✅': ('done', None)})
+
+def test_lookup_and_actions():
+    """メッセージIDでセッションを引けるか"""
+    print("=== セッション検索テスト ===")
+    store = SessionStore(ttl=300, clock=FakeClock())
+
+    for message_id in range(1000):
+        store.add(make_session(message_id))
+
+    session = store.get(500)
+    assert session is not None and session.message_id == 500
+    assert session.action_for('✅') == ('done', None)
+    assert session.action_for('🔍') is None
+    assert store.get(5000) is None
+    assert len(store) == 1000
+    print("✓ 検索正常")
+
+def test_ttl_expiry():
+    """一定時間操作のないセッションが期限切れになるか"""
+    print("\n=== 期限切れテスト ===")
+    clock = FakeClock()
+    store = SessionStore(ttl=300, clock=clock)
+
+    store.add(make_session(1))
+    store.add(make_session(2))
+
+    # 操作があったセッションは期限が延長される
+    clock.now = 200
+    store.touch(store.get(1))
+
+    clock.now = 350
+    assert store.get(2) is None
+    assert store.get(1) is not None
+
+    expired = store.sweep()
+    assert [session.message_id for session in expired] == [2]
+    assert len(store) == 1
+
+    clock.now = 600
+    assert [session.message_id for session in store.sweep()] == [1]
+    assert len(store) == 0
+    print("✓ 期限切れ正常")
+
+def test_remove():
+    """完了・削除したセッションを取り除けるか"""
+    print("\n=== 削除テスト ===")
+    store = SessionStore(clock=FakeClock())
+
+    store.add(make_session(1))
+    assert store.remove(1).message_id == 1
+    assert store.remove(1) is None
+    assert 1 not in store
+    print("✓ 削除正常")
+
+def test_bounded_store():
+    """上限を超えたら最も長く操作されていないセッションから削除されるか"""
+    print("\n=== 上限テスト ===")
+    store = SessionStore(max_sessions=3, clock=FakeClock())
+
+    for message_id in range(3):
+        store.add(make_session(message_id))
+    store.touch(store.get(0))
+    store.add(make_session(3))
+
+    assert len(store) == 3
+    assert store.get(1) is None
+    assert all(store.get(message_id) is not None for message_id in (0, 2, 3))
+    print("✓ 上限正常")
+
+def test_per_message_state():
+    """各セッションが自分の状態（式・ズームレベルなど）を持ち、互いに影響しないか"""
+    print("\n=== セッション状態テスト ===")
+    store = SessionStore(clock=FakeClock())
+
+    graph_a = store.add(ReactionSession(1, 10, 1, RenderRequest("y = x", "y = x"), {}))
+    graph_b = store.add(ReactionSession(2, 10, 1, RenderRequest("y = x^2", "y = x^2", zoom_level=2), {}))
+
+    graph_b.request = graph_b.request.replace(zoom_level=3)
+    graph_a.request = graph_a.request.replace(label_size=8)
+
+    assert (graph_a.expression, graph_a.label_size, graph_a.zoom_level) == ("y = x", 8, 0)
+    assert (graph_b.expression, graph_b.label_size, graph_b.zoom_level) == ("y = x^2", 4, 3)
+
+    # __slots__ により属性辞書を持たない
+    assert not hasattr(graph_a, '__dict__')
+    assert not hasattr(graph_a.request, '__dict__')
+    print("✓ セッション状態正常")
+
+if __name__ == "__main__":
+    test_lookup_and_actions()
+    test_ttl_expiry()
+    test_remove()
+    test_bounded_store()
+    test_per_message_state()